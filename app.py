@@ -1,23 +1,36 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import datetime
+import math
 import os
+import threading
+import time
+import uuid
 from io import BytesIO
-import base64
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
 
-# Authentification (exemple simplifié)
-import streamlit_authenticator as stauth
-
-import ssl
-# ssl_context = ssl.create_default_context()
-# ssl_context.options |= ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1  # Désactive TLS 1.0 et 1.1
-
-from google.auth.transport.requests import AuthorizedSession
-from google.oauth2 import service_account
+from drive_files import DriveFileResolver
+from upload_queue import DriveIdPool, UploadQueue
+from lazy_modules import LazyModule
+import instrumentation
+
+# 💤 Bibliothèques lourdes et modules qui en dépendent : chargés au premier
+# usage, l'écran de connexion et l'accueil s'affichent sans eux (cf. lazy_modules)
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+service_account = LazyModule("google.oauth2.service_account")
+gapi_errors = LazyModule("googleapiclient.errors")
+gapi_http = LazyModule("googleapiclient.http")
+drive_http = LazyModule("drive_http")
+thumbnails = LazyModule("thumbnails")
+photo_upload = LazyModule("photo_upload")
+stock_cache = LazyModule("stock_cache")
+stock_journal = LazyModule("stock_journal")
+stock_schema = LazyModule("stock_schema")
+stock_store = LazyModule("stock_store")
+stock_analytics = LazyModule("stock_analytics")
+concurrency = LazyModule("concurrency")
+sales_accounts = LazyModule("sales_accounts")
+stock_sync = LazyModule("stock_sync")
+local_store = LazyModule("local_store")
 
 # ============================
 # === CONFIGURATION GLOBALEs ==
@@ -32,131 +45,418 @@ st.set_page_config(
 
 # Récupération des e-mails autorisés depuis les secrets
 ALLOWED_EMAILS = st.secrets["auth"]["allowed_emails"]
+# Administrateurs (panneau des mesures de performance), facultatif
+ADMIN_EMAILS = st.secrets["auth"].get("admin_emails", [])
 
 # ID du dossier Google Drive où stocker CSV et photos
 GOOGLE_DRIVE_FOLDER_ID = "1dRCYxhWB15-dSpwklt1HAYJnc6zP5R7y"
 
-# Nom du CSV principal
+# Nom du CSV principal (export lisible) et du snapshot typé (référence)
 CSV_FILENAME = "stock.csv"
+STOCK_SNAPSHOT_FILENAME = "stock.parquet"
 CSV_SALES_ACCOUNT_FILENAME = "comptes_de_vente.csv"
 
 # Taux d'imposition
 TAX_RATE = 0.126  # 12.6%
 
+# Pagination de la consultation du stock
+CONSULTATION_PAGE_SIZES = [12, 24, 48]
+GRID_THUMBNAIL_SIZE = 300  # Taille des vignettes dans la grille
+DETAIL_IMAGE_SIZE = 700  # Taille de la photo sur la fiche détaillée
+
 # =======================
 # === FONCTIONS UTILES ===
 # =======================
 
-import ssl
-from google.auth.transport.requests import AuthorizedSession
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+@st.cache_resource
+def get_gdrive_credentials():
+    """
+    Credentials du compte de service Google Drive, partagés par le client
+    principal et les téléchargements en arrière-plan.
+    """
+    return service_account.Credentials.from_service_account_info(
+        st.secrets["gcp_service_account"],
+        scopes=["https://www.googleapis.com/auth/drive"]
+    )
+
+
+@st.cache_resource
+def get_drive_transport():
+    """
+    Transport HTTP partagé par tous les clients Google Drive du serveur :
+    connexions keep-alive, délais maximum, nouvelles tentatives sur les
+    erreurs passagères et jeton renouvelé avant expiration (cf. drive_http).
+    """
+    return drive_http.DriveTransport(get_gdrive_credentials())
 
-import ssl
-import requests
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 
 @st.cache_resource
 def init_gdrive():
     """
-    Initialise la connexion Google Drive via un compte de service avec un contexte SSL sécurisé.
+    Initialise la connexion Google Drive via un compte de service.
+    Appelée seulement par les pages qui lisent ou écrivent sur Drive : le
+    premier jeton d'accès est demandé par le transport au premier appel.
     """
-    # 🔒 Création d'un contexte SSL sécurisé
-    ssl_context = ssl.create_default_context()
-    ssl_context.options |= ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1  # Désactive TLS 1.0 et 1.1
+    # 📂 Client Google Drive sur le transport partagé (découverte statique,
+    # appels chronométrés si les mesures sont activées)
+    return drive_http.build_drive_service(get_drive_transport())
 
-    # 📜 Chargement des credentials du compte de service
-    credentials = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"],
-        scopes=["https://www.googleapis.com/auth/drive"]
+
+def new_drive_service():
+    """
+    Nouveau client Google Drive (pour les threads d'arrière-plan : un client
+    par thread, sur le transport HTTP partagé qui, lui, est thread-safe).
+    """
+    return drive_http.build_drive_service(get_drive_transport())
+
+
+@st.cache_resource
+def get_stock_cache():
+    """
+    Cache des CSV Drive partagé par toutes les sessions du serveur
+    (mémoire + disque, revalidé sur la version Drive du fichier).
+    """
+    return stock_cache.StockCache()
+
+
+@st.cache_resource
+def get_stock_store_cache():
+    """
+    Stock indexé (StockStore + index de recherche) du dernier snapshot,
+    partagé par toutes les sessions du serveur.
+    """
+    return stock_store.StockStoreCache()
+
+
+@st.cache_resource
+def get_compaction_lock():
+    """Un seul compactage du journal à la fois dans ce serveur."""
+    return threading.Lock()
+
+
+@st.cache_resource
+def get_drive_resolver():
+    """
+    Cache nom -> ID des fichiers du dossier GOOGLE_DRIVE_FOLDER_ID,
+    partagé par toutes les sessions du serveur.
+    """
+    return DriveFileResolver(GOOGLE_DRIVE_FOLDER_ID)
+
+
+@st.cache_resource
+def get_stock_journal():
+    """
+    Journal des ajouts / ventes (fichiers delta sur Drive),
+    partagé par toutes les sessions du serveur.
+    """
+    return stock_journal.StockJournal(GOOGLE_DRIVE_FOLDER_ID)
+
+
+@st.cache_resource
+def get_local_store():
+    """
+    Copie locale du stock (SQLite) : snapshot, modifications en attente
+    d'envoi, conflits et état de la synchronisation avec Drive.
+    """
+    return local_store.LocalStore()
+
+
+@st.cache_resource
+def get_stock_sync():
+    """
+    Stock servi par la copie locale et synchronisé avec Drive en arrière-plan
+    (cf. stock_sync), partagé par toutes les sessions du serveur.
+    """
+    return stock_sync.StockSync(
+        get_local_store(),
+        get_stock_journal(),
+        load_snapshot=load_stock_snapshot,
+        compact=compact_stock_journal,
+        take_file_id=lambda service: get_drive_id_pool().take(service)[0],
+        service_factory=lambda: new_drive_service(),
+        store_cache=get_stock_store_cache(),
     )
 
-    # 🔄 Création d'une session avec le contexte SSL
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter()
-    session.mount("https://", adapter)
 
-    # 🔄 Application de la session aux credentials Google
-    credentials.refresh(Request(session))  # Rafraîchit les tokens avec cette session
+@st.cache_resource
+def get_sales_accounts():
+    """
+    Registre des comptes de vente (comptes_de_vente.csv), lu une fois puis
+    gardé en mémoire, partagé par toutes les sessions du serveur.
+    """
+    return sales_accounts.SalesAccountRegistry(
+        load=lambda service: download_csv_from_drive(service, CSV_SALES_ACCOUNT_FILENAME),
+        save=save_sales_accounts,
+    )
 
-    # 📂 Création du service Google Drive avec les credentials mis à jour
-    return build("drive", "v3", credentials=credentials)
 
+def save_sales_accounts(service, df):
+    """
+    Écrit le registre des comptes de vente. Une modification faite au même
+    moment ailleurs est fusionnée ligne à ligne (clé : le nom du compte).
+    Retourne la table effectivement écrite (fusionnée le cas échéant, avec sa
+    version Drive), ou None si rien n'a été écrit ; lève
+    concurrency.WriteConflict si notre version a écrasé une autre écriture.
+    """
+    meta = upload_csv_to_drive(service, CSV_SALES_ACCOUNT_FILENAME, df, key="compte")
+    if meta is None:
+        return None
+    written = get_stock_cache().frame_at(CSV_SALES_ACCOUNT_FILENAME, meta)
+    if written is None:
+        written = df.copy()
+    written.attrs[stock_cache.DRIVE_VERSION_ATTR] = dict(meta)
+    return written
 
 
-def get_drive_file(service, filename):
+@st.cache_resource
+def get_thumbnail_cache():
     """
-    Récupère un fichier Google Drive par son nom dans le dossier GOOGLE_DRIVE_FOLDER_ID.
-    Retourne l'objet fichier Drive si trouvé, sinon None.
+    Cache disque des photos redimensionnées (grille + fiche détaillée),
+    partagé par toutes les sessions du serveur.
     """
-    query = f"'{GOOGLE_DRIVE_FOLDER_ID}' in parents and name='{filename}' and trashed=false"
-    
+    return thumbnails.ThumbnailCache(
+        sizes=(GRID_THUMBNAIL_SIZE, DETAIL_IMAGE_SIZE),
+        # Un client Drive par thread de téléchargement, sur le transport partagé
+        service_factory=lambda: new_drive_service(),
+    )
+
+
+@st.cache_resource
+def get_drive_id_pool():
+    """IDs Drive pré-générés pour les fichiers envoyés en arrière-plan."""
+    return DriveIdPool()
+
+
+def _upload_job_photo(service, params, payload):
+    """Travail de la file d'envoi : création d'une photo (ou vignette) sur Drive."""
+    file_metadata = {"id": params["file_id"], "name": params["name"], "parents": [GOOGLE_DRIVE_FOLDER_ID]}
+    media = gapi_http.MediaIoBaseUpload(BytesIO(payload), mimetype=params["mimetype"], resumable=params["resumable"])
     try:
-        results = service.files().list(q=query).execute()
-        
-        
-        if isinstance(results, dict):  # Vérifier que la réponse est bien un dictionnaire
-            files = results.get("files", [])
-            return files[0] if files else None
-        else:
-            st.error("Erreur : La réponse de l'API n'est pas un dictionnaire. Vérifie GOOGLE_DRIVE_FOLDER_ID.")
-            return None
-    
-    except Exception as e:
-        st.error(f"Erreur lors de l'accès à Google Drive : {e}")
-        return None
+        service.files().create(body=file_metadata, media_body=media, fields="id").execute()
+    except gapi_errors.HttpError as e:
+        if e.resp.status != 409:  # 409 : déjà créée lors d'une tentative précédente
+            raise
+
 
+def _upload_job_csv(service, params, payload):
+    """
+    Travail de la file d'envoi : écriture d'un fichier CSV / Parquet complet.
+    Les erreurs sont levées telles quelles : la file les note et réessaie.
+    """
+    df = stock_cache.parse_bytes(params["filename"], payload)
+    write_csv_to_drive(service, params["filename"], df, app_properties=params.get("app_properties"))
+
+
+@st.cache_resource
+def get_upload_queue():
+    """
+    File d'envoi en arrière-plan vers Drive (photos, exports CSV),
+    persistante sur disque et partagée par toutes les sessions du serveur.
+    """
+    return UploadQueue(
+        handlers={"photo": _upload_job_photo, "csv": _upload_job_csv},
+        service_factory=lambda: new_drive_service(),
+    )
 
 
 def download_csv_from_drive(service, filename):
     """
-    Télécharge le CSV depuis Google Drive et retourne un DataFrame.
+    Télécharge le CSV (ou le Parquet, selon l'extension) depuis Google Drive
+    et retourne un DataFrame.
+    Le contenu n'est re-téléchargé que si la version Drive a changé
+    depuis la dernière lecture (cf. get_stock_cache).
+    Seul un fichier absent donne un DataFrame vide : une erreur d'accès à
+    Drive est levée, pour ne jamais être prise pour un stock vide.
     """
-    file_drive = get_drive_file(service, filename)
+    resolver = get_drive_resolver()
+    file_drive = resolver.resolve(service, filename)
     if file_drive:
-        request = service.files().get_media(fileId=file_drive['id'])
-        csv_data = BytesIO(request.execute())
-        return pd.read_csv(csv_data, sep=",")
+        try:
+            return get_stock_cache().get(service, filename, file_drive['id'])
+        except gapi_errors.HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # L'ID en cache n'existe plus (fichier supprimé hors de l'appli) : on le ré-résout
+            resolver.forget(filename)
+            file_drive = resolver.resolve(service, filename)
+
+    if file_drive:
+        return get_stock_cache().get(service, filename, file_drive['id'])
     else:
-        columns = ["id", "date_arrivee", "photo_id", "prix_achat", "description",
-                   "taille", "collection", "estimation", "prix_vente", "date_vente",
-                   "compte_vente", "gain_valeur", "gain_percent", "gain_apres_impots_valeur", "gain_apres_impots_percent"]
-        return pd.DataFrame(columns=columns)
+        return pd.DataFrame(columns=stock_schema.STOCK_COLUMNS)
 
-def upload_csv_to_drive(service, filename, df):
+def write_csv_to_drive(service, filename, df, app_properties=None, merge=True, key="id"):
     """
-    Mets à jour ou crée un fichier CSV sur Google Drive.
+    Écrit `df` dans le fichier Drive `filename` (créé s'il n'existe pas),
+    comme upload_csv_to_drive, mais sans rien afficher : toute erreur est
+    levée. Utilisable hors d'une session Streamlit (threads de la file d'envoi).
+    Retourne les métadonnées Drive du fichier écrit.
     """
-    try:
-        file_drive = get_drive_file(service, filename)
-        csv_str = df.to_csv(index=False, encoding='utf-8')
-        file_metadata = {"name": filename, "parents": [GOOGLE_DRIVE_FOLDER_ID]}
-        media = MediaIoBaseUpload(BytesIO(csv_str.encode("utf-8")), mimetype="text/csv")
+    file_drive = get_drive_resolver().resolve(service, filename)
+    if file_drive:
+        return concurrency.write_frame_cas(service, get_stock_cache(), filename, file_drive['id'], df,
+                                           app_properties=app_properties, merge=merge, key=key)
 
-        if file_drive:
-            service.files().update(fileId=file_drive['id'], media_body=media).execute()
-        else:
-            service.files().create(body=file_metadata, media_body=media).execute()
+    data, mimetype = stock_cache.serialize_frame(filename, df)
+    file_metadata = {"name": filename, "parents": [GOOGLE_DRIVE_FOLDER_ID]}
+    if app_properties:
+        file_metadata["appProperties"] = app_properties
+    media = gapi_http.MediaIoBaseUpload(BytesIO(data), mimetype=mimetype)
+    file_meta = service.files().create(body=file_metadata, media_body=media,
+                                       fields=stock_cache.VERSION_FIELDS).execute()
+    get_drive_resolver().register(file_meta)
+
+    # Mise à jour du cache local avec ce qu'on vient d'écrire
+    get_stock_cache().put(filename, data, file_meta)
+    return file_meta
+
+
+def upload_csv_to_drive(service, filename, df, app_properties=None, merge=True, wait=True, key="id"):
+    """
+    Mets à jour ou crée un fichier CSV sur Google Drive
+    (ou Parquet si `filename` se termine par .parquet).
+    `app_properties` (optionnel) est enregistré dans les appProperties du fichier.
+
+    Si le fichier a été modifié sur Drive depuis la lecture de `df`, nos lignes
+    modifiées sont fusionnées dans la version distante avant de réessayer
+    (ou l'écriture est abandonnée si `merge` est faux), cf. concurrency.py ;
+    `key` est la colonne qui identifie les lignes pour cette fusion.
+    Avec `wait=False`, l'écriture est confiée à la file d'envoi en arrière-plan
+    (sans contrôle de version) et la fonction retourne None immédiatement :
+    un échec est alors noté par la file et affiché dans la barre latérale.
+    Retourne les métadonnées Drive du fichier écrit, ou None en cas d'erreur
+    (rien n'a été écrit). Lève concurrency.WriteConflict si notre version a
+    été écrite par-dessus une écriture concurrente sans avoir pu la fusionner.
+    """
+    if not wait:
+        data, _ = stock_cache.serialize_frame(filename, df)
+        get_upload_queue().enqueue("csv", {"filename": filename, "app_properties": app_properties}, data)
+        return None
+
+    try:
+        return write_csv_to_drive(service, filename, df, app_properties=app_properties, merge=merge, key=key)
+    except concurrency.WriteConflict as e:
+        if e.written:
+            # Écrit, mais une autre écriture a pu être perdue : à l'appelant de le signaler
+            raise
+        if merge:
+            st.error(f"Erreur lors de l'upload du CSV : {e}")
+        return None
     except Exception as e:
         st.error(f"Erreur lors de l'upload du CSV : {e}")
+        return None
+
+
+def load_stock_snapshot(service):
+    """
+    Charge le dernier snapshot typé du stock : stock.parquet en priorité,
+    stock.csv tant que le Parquet n'a pas encore été créé.
+    Retourne (DataFrame, dernier delta du journal intégré au snapshot) ;
+    lève une exception si Drive est injoignable.
+    """
+    files = get_drive_resolver().resolve_many(service, [STOCK_SNAPSHOT_FILENAME, CSV_FILENAME])
+    filename = STOCK_SNAPSHOT_FILENAME if files.get(STOCK_SNAPSHOT_FILENAME) else CSV_FILENAME
+    df_snapshot = stock_schema.normalize_stock(download_csv_from_drive(service, filename))
+    snapshot_meta = get_stock_cache().meta(filename) or {}
+    upto = (snapshot_meta.get("appProperties") or {}).get(stock_journal.JOURNAL_UPTO_KEY, "")
+    return df_snapshot, upto
+
+
+def upload_stock_snapshot(service, df_stock, app_properties=None, merge=True):
+    """
+    Écrit le snapshot de référence (stock.parquet), puis l'export lisible
+    stock.csv. Retourne les métadonnées du Parquet, ou None en cas d'échec.
+    """
+    file_meta = upload_csv_to_drive(service, STOCK_SNAPSHOT_FILENAME, df_stock,
+                                    app_properties=app_properties, merge=merge)
+    if file_meta is not None:
+        # L'export CSV est dérivé du Parquet : écrasé sans contrôle de version, en arrière-plan
+        upload_csv_to_drive(service, CSV_FILENAME, df_stock, wait=False)
+    return file_meta
+
+
+def load_stock(service):
+    """
+    Charge l'état courant du stock depuis la copie locale : snapshot +
+    deltas du journal, y compris les modifications pas encore envoyées.
+    Retourne un StockStore (indexé par ID), réutilisé d'un rerun à l'autre
+    tant que le snapshot ne change pas. Aucun appel à Drive, sauf au tout
+    premier chargement du serveur (cf. get_stock_sync).
+    """
+    return get_stock_sync().stock(service)
+
+
+def record_stock_events(service, stock, events):
+    """
+    Enregistre des événements (ajout / vente) dans le journal et les applique
+    au stock (StockStore). Le delta (quelques centaines d'octets) est d'abord
+    écrit dans la copie locale, visible tout de suite dans ce serveur, même si
+    Drive est injoignable, puis envoyé sur Drive en arrière-plan ; quand trop
+    de deltas s'accumulent, ils sont compactés dans un nouveau snapshot.
+    """
+    name = get_stock_sync().record(events)
+    return stock.apply_delta(name, events)
+
+
+def compact_stock_journal(service):
+    """
+    Intègre les deltas en attente dans le snapshot, puis supprime ceux que le
+    snapshot précédent couvrait déjà : si deux serveurs compactent en même
+    temps, aucun delta encore nécessaire n'a disparu.
+    Dans un même serveur, un compactage déjà en cours n'est pas relancé.
+    """
+    lock = get_compaction_lock()
+    if not lock.acquire(blocking=False):
+        return
+    try:
+        _compact_stock_journal(service)
+    finally:
+        lock.release()
+
+
+def _compact_stock_journal(service):
+    journal = get_stock_journal()
+    df_snapshot, upto = load_stock_snapshot(service)
+    pending = journal.pending(service, after=upto)
+    new_upto = journal.compaction_point(pending)
+    if new_upto is None:
+        return
+
+    events = [event for name, delta_events in pending if name <= new_upto for event in delta_events]
+    df_compacted = stock_journal.apply_events(df_snapshot, events)
+    # Pas de fusion : si un autre serveur vient de compacter, on laisse tomber
+    if upload_stock_snapshot(service, df_compacted,
+                             app_properties={stock_journal.JOURNAL_UPTO_KEY: new_upto}, merge=False) is None:
+        return
+    # Les deltas ne sont supprimés qu'une fois le snapshot bien écrit
+    if upto:
+        journal.delete_upto(service, upto)
 
 
 def upload_photo_to_drive(service, photo_file):
     """
-    Upload une photo sur Google Drive et retourne son ID.
+    Upload une photo sur Google Drive, avec sa vignette pour la grille.
+    La photo est réduite et ré-encodée en mémoire (cf. photo_upload.py), puis
+    confiée à la file d'envoi : les IDs Drive sont pré-générés, la fonction
+    rend la main sans attendre la fin de l'envoi.
+    Retourne (ID de la photo, ID de la vignette), ou (None, None) en cas d'erreur.
     """
-    file_metadata = {"name": photo_file.name, "parents": [GOOGLE_DRIVE_FOLDER_ID]}
-    
     try:
-        media = MediaIoBaseUpload(photo_file, mimetype=photo_file.type, resumable=True)
-        file = service.files().create(body=file_metadata, media_body=media).execute()
-        st.write(f"Upload terminé : {file['id']}")  # DEBUG
-        return file['id']
+        photo = photo_upload.prepare_photo(photo_file.name, photo_file.getvalue(), thumbnail_size=GRID_THUMBNAIL_SIZE)
+        photo_id, thumbnail_id = get_drive_id_pool().take(service, 2)
+
+        queue = get_upload_queue()
+        queue.enqueue("photo", {"file_id": photo_id, "name": photo.name,
+                                "mimetype": photo.mimetype, "resumable": True}, photo.data)
+        queue.enqueue("photo", {"file_id": thumbnail_id, "name": photo.thumbnail_name,
+                                "mimetype": "image/jpeg", "resumable": False}, photo.thumbnail)
+
+        # La photo est affichable tout de suite, sans attendre l'envoi
+        get_thumbnail_cache().store(photo_id, photo.data)
+        return photo_id, thumbnail_id
     except Exception as e:
         st.error(f"Erreur lors de l'upload : {e}")
-        return None
+        return None, None
 
 def get_drive_image_url(file_id, size=300):
     """Génère un lien Google Drive pour afficher une image avec la taille souhaitée."""
@@ -167,43 +467,101 @@ def get_drive_image_url(file_id, size=300):
 def compute_gains(prix_achat, prix_vente, tax_rate=TAX_RATE):
     """
     Calcule le gain en valeur, en %, et après impôts.
+    Accepte des nombres ou des tableaux / Series (calcul vectorisé sur tout un
+    lot de ventes) ; un prix d'achat nul donne un gain en % de 0.
     """
+    scalar = np.ndim(prix_achat) == 0 and np.ndim(prix_vente) == 0
+    prix_achat = np.asarray(prix_achat, dtype=float)
+    prix_vente = np.asarray(prix_vente, dtype=float)
     gain_valeur = prix_vente - prix_achat
-    gain_percent = (gain_valeur / prix_achat) * 100 if prix_achat != 0 else 0
-    
+
     # Montant imposé = prix_vente * tax_rate
     # Gain après impôts = gain_valeur - (prix_vente * tax_rate)
     gain_apres_impots_valeur = gain_valeur - (prix_vente * tax_rate)
-    gain_apres_impots_percent = (gain_apres_impots_valeur / prix_achat) * 100 if prix_achat != 0 else 0
-    
-    return gain_valeur, gain_percent, gain_apres_impots_valeur, gain_apres_impots_percent
 
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_percent = np.where(prix_achat != 0, gain_valeur / prix_achat * 100, 0.0)
+        gain_apres_impots_percent = np.where(prix_achat != 0, gain_apres_impots_valeur / prix_achat * 100, 0.0)
+
+    gains = (gain_valeur, gain_percent, gain_apres_impots_valeur, gain_apres_impots_percent)
+    if scalar:
+        return tuple(float(gain) for gain in gains)
+    return gains
 
-def calculate_advanced_stats(df):
+
+# Colonnes attendues pour une saisie de ventes en lot
+BULK_SALE_COLUMNS = ["id", "prix_vente", "date_vente", "compte_vente"]
+
+
+def parse_sale_dates(values):
     """
-    Calcule le temps moyen de rotation (en jours) et le volume des ventes par période.
-    On se base sur la date_arrivee et la date_vente pour calculer.
+    Dates de vente saisies ou importées : AAAA-MM-JJ (ISO), sinon JJ/MM/AAAA
+    (jour en premier, jamais MM/JJ). NaT si la date est illisible.
     """
-    # Temps moyen de rotation : moyenne de (date_vente - date_arrivee) sur les articles vendus
-    df_vendus = df.dropna(subset=["date_vente", "prix_vente"])  # Garde uniquement ceux vendus
-    if not df_vendus.empty:
-        df_vendus["date_arrivee"] = pd.to_datetime(df_vendus["date_arrivee"])
-        df_vendus["date_vente"] = pd.to_datetime(df_vendus["date_vente"])
-        df_vendus["jours_stock"] = (df_vendus["date_vente"] - df_vendus["date_arrivee"]).dt.days
-        temps_moyen_rotation = df_vendus["jours_stock"].mean()
-    else:
-        temps_moyen_rotation = 0
+    values = pd.Series(values)
+    iso = pd.to_datetime(values, errors="coerce", format="ISO8601")
+    return iso.fillna(pd.to_datetime(values, errors="coerce", format="mixed", dayfirst=True))
 
-    # Volume des ventes par période (mois / trimestre)
-    # Exemple : on groupe par trimestre
-    if not df_vendus.empty:
-        df_vendus["trimestre_vente"] = df_vendus["date_vente"].dt.to_period("Q")
-        ventes_par_trimestre = df_vendus.groupby("trimestre_vente")["prix_vente"].sum().reset_index()
-    else:
-        ventes_par_trimestre = pd.DataFrame(columns=["trimestre_vente", "prix_vente"])
 
-    # On renvoie les deux mesures
-    return temps_moyen_rotation, ventes_par_trimestre
+def validate_bulk_sales(df_ventes, stock, comptes):
+    """
+    Vérifie un lot de ventes (colonnes BULK_SALE_COLUMNS) et calcule les gains
+    de toutes les lignes en une fois.
+    Retourne (ventes avec leurs gains, liste des erreurs) ; les ventes ne
+    doivent être enregistrées que si la liste d'erreurs est vide.
+    """
+    missing = [column for column in BULK_SALE_COLUMNS if column not in df_ventes.columns]
+    if missing:
+        return None, [f"Colonnes manquantes : {', '.join(missing)}"]
+
+    ventes = df_ventes[BULK_SALE_COLUMNS].dropna(how="all").reset_index(drop=True)
+    ids = pd.to_numeric(ventes["id"], errors="coerce")
+    # Un ID non entier (ex. "3.5") est signalé comme invalide, comme un ID illisible
+    ventes["id"] = ids.where(ids % 1 == 0).astype("Int64")
+    ventes["prix_vente"] = pd.to_numeric(ventes["prix_vente"], errors="coerce")
+    ventes["date_vente"] = parse_sale_dates(ventes["date_vente"])
+    ventes["compte_vente"] = ventes["compte_vente"].astype("string").str.strip()
+
+    # Recherche des articles du lot dans le stock indexé par ID
+    articles = stock.lookup(ventes["id"], ["prix_achat", "prix_vente", "description"])
+    prix_achat = articles["prix_achat"]
+    deja_vendu = articles["prix_vente"].notna()
+
+    checks = [
+        (ventes["id"].isna(), "ID manquant ou invalide"),
+        (ventes["id"].notna() & ~ventes["id"].map(lambda i: i in stock).astype(bool), "article introuvable"),
+        (ventes["id"].notna() & ventes["id"].duplicated(keep=False), "article présent plusieurs fois"),
+        (deja_vendu, "article déjà vendu"),
+        (ventes["prix_vente"].isna() | (ventes["prix_vente"] < 0), "prix de vente invalide"),
+        (ventes["date_vente"].isna(), "date de vente invalide"),
+        (~ventes["compte_vente"].isin(comptes).fillna(False), "compte de vente inconnu"),
+    ]
+    errors = []
+    for mask, message in checks:
+        for position in np.flatnonzero(mask.fillna(False).to_numpy(dtype=bool)):
+            article_id = ventes["id"].iloc[position]
+            article = f"article {article_id}" if pd.notna(article_id) else "sans ID"
+            errors.append((position, f"Ligne {position + 1} ({article}) : {message}"))
+    if errors:
+        return ventes, [message for _, message in sorted(errors, key=lambda error: error[0])]
+
+    gains = compute_gains(prix_achat.to_numpy(dtype=float), ventes["prix_vente"].to_numpy(dtype=float))
+    for column, values in zip(["gain_valeur", "gain_percent", "gain_apres_impots_valeur",
+                               "gain_apres_impots_percent"], gains):
+        ventes[column] = values
+    ventes["description"] = articles["description"]
+    ventes["prix_achat"] = prix_achat
+    return ventes, []
+
+
+def bulk_sale_events(ventes):
+    """Un événement de vente par ligne d'un lot validé (cf. validate_bulk_sales)."""
+    fields = ventes.drop(columns=["id", "description", "prix_achat"]).assign(
+        date_vente=ventes["date_vente"].dt.strftime("%Y-%m-%d"),
+        compte_vente=ventes["compte_vente"].astype(object),
+    )
+    return [stock_journal.article_sold(int(article_id), row)
+            for article_id, row in zip(ventes["id"], fields.to_dict("records"))]
 
 
 # =========================
@@ -237,39 +595,40 @@ def user_authentication():
 # === PAGES DE L'APPLI ===
 # =========================
 
-def page_ajout_article(drive, df_stock):
+def page_ajout_article(drive, stock):
     st.title("Ajout d'un article au stock")
     
-    photo_file = st.file_uploader("Photo de l'article", type=["png", "jpg", "jpeg"])
+    photo_file = st.file_uploader("Photo de l'article", type=["png", "jpg", "jpeg", "webp"])
     prix_achat = st.number_input("Prix d'achat", min_value=0, step=1, format="%d")
     description = st.text_area("Description")
     taille = st.text_input("Taille")
     collection = st.text_input("Collection")
-    estimation = st.number_input("Estimation (prix de vente estimé)", min_value=0, step=1, format="%d")
+
+    # 💡 Estimation pré-remplie d'après les ventes passées (même collection / taille)
+    estimator, _ = stock.estimations()
+    prix_estime, jours_estimes = estimator.estimate(prix_achat, collection, taille)
+    estimation = st.number_input("Estimation (prix de vente estimé)", min_value=0, step=1, format="%d",
+                                 value=int(round(prix_estime)) if prix_estime else 0)
+    if prix_estime:
+        st.caption(f"💡 Pré-remplie d'après {estimator.n_sales} ventes : "
+                   f"vente estimée dans {jours_estimes:.0f} jours environ.")
     
     if st.button("Enregistrer"):
         # Upload de la photo sur Drive (si une photo est présente)
-        photo_id = None
+        photo_id, thumbnail_id = None, None
         if photo_file is not None:
-            # Il faut d'abord sauvegarder la photo en local (temporairement) pour SetContentFile
-            with open(photo_file.name, "wb") as f:
-                f.write(photo_file.getvalue())
-            
-            photo_id = upload_photo_to_drive(drive, photo_file)
-            # On peut effacer le fichier local ensuite
-            os.remove(photo_file.name)
+            photo_id, thumbnail_id = upload_photo_to_drive(drive, photo_file)
 
         # Création d'un nouvel ID unique
-        new_id = 1
-        if not df_stock.empty:
-            new_id = df_stock["id"].max() + 1
-        
+        new_id = stock.next_id()
+
         now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         new_row = {
             "id": new_id,
             "date_arrivee": now_str,
             "photo_id": photo_id,
+            "thumbnail_id": thumbnail_id,
             "prix_achat": prix_achat,
             "description": description,
             "taille": taille,
@@ -284,69 +643,108 @@ def page_ajout_article(drive, df_stock):
             "gain_apres_impots_percent": np.nan
         }
         
-        df_stock = pd.concat([df_stock, pd.DataFrame([new_row])], ignore_index=True)
-
-
-        # Upload CSV
-        upload_csv_to_drive(drive, CSV_FILENAME, df_stock)
-        st.success("Article ajouté avec succès !")
-    
-    return df_stock
+        # Enregistrement dans le journal (delta de quelques centaines d'octets)
+        try:
+            record_stock_events(drive, stock, [stock_journal.article_added(new_row)])
+            st.success("Article ajouté avec succès !")
+        except Exception as e:
+            st.error(f"Erreur lors de l'enregistrement de l'article : {e}")
 
-def page_consultation_stock(drive, df_stock):
+def page_consultation_stock(drive, stock):
     st.title("Consultation du stock")
 
-    # Filtres
-    tailles_dispo = df_stock["taille"].dropna().unique().tolist()
-    collections_dispo = df_stock["collection"].dropna().unique().tolist()
+    # Filtres (valeurs tirées de l'index, sans parcourir le stock)
+    tailles_dispo, collections_dispo = stock.filter_values()
 
 
     # ✅ Ajout de la checkbox pour afficher uniquement les produits non vendus
     filter_non_vendu = st.checkbox("Afficher uniquement les produits non vendus", value=True)
     selected_taille = st.selectbox("Filtrer par taille", ["(Toutes)"] + tailles_dispo)
     selected_collection = st.selectbox("Filtrer par collection", ["(Toutes)"] + collections_dispo)
-    search_description = st.text_input("Recherche (description contient)")
-
-    # Appliquer les filtres
-    df_filtered = df_stock.copy()
-    if selected_taille != "(Toutes)":
-        df_filtered = df_filtered[df_filtered["taille"] == selected_taille]
-    if selected_collection != "(Toutes)":
-        df_filtered = df_filtered[df_filtered["collection"] == selected_collection]
-    if search_description:
-        df_filtered = df_filtered[df_filtered["description"].str.contains(search_description, case=False, na=False)]
-    # ✅ Appliquer le filtre "non vendu" si la checkbox est cochée
-    if filter_non_vendu:
-        df_filtered = df_filtered[df_filtered["prix_vente"].isna()]
-
-    # 🔹 Ajouter les URLs d'images
-    if "photo_id" in df_filtered.columns:
-        df_filtered["Image"] = df_filtered["photo_id"].apply(get_drive_image_url)
+    search_description = st.text_input("Recherche (mots de la description, début de mot suffit)")
+
+    # Appliquer les filtres (intersections dans l'index de recherche)
+    df_filtered = stock.search(
+        taille=None if selected_taille == "(Toutes)" else selected_taille,
+        collection=None if selected_collection == "(Toutes)" else selected_collection,
+        text=search_description,
+        # ✅ Filtre "non vendu" si la checkbox est cochée
+        unsold_only=filter_non_vendu,
+    )
 
     if df_filtered.empty:
         st.warning("Aucun article disponible.")
         return
 
+    # 📄 Pagination : seuls les articles de la page courante sont affichés
+    total = len(df_filtered)
+    page_size = st.selectbox("Articles par page", CONSULTATION_PAGE_SIZES)
+    nb_pages = max(1, math.ceil(total / page_size))
+
+    # Retour à la première page quand les filtres changent
+    filtres = (filter_non_vendu, selected_taille, selected_collection, search_description, page_size)
+    if st.session_state.get("consultation_filtres") != filtres:
+        st.session_state.consultation_filtres = filtres
+        st.session_state.consultation_page = 1
+    # Le stock a pu diminuer depuis le dernier affichage
+    st.session_state.consultation_page = min(st.session_state.get("consultation_page", 1), nb_pages)
+
+    def changer_page(delta):
+        st.session_state.consultation_page = min(max(1, st.session_state.consultation_page + delta), nb_pages)
+
+    nav_prev, nav_page, nav_next = st.columns([1, 2, 1])
+    with nav_prev:
+        st.button("◀ Précédent", on_click=changer_page, args=(-1,),
+                  disabled=st.session_state.consultation_page <= 1)
+    with nav_page:
+        page = st.number_input(f"Page (sur {nb_pages})", min_value=1, max_value=nb_pages,
+                               step=1, key="consultation_page")
+    with nav_next:
+        st.button("Suivant ▶", on_click=changer_page, args=(1,),
+                  disabled=st.session_state.consultation_page >= nb_pages)
+
+    debut = (page - 1) * page_size
+    df_page = df_filtered.iloc[debut:debut + page_size]
+    st.caption(f"Articles {debut + 1} à {debut + len(df_page)} sur {total}")
+
+    # 🖼️ Vignettes de la page servies depuis le cache local (téléchargées en parallèle si besoin),
+    # puis préchargement de la page suivante en arrière-plan
+    thumbnails = get_thumbnail_cache()
+    def vignettes_drive(df):
+        # Vignettes envoyées avec les photos (articles ajoutés depuis le redimensionnement à l'upload)
+        df = df.dropna(subset=["photo_id", "thumbnail_id"])
+        return dict(zip(df["photo_id"], df["thumbnail_id"]))
+
+    photo_ids = df_page["photo_id"].dropna().tolist()
+    vignettes = thumbnails.get_many(drive, photo_ids, GRID_THUMBNAIL_SIZE, vignettes_drive(df_page))
+    page_suivante = df_filtered.iloc[debut + page_size:debut + 2 * page_size]
+    thumbnails.prefetch(drive, page_suivante["photo_id"].dropna().tolist(), GRID_THUMBNAIL_SIZE,
+                        vignettes_drive(page_suivante))
+
     num_cols = 3  # Nombre d'articles par ligne
     cols = st.columns(num_cols)  # Création de colonnes
 
-    for index, row in df_filtered.iterrows():
-        col = cols[index % num_cols]  # Répartition équilibrée dans les colonnes
-        with col:
-            st.image(get_drive_image_url(row["photo_id"], size=700))
-                    #  , use_container_width=True)  # Image de l'article
-            st.markdown(f"**{row['description']}**")
-            st.markdown(f"📏 **Taille :** {row['taille']}")
-            st.markdown(f"👜 **Collection :** {row['collection']}")
-            st.markdown(f"💰 **Prix Achat :** {row['prix_achat']} €")
-            if pd.notna(row["prix_vente"]):
-                st.markdown(f"💸 **Prix Vente :** {row['prix_vente']} €")
+    # 🖼️ Rendu de la grille (chronométré si les mesures sont activées)
+    with instrumentation.timed("render.grille"):
+        for position, (_, row) in enumerate(df_page.iterrows()):
+            col = cols[position % num_cols]  # Répartition équilibrée dans les colonnes
+            with col:
+                if pd.notna(row["photo_id"]):
+                    # Repli sur le lien Drive si la photo n'a pas pu être mise en cache
+                    st.image(vignettes.get(row["photo_id"])
+                             or get_drive_image_url(row["photo_id"], size=GRID_THUMBNAIL_SIZE))
+                st.markdown(f"**{row['description']}**")
+                st.markdown(f"📏 **Taille :** {row['taille']}")
+                st.markdown(f"👜 **Collection :** {row['collection']}")
+                st.markdown(f"💰 **Prix Achat :** {row['prix_achat']} €")
+                if pd.notna(row["prix_vente"]):
+                    st.markdown(f"💸 **Prix Vente :** {row['prix_vente']} €")
 
-            # 🔹 Bouton "Fiche détaillée" pour changer de page
-            if st.button(f"📄 Fiche détaillée {row['id']}", key=f"fiche_{row['id']}"):
-                st.session_state.selected_article_id = row["id"]
-                st.session_state.page = "Fiche détaillée"
-                st.rerun()  # Redémarre l'affichage
+                # 🔹 Bouton "Fiche détaillée" pour changer de page
+                if st.button(f"📄 Fiche détaillée {row['id']}", key=f"fiche_{row['id']}"):
+                    st.session_state.selected_article_id = row["id"]
+                    st.session_state.page = "Fiche détaillée"
+                    st.rerun()  # Redémarre l'affichage
 
 
 
@@ -359,7 +757,23 @@ def page_consultation_stock(drive, df_stock):
     #     else:
     #         st.error("Aucun article avec cet ID dans la liste filtrée.")
 
-def article_details(drive, df_stock, article_id):
+def load_sales_accounts(drive, active_only=True):
+    """
+    Liste des comptes de vente (registre en mémoire, cf. get_sales_accounts).
+    Si aucun compte n'est défini, le registre est créé avec les comptes par défaut.
+    """
+    registry = get_sales_accounts()
+    try:
+        if registry.ensure_defaults(drive):
+            st.info("Aucun compte de vente n'était défini : un CSV par défaut a été créé.")
+        return registry.accounts(drive, active_only=active_only)
+    except Exception as e:
+        # Jamais de registre par défaut écrit à la place d'un registre illisible
+        st.error(f"Erreur lors de la lecture des comptes de vente sur Google Drive : {e}")
+        return []
+
+
+def article_details(drive, stock, article_id):
     """
     Affiche la page détaillée d'un article en deux colonnes :
     - 📷 À gauche : l'image
@@ -367,22 +781,24 @@ def article_details(drive, df_stock, article_id):
     """
     st.title(f"Fiche détaillée - Article ID {article_id}")
 
-    df_article = df_stock[df_stock["id"] == article_id]
-    if df_article.empty:
+    row = stock.get(article_id)
+    if row is None:
         st.error("Article introuvable.")
         return
 
-    row = df_article.iloc[0]
-
     # 🔹 Mise en page en deux colonnes
     col1, col2 = st.columns([2, 2])  # Ajuste les proportions (1/3 - 2/3)
 
     with col1:
         # 📷 Affichage de l'image
         if pd.notna(row["photo_id"]):
-            image_url = get_drive_image_url(row["photo_id"], size=300)
-            # 📌 Remplace `st.image()` par `st.markdown()`
-            st.markdown(f'<img src="{image_url}" width="100%">', unsafe_allow_html=True)
+            image = get_thumbnail_cache().get(drive, row["photo_id"], DETAIL_IMAGE_SIZE)
+            if image is not None:
+                st.image(image)
+            else:
+                image_url = get_drive_image_url(row["photo_id"], size=300)
+                # 📌 Repli sur le lien Drive si la photo n'a pas pu être mise en cache
+                st.markdown(f'<img src="{image_url}" width="100%">', unsafe_allow_html=True)
 
         else:
             st.warning("Aucune image disponible.")
@@ -395,6 +811,16 @@ def article_details(drive, df_stock, article_id):
         st.write(f"**👜 Collection :** {row['collection']}")
         st.write(f"**💲 Estimation :** {row['estimation']} €")
 
+        # 📈 Prix et délai de vente attendus (articles non vendus, cf. stock_estimator)
+        if pd.isna(row["prix_vente"]):
+            estimator, _ = stock.estimations()
+            anciennete = (pd.Timestamp.now() - row["date_arrivee"]).days if pd.notna(row["date_arrivee"]) else 0
+            prix_attendu, jours = estimator.estimate(row["prix_achat"], row["collection"], row["taille"],
+                                                     max(anciennete, 0))
+            if prix_attendu is not None:
+                st.write(f"**📈 Prix de vente attendu :** {prix_attendu:.0f} €")
+            st.write(f"**⏳ Vente estimée dans :** {jours:.0f} jours")
+
     # # 🔙 Bouton de retour en bas
     # st.markdown("---")
     # if st.button("🔙 Retour au stock"):
@@ -426,29 +852,8 @@ def article_details(drive, df_stock, article_id):
         prix_vente_reel = st.number_input("Prix de vente réel", min_value=0, step=1, format="%d")
         date_vente = st.date_input("Date de vente", datetime.date.today())
 
-        # 🔍 Vérification du chargement des comptes de vente
-        # Chargement du CSV des comptes de vente
-        df_comptes = download_csv_from_drive(drive, CSV_SALES_ACCOUNT_FILENAME)
-
-        # Vérifier si le DataFrame est vide ou si la colonne "compte" n'existe pas
-        if df_comptes.empty or "compte" not in df_comptes.columns:
-            # On crée un DataFrame par défaut
-            default_comptes = [
-                "vestiaire coco",
-                "vestiaire ludo",
-                "vestiaire carine",
-                "vestiaire michelle",
-                "vestiaire pro",
-                "vestiaire persephone"
-            ]
-            df_comptes = pd.DataFrame({"compte": default_comptes})
-
-            # On sauvegarde ce nouveau CSV sur Drive
-            upload_csv_to_drive(drive, CSV_SALES_ACCOUNT_FILENAME, df_comptes)
-            st.info("Aucun compte de vente n'était défini : un CSV par défaut a été créé.")
-
-        # Maintenant, on peut directement utiliser df_comptes
-        comptes_list = df_comptes["compte"].dropna().unique().tolist()
+        # 🔍 Chargement des comptes de vente
+        comptes_list = load_sales_accounts(drive)
         compte_vente = st.selectbox("Compte de vente", comptes_list)
 
 
@@ -458,17 +863,17 @@ def article_details(drive, df_stock, article_id):
                 # Calcul des gains
                 gain_valeur, gain_percent, gain_imp_val, gain_imp_percent = compute_gains(row["prix_achat"], prix_vente_reel)
 
-                # Mise à jour du DataFrame
-                df_stock.loc[df_stock["id"] == article_id, "prix_vente"] = prix_vente_reel
-                df_stock.loc[df_stock["id"] == article_id, "date_vente"] = str(date_vente)
-                df_stock.loc[df_stock["id"] == article_id, "compte_vente"] = compte_vente
-                df_stock.loc[df_stock["id"] == article_id, "gain_valeur"] = gain_valeur
-                df_stock.loc[df_stock["id"] == article_id, "gain_percent"] = gain_percent
-                df_stock.loc[df_stock["id"] == article_id, "gain_apres_impots_valeur"] = gain_imp_val
-                df_stock.loc[df_stock["id"] == article_id, "gain_apres_impots_percent"] = gain_imp_percent
-
-                # ✅ Enregistrer la mise à jour sur Google Drive
-                upload_csv_to_drive(drive, CSV_FILENAME, df_stock)  # Correction ici !
+                # ✅ Enregistrer la vente dans le journal Google Drive
+                event = stock_journal.article_sold(article_id, {
+                    "prix_vente": prix_vente_reel,
+                    "date_vente": str(date_vente),
+                    "compte_vente": compte_vente,
+                    "gain_valeur": gain_valeur,
+                    "gain_percent": gain_percent,
+                    "gain_apres_impots_valeur": gain_imp_val,
+                    "gain_apres_impots_percent": gain_imp_percent,
+                })
+                record_stock_events(drive, stock, [event])
 
                 st.success("✅ Article mis à jour comme vendu !")
                 st.balloons()  # Effet sympa après validation
@@ -479,59 +884,410 @@ def article_details(drive, df_stock, article_id):
 
 
 
-def page_statistiques(df_stock):
+def page_ventes_en_lot(drive, stock):
+    """
+    Marque plusieurs articles comme vendus en une fois : saisie dans un
+    tableau ou import d'un CSV (id, prix_vente, date_vente, compte_vente).
+    Tout le lot est vérifié, puis enregistré en une seule écriture.
+    """
+    st.title("Ventes en lot")
+
+    comptes_list = load_sales_accounts(drive)
+    source = st.radio("Saisie des ventes", ["Tableau", "Import CSV"], horizontal=True)
+
+    if source == "Tableau":
+        # 📝 Tableau éditable, une ligne par vente
+        df_saisie = st.data_editor(
+            pd.DataFrame({
+                "id": pd.Series(dtype="Int64"),
+                "prix_vente": pd.Series(dtype="float64"),
+                "date_vente": pd.Series(dtype="datetime64[ns]"),
+                "compte_vente": pd.Series(dtype="string"),
+            }),
+            num_rows="dynamic",
+            key="ventes_en_lot_tableau",
+            column_config={
+                "id": st.column_config.NumberColumn("ID article", min_value=0, step=1, required=True),
+                "prix_vente": st.column_config.NumberColumn("Prix de vente", min_value=0, step=1, required=True),
+                "date_vente": st.column_config.DateColumn("Date de vente", default=datetime.date.today()),
+                "compte_vente": st.column_config.SelectboxColumn("Compte de vente", options=comptes_list),
+            },
+        )
+    else:
+        # 📂 Import d'un fichier CSV (séparateur détecté automatiquement)
+        fichier = st.file_uploader("Fichier CSV (id, prix_vente, date_vente en AAAA-MM-JJ ou JJ/MM/AAAA, compte_vente)",
+                                   type=["csv"])
+        if fichier is None:
+            return
+        try:
+            df_saisie = pd.read_csv(fichier, sep=None, engine="python")
+        except Exception as e:
+            st.error(f"❌ Fichier illisible : {e}")
+            return
+
+    if df_saisie.dropna(how="all").empty:
+        st.info("Ajoute au moins une vente pour continuer.")
+        return
+
+    ventes, erreurs = validate_bulk_sales(df_saisie, stock, comptes_list)
+    if erreurs:
+        st.error(f"❌ {len(erreurs)} erreur(s) dans le lot, rien n'a été enregistré :")
+        st.markdown("\n".join(f"- {erreur}" for erreur in erreurs))
+        return
+
+    # 🔍 Aperçu du lot avec les gains calculés
+    st.dataframe(ventes[["id", "description", "prix_achat", "prix_vente", "date_vente", "compte_vente",
+                         "gain_valeur", "gain_percent", "gain_apres_impots_valeur"]],
+                 hide_index=True)
+    st.write(f"- **Total des ventes :** {ventes['prix_vente'].sum():.2f}")
+    st.write(f"- **Gain total après impôts :** {ventes['gain_apres_impots_valeur'].sum():.2f}")
+
+    if st.button(f"✅ Enregistrer les {len(ventes)} ventes"):
+        try:
+            record_stock_events(drive, stock, bulk_sale_events(ventes))
+            st.success(f"✅ {len(ventes)} articles mis à jour comme vendus !")
+        except Exception as e:
+            st.error(f"❌ Erreur lors de l'enregistrement des ventes : {e}")
+
+
+
+def page_comptes_de_vente(drive, stock):
+    """
+    Administration du registre des comptes de vente : ajout, renommage,
+    activation / désactivation, et contrôle des comptes utilisés dans le stock.
+    """
+    st.title("Comptes de vente")
+
+    registry = get_sales_accounts()
+    try:
+        registry.ensure_defaults(drive)
+        table = registry.table(drive)
+    except Exception as e:
+        st.error(f"Erreur lors de la lecture des comptes de vente sur Google Drive : {e}")
+        return
+    comptes_stock = stock.frame()["compte_vente"]
+
+    # 📋 Comptes du registre et nombre de ventes de chacun
+    nb_ventes = comptes_stock.astype("string").str.strip().value_counts()
+    st.dataframe(table.assign(nb_ventes=table["compte"].map(nb_ventes).fillna(0).astype(int))
+                 .rename(columns={"compte": "Compte", "actif": "Actif", "nb_ventes": "Ventes"}),
+                 hide_index=True)
+
+    def appliquer(action):
+        try:
+            resultat = action()
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
+        if resultat == sales_accounts.WRITTEN:
+            st.success("✅ Registre des comptes mis à jour.")
+            st.rerun()
+        elif resultat == sales_accounts.OVERWRITTEN:
+            st.warning("⚠️ Registre mis à jour, mais une modification faite au même moment depuis un autre "
+                       "poste a pu être écrasée : vérifie la liste ci-dessus (relue depuis Drive).")
+        else:
+            st.warning("⚠️ Le registre n'a pas pu être écrit (modifié entre-temps ou Drive injoignable) : "
+                       "il a été relu, recommence.")
+
+    # ➕ Ajout
+    st.write("## Ajouter un compte")
+    nouveau = st.text_input("Nom du compte")
+    if st.button("➕ Ajouter"):
+        appliquer(lambda: registry.add(drive, [nouveau]))
+
+    comptes = table["compte"].tolist()
+    if not comptes:
+        return
+
+    # ✏️ Renommage (et, au choix, des ventes déjà enregistrées sous l'ancien nom)
+    st.write("## Renommer un compte")
+    ancien = st.selectbox("Compte à renommer", comptes)
+    nom = st.text_input("Nouveau nom")
+    renommer_ventes = st.checkbox("Renommer aussi le compte des ventes existantes", value=True)
+    if st.button("✏️ Renommer"):
+        def renommer():
+            resultat = registry.rename(drive, ancien, nom)
+            # Le nouveau nom est sur Drive (même par-dessus une autre écriture) : les ventes suivent
+            if resultat != sales_accounts.NOT_WRITTEN:
+                ids = stock.frame().loc[comptes_stock.astype("string").str.strip() == ancien, "id"]
+                if renommer_ventes and len(ids):
+                    record_stock_events(drive, stock, [stock_journal.article_updated(int(article_id),
+                                                                                    {"compte_vente": nom.strip()})
+                                                       for article_id in ids])
+            return resultat
+        appliquer(renommer)
+
+    # 🔒 Activation / désactivation
+    st.write("## Activer / désactiver un compte")
+    compte = st.selectbox("Compte", comptes, key="compte_actif")
+    actif = bool(table.loc[table["compte"] == compte, "actif"].iloc[0])
+    st.caption("Un compte désactivé n'est plus proposé pour les nouvelles ventes ; ses ventes passées sont conservées.")
+    if st.button("🔒 Désactiver" if actif else "🔓 Réactiver"):
+        appliquer(lambda: registry.set_active(drive, compte, not actif))
+
+    # 🔍 Comptes utilisés dans le stock mais absents du registre
+    st.write("## Contrôle du stock")
+    inconnus = sales_accounts.unknown_accounts(table, comptes_stock)
+    if inconnus.empty:
+        st.success("✅ Toutes les ventes du stock utilisent un compte du registre.")
+    else:
+        st.warning(f"⚠️ {int(inconnus.sum())} vente(s) utilisent un compte absent du registre :")
+        st.dataframe(inconnus.rename_axis("Compte").rename("Ventes").reset_index(), hide_index=True)
+        if st.button("➕ Ajouter ces comptes au registre"):
+            appliquer(lambda: registry.add(drive, inconnus.index.tolist()))
+
+
+def page_statistiques(stock):
     st.title("Statistiques")
-    
-    # Nombre total d'articles
-    total_articles = len(df_stock)
-    
-    # Nombre d'articles en stock (prix_vente NaN => pas encore vendu)
-    df_en_stock = df_stock[df_stock["prix_vente"].isna()]
-    nb_en_stock = len(df_en_stock)
-    
-    # Gain médian en % sur les articles vendus
-    df_vendus = df_stock.dropna(subset=["prix_vente"])
-    if not df_vendus.empty:
-        gain_median_percent = df_vendus["gain_percent"].median()
+
+    # Statistiques tenues à jour au fil des ajouts / ventes (cf. stock_stats)
+    stats = stock.stats()
+
+    # Espérances des articles non vendus, d'après les ventes passées de leur
+    # collection / taille et leur ancienneté (cf. stock_estimator)
+    estimator, esperances = stock.estimations()
+
+    # Valeur du stock = somme des prix d'achat des articles non vendus
+    # Espérance de gain à venir = somme des gains attendus des articles non vendus
+    # (à défaut de ventes : gain médian (en %) * valeur du stock)
+    st.write(f"- **Nombre total d'articles :** {stats['total_articles']}")
+    st.write(f"- **Nombre d'articles en stock :** {stats['nb_en_stock']}")
+    st.write(f"- **Gain médian en % (articles vendus) :** {stats['gain_median_percent']:.2f}%")
+    st.write(f"- **Valeur du stock (basée sur prix d'achat) :** {stats['valeur_stock']:.2f}")
+    if estimator.fitted and not esperances.empty:
+        gain_attendu = esperances["gain_attendu"].sum()
+        gain_apres_impots = gain_attendu - esperances["prix_attendu"].sum() * TAX_RATE
+        delai = (esperances["jours_attendus"] * esperances["nb_articles"]).sum() / esperances["nb_articles"].sum()
+        st.write(f"- **Espérance de gain à venir :** {gain_attendu:.2f} (après impôts : {gain_apres_impots:.2f})")
+        st.write(f"- **Délai de vente moyen estimé (articles en stock, jours) :** {delai:.0f}")
     else:
-        gain_median_percent = 0.0
-    
-    # Espérance de gain à venir = gain_median * valeur du stock
-    # Valeur du stock = somme des prix d'achat (ou estimation ?)
-    # A clarifier, on suppose somme des prix d'achat
-    valeur_stock = df_en_stock["prix_achat"].sum()
-    # Espérance = (gain_median en %) * valeur du stock / 100
-    esperance_gain = (gain_median_percent / 100) * valeur_stock
-    
-    st.write(f"- **Nombre total d'articles :** {total_articles}")
-    st.write(f"- **Nombre d'articles en stock :** {nb_en_stock}")
-    st.write(f"- **Gain médian en % (articles vendus) :** {gain_median_percent:.2f}%")
-    st.write(f"- **Valeur du stock (basée sur prix d'achat) :** {valeur_stock:.2f}")
-    st.write(f"- **Espérance de gain à venir :** {esperance_gain:.2f}")
-
-    # Analyse plus poussée (proposition #4)
-    temps_moyen_rotation, ventes_par_trimestre = calculate_advanced_stats(df_stock)
-    st.write(f"- **Temps moyen de rotation (jours) :** {temps_moyen_rotation:.2f}")
-    
+        st.write(f"- **Espérance de gain à venir :** {stats['esperance_gain']:.2f}")
+    st.write(f"- **Temps moyen de rotation (jours) :** {stats['temps_moyen_rotation']:.2f}")
+
+    if estimator.fitted and not esperances.empty:
+        st.write("### Espérances du stock par collection")
+        st.dataframe(esperances.assign(
+            gain_apres_impots_attendu=esperances["gain_attendu"] - esperances["prix_attendu"] * TAX_RATE,
+        ).round(2), hide_index=True)
+
     st.write("### Volume des ventes par trimestre")
-    if ventes_par_trimestre.empty:
+    if stats["ventes_par_trimestre"].empty:
         st.write("Aucune vente.")
     else:
-        st.dataframe(ventes_par_trimestre)
+        st.dataframe(stats["ventes_par_trimestre"])
 
     # Tableau récap des ventes par trimestre et compte de vente
     st.write("### Récap des ventes par trimestre et compte de vente")
-    if not df_vendus.empty:
-        df_vendus["date_vente"] = pd.to_datetime(df_vendus["date_vente"])
-        df_vendus["trimestre_vente"] = df_vendus["date_vente"].dt.to_period("Q")
-        
-        recap = df_vendus.groupby(["trimestre_vente", "compte_vente"])["prix_vente"].sum().reset_index()
-        st.dataframe(recap)
+    if not stats["recap"].empty:
+        st.dataframe(stats["recap"])
     else:
         st.write("Aucune vente pour le moment.")
 
 
+def page_analyses(stock):
+    """
+    Analyse des ventes sur plusieurs années : regroupement par jour / semaine /
+    mois / trimestre / année, par compte, collection ou taille, filtres et
+    zoom sur une période (cf. stock_analytics).
+    """
+    st.title("Analyses des ventes")
+
+    PERIODS, MEASURES, DIMENSIONS = stock_analytics.PERIODS, stock_analytics.MEASURES, stock_analytics.DIMENSIONS
+    cube = stock.analytics()
+    if cube.empty:
+        st.write("Aucune vente pour le moment.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        periode = st.selectbox("Période", list(PERIODS), index=list(PERIODS).index("Mois"))
+    with col2:
+        mesure = st.selectbox("Mesure", list(MEASURES), format_func=MEASURES.get)
+    with col3:
+        regroupement = st.selectbox("Regrouper par", [None] + list(DIMENSIONS),
+                                    format_func=lambda dim: "(aucun)" if dim is None else DIMENSIONS[dim])
+
+    # 🔍 Filtres sur les axes d'analyse
+    with st.expander("Filtres"):
+        filtres = {dim: st.multiselect(label, cube.values(dim)) for dim, label in DIMENSIONS.items()}
+
+    by = [regroupement] if regroupement else []
+    resultat = cube.query(PERIODS[periode], by=by, filters=filtres)
+    if resultat.empty:
+        st.warning("Aucune vente ne correspond aux filtres.")
+        return
+
+    st.bar_chart(cube.chart_frame(resultat, mesure, regroupement))
+
+    # 🔎 Zoom sur une période : détail au niveau inférieur (ex. un trimestre -> ses mois)
+    niveaux = list(PERIODS)
+    if periode != niveaux[0]:
+        periodes = sorted(resultat["periode"].unique())
+        zoom = st.selectbox("Détailler une période", [None] + periodes,
+                            format_func=lambda p: "(aucune)" if p is None else str(p))
+        if zoom is not None:
+            niveau_fin = niveaux[niveaux.index(periode) - 1]
+            detail = cube.query(PERIODS[niveau_fin], by=by, filters=filtres,
+                                start=zoom.start_time, end=zoom.end_time)
+            st.write(f"### {zoom} par {niveau_fin.lower()}")
+            st.bar_chart(cube.chart_frame(detail, mesure, regroupement))
+
+    # 📋 Tableau des agrégats affichés
+    colonnes = ["periode", *by, "nb_ventes", "chiffre_affaires", "gain", "gain_apres_impots", "rotation_moyenne"]
+    st.dataframe(resultat[colonnes].assign(periode=resultat["periode"].astype(str))
+                 .rename(columns={**MEASURES, **DIMENSIONS, "periode": periode}), hide_index=True)
+
+
+def afficher_etat_envois():
+    """Indicateur de la file d'envoi vers Drive dans la barre latérale."""
+    queue = get_upload_queue()
+    etat = queue.status()
+    if etat["pending"]:
+        st.sidebar.info(f"⏫ {etat['pending']} envoi(s) vers Drive en cours…")
+    else:
+        st.sidebar.caption("✅ Tous les envois vers Drive sont terminés")
+    if etat["failed"]:
+        st.sidebar.error(f"❌ {etat['failed']} envoi(s) en échec : {etat['last_error'] or ''}")
+        if st.sidebar.button("🔁 Réessayer les envois"):
+            queue.retry_failed()
+            st.rerun()
+
+
+def format_duree(secondes):
+    """Durée lisible : « 12 s », « 5 min », « 3 h », « 2 j »."""
+    secondes = max(0, int(secondes))
+    if secondes < 60:
+        return f"{secondes} s"
+    if secondes < 3600:
+        return f"{secondes // 60} min"
+    if secondes < 86400:
+        return f"{secondes // 3600} h"
+    return f"{secondes // 86400} j"
+
+
+def decrire_conflit(conflit):
+    """Message affiché pour un conflit de synchronisation (cf. stock_sync)."""
+    detail = conflit["detail"]
+    if conflit["kind"] == "vente_concurrente":
+        champs = ", ".join(f"{champ} : {valeurs['ici']} ici / {valeurs['ailleurs']} ailleurs"
+                           for champ, valeurs in detail["differences"].items())
+        retenue = "celle de ce serveur" if detail["retenue"] == "ici" else "celle de l'autre serveur"
+        return f"Article {detail['article']} vendu ici et sur un autre serveur ({champs}) : vente retenue, {retenue}."
+    if conflit["kind"] == "id_en_double":
+        return (f"ID {detail['article']} attribué ici (« {detail['ici']} ») et sur un autre serveur "
+                f"(« {detail['ailleurs']} ») : le second ajout a reçu un nouvel ID.")
+    if conflit["kind"] == "delta_renomme":
+        return (f"{detail['evenements']} modification(s) faite(s) hors ligne, antérieure(s) au dernier "
+                f"compactage du journal, rejouée(s) après les modifications plus récentes.")
+    return f"{conflit['kind']} : {detail}"
+
+
+def afficher_etat_synchro():
+    """
+    État de la synchronisation du stock avec Drive dans la barre latérale :
+    fraîcheur de la copie locale, modifications en attente d'envoi, panne de
+    Drive et conflits. Lu dans la base locale, sans appel à Drive.
+    """
+    etat = get_local_store().status()
+    if not etat["has_snapshot"] and not etat["pending"]:
+        return  # Stock pas encore chargé sur ce serveur
+    maintenant = time.time()
+
+    if etat["failing_since"]:
+        st.sidebar.warning(f"📴 Drive injoignable depuis {format_duree(maintenant - etat['failing_since'])} : "
+                           f"le stock affiché est la copie locale, les modifications seront envoyées "
+                           f"au retour de Drive.")
+        st.sidebar.caption(etat["last_error"] or "")
+    if etat["pending"]:
+        st.sidebar.info(f"⏫ {etat['pending']} modification(s) du stock en attente d'envoi "
+                        f"(depuis {format_duree(maintenant - etat['oldest_pending'])})")
+    elif etat["last_success"]:
+        st.sidebar.caption(f"🔄 Stock synchronisé avec Drive il y a {format_duree(maintenant - etat['last_success'])}")
+    if st.sidebar.button("🔄 Synchroniser maintenant"):
+        get_stock_sync().request()
+        st.sidebar.caption("Synchronisation demandée.")
+
+    if etat["conflicts"]:
+        st.sidebar.error(f"⚠️ {len(etat['conflicts'])} conflit(s) de synchronisation")
+        with st.sidebar.expander("Voir les conflits"):
+            for conflit in etat["conflicts"]:
+                heure = datetime.datetime.fromtimestamp(conflit["detected_at"]).strftime("%d/%m %H:%M")
+                st.write(f"**{heure}** - {decrire_conflit(conflit)}")
+            if st.button("✔️ Marquer comme vus"):
+                get_local_store().mark_conflicts_seen([conflit["id"] for conflit in etat["conflicts"]])
+                st.rerun()
+
+
+def afficher_mesures(user_email):
+    """Panneau d'administration des mesures de performance (barre latérale)."""
+    if user_email not in ADMIN_EMAILS:
+        return
+    with st.sidebar.expander("⏱️ Mesures de performance"):
+        actif = st.checkbox("Activer les mesures", value=instrumentation.enabled())
+        if actif != instrumentation.enabled():
+            instrumentation.set_enabled(actif)
+            st.rerun()
+        if not actif:
+            return
+
+        executions = instrumentation.history(session_mesures())
+        if not executions:
+            st.caption("Aucun rerun mesuré pour l'instant.")
+            return
+
+        # Détail du rerun précédent (le rerun en cours n'est pas terminé)
+        derniere = executions[0]
+        st.caption(f"Rerun précédent : {derniere['label'] or '?'} - {derniere['total_ms']:.0f} ms")
+        mesures = [{"opération": nom, "appels": m["count"], "ms": m["ms"], "Ko": round(m["bytes"] / 1024, 1)}
+                   for nom, m in derniere["timers"].items()]
+        mesures += [{"opération": f"(arrière-plan) {nom}", "appels": m["count"], "ms": m["ms"],
+                     "Ko": round(m["bytes"] / 1024, 1)}
+                    for nom, m in derniere.get("background", {}).items()]
+        st.dataframe(pd.DataFrame(mesures), hide_index=True)
+
+        st.caption("Derniers reruns")
+        st.dataframe(pd.DataFrame([{"heure": e["ts"][11:], "page": e["label"], "ms": e["total_ms"]}
+                                   for e in executions]), hide_index=True)
+
+        if os.path.exists(instrumentation.LOG_PATH):
+            with open(instrumentation.LOG_PATH, "rb") as f:
+                st.download_button("📥 Journal des mesures (JSONL)", f.read(), file_name="timings.jsonl")
+
+
+def session_mesures():
+    """Identifiant de la session, sous lequel ses reruns sont mesurés."""
+    return st.session_state.setdefault("session_mesures", uuid.uuid4().hex)
+
+
 def main():
+    # ⏱️ Mesures de ce rerun (sans effet si elles sont désactivées)
+    run = instrumentation.start_run(session=session_mesures())
+    try:
+        afficher_application()
+    finally:
+        instrumentation.end_run(run)
+
+
+def charger_stock():
+    """
+    Connexion à Google Drive et chargement du stock (copie locale, cf.
+    load_stock), faits seulement pour les pages qui en ont besoin :
+    l'accueil s'affiche sans appel à Google. Le chargement lance aussi le
+    thread de synchronisation, qui envoie les modifications restées en
+    attente lors d'une exécution précédente.
+    """
+    drive = init_gdrive()
+    with instrumentation.timed("load_stock"):
+        try:
+            stock = load_stock(drive)
+        except Exception as e:
+            # Seul le tout premier chargement (aucune copie locale) dépend de Drive
+            st.error(f"Impossible de charger le stock depuis Google Drive : {e}")
+            st.stop()
+    return drive, stock
+
+
+def afficher_application():
     # Authentification utilisateur
     user_email = user_authentication()
     if not user_email:
@@ -539,39 +1295,58 @@ def main():
     else:
         st.sidebar.success(f"Connecté en tant que {user_email}")
 
-    # Connexion à Google Drive
-    drive = init_gdrive()
-
-    # Charger le stock
-    df_stock = download_csv_from_drive(drive, CSV_FILENAME)
+    # État des envois en arrière-plan et de la synchronisation du stock
+    afficher_etat_envois()
+    afficher_etat_synchro()
+    afficher_mesures(user_email)
 
     # 🔹 Vérifier si on doit afficher une fiche détaillée
     if "page" not in st.session_state:
         st.session_state.page = "Accueil"
 
     if st.session_state.page == "Fiche détaillée":
-        article_details(drive, df_stock, st.session_state.selected_article_id)
+        instrumentation.set_label("Fiche détaillée")
+        drive, stock = charger_stock()
+        with instrumentation.timed("page.Fiche détaillée"):
+            article_details(drive, stock, st.session_state.selected_article_id)
         if st.button("🔙 Retour au stock"):
             st.session_state.page = "Consultation stock"
             st.rerun()
     else:
         # Menu latéral
-        menu = ["Accueil", "Ajout article", "Consultation stock", "Statistiques"]
+        menu = ["Accueil", "Ajout article", "Consultation stock", "Ventes en lot", "Statistiques", "Analyses"]
+        if user_email in ADMIN_EMAILS:
+            menu.append("Comptes de vente")
         choice = st.sidebar.selectbox("Menu", menu)
+        instrumentation.set_label(choice)
 
         if choice == "Accueil":
-            st.title("Application de gestion Achat/Vente")
-            st.write("Bienvenue ! Utilise le menu pour naviguer.")
+            with instrumentation.timed("page.Accueil"):
+                st.title("Application de gestion Achat/Vente")
+                st.write("Bienvenue ! Utilise le menu pour naviguer.")
+            return
+
+        # Connexion à Google Drive et chargement du stock
+        drive, stock = charger_stock()
+
+        with instrumentation.timed(f"page.{choice}"):
+            if choice == "Ajout article":
+                page_ajout_article(drive, stock)
+
+            elif choice == "Consultation stock":
+                page_consultation_stock(drive, stock)
 
-        elif choice == "Ajout article":
-            df_stock = page_ajout_article(drive, df_stock)
+            elif choice == "Ventes en lot":
+                page_ventes_en_lot(drive, stock)
 
-        elif choice == "Consultation stock":
-            page_consultation_stock(drive, df_stock)
+            elif choice == "Statistiques":
+                page_statistiques(stock)
 
-        elif choice == "Statistiques":
-            page_statistiques(df_stock)
+            elif choice == "Analyses":
+                page_analyses(stock)
 
+            elif choice == "Comptes de vente":
+                page_comptes_de_vente(drive, stock)
 
 
 if __name__ == "__main__":
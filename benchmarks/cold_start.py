@@ -0,0 +1,146 @@
+"""
+Benchmark du démarrage à froid de l'application (app.py).
+
+    python benchmarks/cold_start.py [--repeat 5] [--csv [fichier]]
+
+Chaque mesure est faite dans un nouveau processus Python (aucun module
+importé, singletons vides), comme au premier affichage après le lancement du
+serveur. Pour l'écran de connexion puis pour la page d'accueil (utilisateur
+connecté) :
+- durée du processus complet (démarrage de Python compris) ;
+- premier rendu de la page, puis rerun (modules déjà importés) ;
+- modules lourds (pandas, client Google, Pillow...) chargés par le rendu.
+
+L'import de Streamlit, payé quel que soit le code de l'application, est
+mesuré à part. Aucun appel réseau n'est possible (secrets factices) : une
+page qui tenterait de joindre Google échouerait et serait signalée.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+DEFAULT_CSV = os.path.join(ROOT, "benchmarks", "cold_start.csv")
+
+EMAIL = "benchmark@example.com"
+
+# Rendus mesurés : libellé -> utilisateur déjà connecté ?
+SCENARIOS = {"connexion": False, "accueil": True}
+
+# Modules dont le chargement au démarrage est signalé
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "PIL", "googleapiclient", "google.auth",
+                 "google_auth_httplib2", "httplib2", "requests", "streamlit_authenticator"]
+
+
+def child(scenario):
+    """Mesures d'un rendu à froid, dans ce processus (appelé par `measure`)."""
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    import_ms = (time.perf_counter() - started) * 1000
+    preloaded = {name for name in HEAVY_MODULES if name in sys.modules}
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets["auth"] = {"allowed_emails": [EMAIL]}
+    at.secrets["gcp_service_account"] = {"type": "service_account"}
+    if SCENARIOS[scenario]:
+        at.session_state["email_authenticated"] = EMAIL
+
+    started = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - started) * 1000
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules and name not in preloaded]
+    started = time.perf_counter()
+    at.run()
+    rerun_ms = (time.perf_counter() - started) * 1000
+
+    errors = [str(e.value) for e in at.exception] + [str(e.value) for e in at.error]
+    print(json.dumps({"import_streamlit": import_ms, "premier_rendu": first_ms, "rerun": rerun_ms,
+                      "modules": loaded, "erreurs": errors}))
+
+
+def measure(scenario):
+    """Lance un processus neuf pour `scenario` ; retourne ses mesures (ms)."""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", scenario],
+                            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["processus"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def run(repeat):
+    """Meilleur temps de `repeat` processus pour chaque scénario."""
+    results = {}
+    for scenario in SCENARIOS:
+        runs = [measure(scenario) for _ in range(repeat)]
+        best = {key: min(r[key] for r in runs)
+                for key in ("processus", "import_streamlit", "premier_rendu", "rerun")}
+        best["modules"] = sorted({name for r in runs for name in r["modules"]})
+        best["erreurs"] = sorted({error for r in runs for error in r["erreurs"]})
+        results[scenario] = best
+    return results
+
+
+def print_table(results):
+    """Tableau Markdown : une ligne par rendu."""
+    width = max(len(scenario) for scenario in results)
+    header = [f"{'rendu':<{width}}", "processus (ms)", "import streamlit (ms)", "premier rendu (ms)",
+              "rerun (ms)", "modules lourds chargés"]
+    print("| " + " | ".join(header) + " |")
+    print("|" + "|".join("-" * (len(cell) + 2) for cell in header) + "|")
+    for scenario, best in results.items():
+        cells = [f"{scenario:<{width}}",
+                 *(f"{best[key]:>{len(header[i + 1])}.1f}"
+                   for i, key in enumerate(("processus", "import_streamlit", "premier_rendu", "rerun"))),
+                 ", ".join(best["modules"]) or "aucun"]
+        print("| " + " | ".join(cells) + " |")
+    for scenario, best in results.items():
+        for error in best["erreurs"]:
+            print(f"\n⚠️ {scenario} : {error}")
+
+
+def append_csv(path, results, version):
+    """Ajoute les mesures à `path` (une ligne par rendu)."""
+    new_file = not os.path.exists(path)
+    date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["date", "commit", "rendu", "processus_ms", "import_streamlit_ms",
+                             "premier_rendu_ms", "rerun_ms", "modules", "erreurs"])
+        for scenario, best in results.items():
+            writer.writerow([date, version, scenario, f"{best['processus']:.1f}",
+                             f"{best['import_streamlit']:.1f}", f"{best['premier_rendu']:.1f}",
+                             f"{best['rerun']:.1f}", " ".join(best["modules"]), len(best["erreurs"])])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="processus par mesure (meilleur temps)")
+    parser.add_argument("--csv", nargs="?", const=DEFAULT_CSV, default=None,
+                        help=f"ajoute les résultats à ce CSV (défaut : {os.path.relpath(DEFAULT_CSV, ROOT)})")
+    parser.add_argument("--child", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child(args.child)
+        return
+
+    # Importé ici seulement : les processus mesurés ne doivent rien charger de plus
+    from run_benchmarks import git_version
+
+    results = run(args.repeat)
+    print(f"\nDémarrage à froid {git_version()} - meilleur de {args.repeat} processus\n")
+    print_table(results)
+    if args.csv:
+        append_csv(os.path.abspath(args.csv), results, git_version())
+        print(f"\nRésultats ajoutés à {os.path.abspath(args.csv)}")
+
+
+if __name__ == "__main__":
+    main()
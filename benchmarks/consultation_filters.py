@@ -0,0 +1,104 @@
+"""
+Benchmark des filtres de la page de consultation : parcours pandas (ancien
+code de page_consultation_stock) contre l'index de recherche (StockIndex).
+Les deux chemins appliquent la même règle de recherche ; on vérifie qu'ils
+trouvent les mêmes articles avant de les chronométrer.
+
+    python benchmarks/consultation_filters.py [nombre d'articles ...]
+
+Par défaut : 10 000 et 100 000 articles synthétiques (cf. synthetic.py).
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stock_index import normalize_text  # noqa: E402
+from stock_store import StockStore  # noqa: E402
+from synthetic import synthetic_stock  # noqa: E402
+
+# Filtres mesurés : (taille, collection, recherche, non vendus seulement)
+SCENARIOS = [
+    ("aucun filtre", None, None, "", False),
+    ("non vendus", None, None, "", True),
+    ("taille + collection", "M", "Hiver", "", True),
+    ("recherche 1 mot", None, None, "echarpe", True),
+    ("recherche préfixes", None, None, "rou cui", False),
+    ("tous les filtres", "S", "Été", "sac", True),
+]
+
+
+def pandas_filter(df, taille, collection, text, unsold_only):
+    """
+    Ancien chemin : unique() + masques booléens sur tout le stock. La recherche
+    suit la règle de l'index : chaque mot cherché doit être le début d'un mot
+    de la description, sans tenir compte des accents ni des majuscules.
+    """
+    df["taille"].dropna().unique().tolist()
+    df["collection"].dropna().unique().tolist()
+    df_filtered = df.copy()
+    if taille is not None:
+        df_filtered = df_filtered[df_filtered["taille"] == taille]
+    if collection is not None:
+        df_filtered = df_filtered[df_filtered["collection"] == collection]
+    words = re.findall(r"\w+", normalize_text(text or ""))
+    if words:
+        descriptions = df_filtered["description"].map(normalize_text, na_action="ignore")
+        for word in words:
+            df_filtered = df_filtered[descriptions.str.contains(rf"\b{re.escape(word)}", na=False)]
+            descriptions = descriptions[df_filtered.index]
+    if unsold_only:
+        df_filtered = df_filtered[df_filtered["prix_vente"].isna()]
+    return df_filtered
+
+
+def index_filter(store, taille, collection, text, unsold_only):
+    """Nouveau chemin : valeurs des filtres et intersections dans l'index."""
+    store.filter_values()
+    return store.search(taille=taille, collection=collection, text=text, unsold_only=unsold_only)
+
+
+def check_same_results(df, store, taille, collection, text, unsold_only):
+    """Vérifie que pandas et l'index trouvent les mêmes articles (dans le même ordre)."""
+    expected = pandas_filter(df, taille, collection, text, unsold_only)["id"].tolist()
+    found = index_filter(store, taille, collection, text, unsold_only)["id"].tolist()
+    if found != expected:
+        raise AssertionError(f"résultats différents pour {(taille, collection, text, unsold_only)} : "
+                             f"{len(expected)} (pandas) contre {len(found)} (index)")
+
+
+def best_of(function, repeat=5):
+    """Meilleur temps (ms) sur `repeat` exécutions."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), result
+
+
+def run(n):
+    df = synthetic_stock(n)
+    store = StockStore(df)
+    build_ms, _ = best_of(lambda: StockStore(df).filter_values(), repeat=1)
+    store.filter_values()
+
+    print(f"\n{n} articles - construction de l'index : {build_ms:.0f} ms (une fois par version du stock)")
+    print(f"{'filtre':<22}{'pandas (ms)':>13}{'index (ms)':>13}{'gain':>8}{'résultats':>11}")
+    for label, taille, collection, text, unsold_only in SCENARIOS:
+        check_same_results(df, store, taille, collection, text, unsold_only)
+        pandas_ms, _ = best_of(lambda: pandas_filter(df, taille, collection, text, unsold_only))
+        index_ms, result = best_of(lambda: index_filter(store, taille, collection, text, unsold_only))
+        print(f"{label:<22}{pandas_ms:>13.2f}{index_ms:>13.2f}{pandas_ms / index_ms:>7.1f}x{len(result):>11}")
+
+    # Mise à jour incrémentale : une vente ne reconstruit pas l'index
+    update_ms, _ = best_of(lambda: store.update(n // 2, {"prix_vente": 99.0}), repeat=1)
+    print(f"vente d'un article (mise à jour de l'index) : {update_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        run(size)
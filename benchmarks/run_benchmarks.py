@@ -0,0 +1,308 @@
+"""
+Benchmarks hors ligne des chemins critiques de l'application, sur des stocks
+synthétiques (cf. synthetic.py) servis par un faux Drive (fake_drive.py).
+
+    python benchmarks/run_benchmarks.py [--sizes 1000 10000 100000] [--repeat 3]
+                                        [--latency 0.08] [--bandwidth 2000000]
+                                        [--on-disk] [--csv [fichier]]
+
+Mesuré pour chaque taille de stock :
+- lecture de stock.csv / stock.parquet par download_csv_from_drive : serveur
+  froid (cache vide), autre processus (cache disque déjà rempli), revalidation
+  de la version, cache chaud ;
+- écriture par upload_csv_to_drive (écriture optimiste, cf. concurrency.py) ;
+- load_stock (copie locale du stock -> StockStore) : premier chargement
+  (tiré de Drive), autre processus (copie locale déjà remplie), chaud ;
+- statistiques : recalcul complet (StockStats.from_frame) et page_statistiques ;
+- cube de la page Analyses (construction, requête) ;
+- estimations des prix / délais de vente (ajustement, espérances du stock) ;
+- filtres de la page de consultation : pandas contre l'index.
+
+Chaque mesure est le meilleur temps sur `--repeat` exécutions. `--latency`
+(secondes par appel) et `--bandwidth` (octets/s) simulent le réseau ; les
+appels Drive de chaque opération sont comptés. Le tableau est affiché, et
+`--csv` ajoute les résultats (date, commit, paramètres) à un CSV pour suivre
+leur évolution d'une version à l'autre.
+"""
+import argparse
+import csv
+import datetime
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from consultation_filters import SCENARIOS, check_same_results, index_filter, pandas_filter  # noqa: E402
+from fake_drive import FakeDriveService  # noqa: E402
+from stock_schema import normalize_stock  # noqa: E402
+from synthetic import synthetic_csv  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_CSV = os.path.join(ROOT, "benchmarks", "results.csv")
+
+# Secrets factices : app.py lit st.secrets dès l'import
+SECRETS = """
+[auth]
+allowed_emails = ["benchmark@example.com"]
+
+[gcp_service_account]
+type = "service_account"
+"""
+
+
+def import_app(workdir):
+    """
+    Importe app.py hors de `streamlit run` : les secrets sont lus dans
+    `workdir`/.streamlit (le répertoire courant), les avertissements de
+    Streamlit sur l'absence de session sont masqués.
+    """
+    os.makedirs(os.path.join(workdir, ".streamlit"), exist_ok=True)
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+        f.write(SECRETS)
+    os.chdir(workdir)
+    logging.disable(logging.WARNING)
+    import app
+    return app
+
+
+class Server:
+    """
+    Un serveur de l'application branché sur le faux Drive : les singletons
+    (`@st.cache_resource`) d'app.py sont remplacés par des instances que l'on
+    peut recréer pour mesurer un démarrage à froid.
+    """
+
+    def __init__(self, app, drive, cache_root):
+        self.app = app
+        self.drive = drive
+        self.cache_root = cache_root
+        self.generation = 0
+        app.init_gdrive = lambda: drive
+        app.new_drive_service = lambda: drive
+        app.get_stock_cache = lambda: self.stock_cache
+        app.get_drive_resolver = lambda: self.resolver
+        app.get_stock_journal = lambda: self.journal
+        app.get_stock_store_cache = lambda: self.store_cache
+        app.get_local_store = lambda: self.local_store
+        app.get_stock_sync = lambda: self.stock_sync
+        self.restart()
+
+    def restart(self, keep_disk=False):
+        """
+        Caches vides, comme au démarrage du serveur. Avec `keep_disk`, le cache
+        disque est conservé (autre processus du même serveur).
+        """
+        from drive_files import DriveFileResolver
+        from local_store import LocalStore
+        from stock_cache import StockCache
+        from stock_journal import StockJournal
+        from stock_store import StockStoreCache
+        from stock_sync import StockSync
+        from upload_queue import DriveIdPool
+
+        if not keep_disk:
+            self.generation += 1
+            shutil.rmtree(os.path.join(self.cache_root, str(self.generation - 1)), ignore_errors=True)
+        cache_dir = os.path.join(self.cache_root, str(self.generation))
+        self.stock_cache = StockCache(cache_dir=cache_dir)
+        self.resolver = DriveFileResolver(self.app.GOOGLE_DRIVE_FOLDER_ID)
+        self.journal = StockJournal(self.app.GOOGLE_DRIVE_FOLDER_ID)
+        self.store_cache = StockStoreCache()
+        self.local_store = LocalStore(os.path.join(cache_dir, "stock_local.sqlite3"))
+        # Synchronisation à la demande seulement : pas d'appels Drive en arrière-plan pendant les mesures
+        id_pool = DriveIdPool()
+        self.stock_sync = StockSync(self.local_store, self.journal, load_snapshot=self.app.load_stock_snapshot,
+                                    compact=self.app.compact_stock_journal,
+                                    take_file_id=lambda service: id_pool.take(service)[0],
+                                    service_factory=lambda: self.drive, store_cache=self.store_cache,
+                                    background=False)
+
+    def drive_calls(self):
+        return sum(self.drive.calls.values())
+
+
+def best_of(function, repeat, setup=None):
+    """Meilleur temps (ms) de `function` sur `repeat` exécutions ; `setup` n'est pas chronométré."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def measure(server, function, repeat, setup=None):
+    """(meilleur temps en ms, appels Drive d'une exécution)."""
+    if setup is not None:
+        setup()
+    calls = server.drive_calls()
+    function()
+    calls = server.drive_calls() - calls
+    return best_of(function, repeat, setup), calls
+
+
+def run_size(app, n, args, workdir):
+    """Toutes les mesures pour un stock de `n` articles : [(opération, ms, appels Drive)]."""
+    from stock_analytics import AnalyticsCube
+    from stock_estimator import SalesEstimator
+    from stock_stats import StockStats
+
+    root_dir = os.path.join(workdir, f"drive-{n}") if args.on_disk else None
+    drive = FakeDriveService(root_dir=root_dir)
+    drive.add_file(app.CSV_FILENAME, synthetic_csv(n), parents=[app.GOOGLE_DRIVE_FOLDER_ID])
+    server = Server(app, drive, os.path.join(workdir, f"cache-{n}"))
+    # La latence ne s'applique qu'aux mesures, pas à la préparation
+    drive.latency, drive.bandwidth = args.latency, args.bandwidth
+    results = []
+
+    def add(label, function, setup=None, repeat=args.repeat):
+        ms, calls = measure(server, function, repeat, setup)
+        results.append((label, ms, calls))
+
+    def read(filename):
+        return lambda: app.download_csv_from_drive(drive, filename)
+
+    def write(filename):
+        def function():
+            if app.upload_csv_to_drive(drive, filename, state["df"]) is None:
+                raise RuntimeError(f"Échec de l'écriture de {filename}")
+        return function
+
+    def reload(filename):
+        # Chaque écriture part de la dernière version lue (pas de conflit à fusionner)
+        return lambda: state.update(df=app.download_csv_from_drive(drive, filename))
+
+    def no_revalidation():
+        server.stock_cache.revalidate_after = 3600
+
+    def revalidate_every_time():
+        server.stock_cache.revalidate_after = 0
+
+    state = {}
+    for filename, kind in ((app.CSV_FILENAME, "csv"), (app.STOCK_SNAPSHOT_FILENAME, "parquet")):
+        if kind == "parquet":
+            # Premier snapshot Parquet, créé à partir du CSV
+            df = normalize_stock(app.download_csv_from_drive(drive, app.CSV_FILENAME))
+            df.attrs.clear()
+            app.upload_csv_to_drive(drive, filename, df)
+        add(f"lecture {kind} (froid)", read(filename), setup=server.restart)
+        add(f"lecture {kind} (autre processus, cache disque)", read(filename),
+            setup=lambda: server.restart(keep_disk=True))
+        add(f"lecture {kind} (revalidation)", read(filename), setup=revalidate_every_time)
+        add(f"lecture {kind} (cache chaud)", read(filename), setup=no_revalidation)
+        add(f"écriture {kind}", write(filename), setup=reload(filename))
+
+    add("load_stock (froid)", lambda: app.load_stock(drive), setup=server.restart)
+    add("load_stock (autre processus)", lambda: app.load_stock(drive), setup=lambda: server.restart(keep_disk=True))
+    add("load_stock (chaud)", lambda: app.load_stock(drive), setup=no_revalidation)
+
+    drive.latency, drive.bandwidth = 0.0, None
+    store = app.load_stock(drive)
+    df = store.frame()
+    add("statistiques (recalcul)", lambda: StockStats.from_frame(df))
+    add("page_statistiques", lambda: app.page_statistiques(store))
+    add("cube analyses (construction)", lambda: AnalyticsCube(df))
+    cube = AnalyticsCube(df)
+    add("cube analyses (requête)", lambda: cube.query("M", by=["compte_vente"]))
+    add("estimations (ajustement)", lambda: SalesEstimator.fit(df))
+    estimator = SalesEstimator.fit(df)
+    add("estimations (espérances du stock)", lambda: estimator.portfolio(df))
+
+    store.filter_values()
+    for label, taille, collection, text, unsold_only in SCENARIOS:
+        check_same_results(df, store, taille, collection, text, unsold_only)
+        add(f"consultation pandas : {label}",
+            lambda: pandas_filter(df, taille, collection, text, unsold_only), repeat=max(args.repeat, 5))
+        add(f"consultation index : {label}",
+            lambda: index_filter(store, taille, collection, text, unsold_only), repeat=max(args.repeat, 5))
+    return results
+
+
+def git_version():
+    """Commit courant (suffixé de « + » si l'arbre de travail est modifié)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+    return commit + ("+" if dirty else "")
+
+
+def print_table(sizes, results):
+    """Tableau Markdown : une ligne par opération, une colonne (ms) par taille."""
+    operations = list(dict.fromkeys(label for size in sizes for label, _, _ in results[size]))
+    values = {(size, label): (ms, calls) for size in sizes for label, ms, calls in results[size]}
+    width = max(len(label) for label in operations)
+    header = [f"{'opération':<{width}}", "appels Drive", *(f"{size:>9} art. (ms)" for size in sizes)]
+    print("| " + " | ".join(header) + " |")
+    print("|" + "|".join("-" * (len(cell) + 2) for cell in header) + "|")
+    for label in operations:
+        calls = values[(sizes[-1], label)][1]
+        cells = [f"{label:<{width}}", f"{calls:>12}",
+                 *(f"{values[(size, label)][0]:>{len(header[i + 2])}.2f}" for i, size in enumerate(sizes))]
+        print("| " + " | ".join(cells) + " |")
+
+
+def append_csv(path, sizes, results, args):
+    """Ajoute les mesures à `path` (une ligne par taille et opération)."""
+    new_file = not os.path.exists(path)
+    version, date = git_version(), datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["date", "commit", "latence_s", "debit_o_s", "stockage",
+                             "articles", "operation", "ms", "appels_drive"])
+        for size in sizes:
+            for label, ms, calls in results[size]:
+                writer.writerow([date, version, args.latency, args.bandwidth or "",
+                                 "disque" if args.on_disk else "memoire", size, label, f"{ms:.3f}", calls])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="tailles de stock")
+    parser.add_argument("--repeat", type=int, default=3, help="exécutions par mesure (meilleur temps)")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence simulée par appel Drive (s)")
+    parser.add_argument("--bandwidth", type=float, default=None, help="débit simulé (octets/s)")
+    parser.add_argument("--on-disk", action="store_true", help="contenus du faux Drive sur disque")
+    parser.add_argument("--csv", nargs="?", const=DEFAULT_CSV, default=None,
+                        help=f"ajoute les résultats à ce CSV (défaut : {os.path.relpath(DEFAULT_CSV, ROOT)})")
+    args = parser.parse_args(argv)
+    if args.csv:
+        args.csv = os.path.abspath(args.csv)
+
+    workdir = tempfile.mkdtemp(prefix="cocom7-bench-")
+    try:
+        app = import_app(workdir)
+        sizes = sorted(args.sizes)
+        results = {}
+        for size in sizes:
+            print(f"{size} articles...", file=sys.stderr)
+            results[size] = run_size(app, size, args, workdir)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    network = f"latence {args.latency * 1000:.0f} ms"
+    if args.bandwidth:
+        network += f", débit {args.bandwidth / 1e6:.1f} Mo/s"
+    print(f"\nBenchmarks {git_version()} - {network}, faux Drive "
+          f"{'sur disque' if args.on_disk else 'en mémoire'}, meilleur de {args.repeat}\n")
+    print_table(sizes, results)
+    if args.csv:
+        append_csv(args.csv, sizes, results, args)
+        print(f"\nRésultats ajoutés à {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
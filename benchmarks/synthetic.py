@@ -0,0 +1,88 @@
+"""
+Jeux de données synthétiques pour les benchmarks : stock de `n` articles
+avec un historique de ventes réaliste.
+
+- arrivées étalées sur trois ans, plus nombreuses récemment ;
+- prix d'achat log-normaux (quelques pièces chères), estimation et prix de
+  vente autour d'une marge variable ;
+- environ 60 % des articles vendus, d'autant plus sûrement qu'ils sont
+  arrivés tôt, avec un délai de vente exponentiel (≈ 45 jours en moyenne) ;
+- comptes de vente, tailles et collections inégalement répartis ;
+- gains calculés comme dans l'application (cf. app.compute_gains).
+"""
+import numpy as np
+import pandas as pd
+
+from stock_schema import normalize_stock
+
+TAILLES = ["XS", "S", "M", "L", "XL", "TU"]
+COLLECTIONS = ["Printemps", "Été", "Automne", "Hiver", "Vintage", "Créateurs"]
+COMPTES = ["vestiaire coco", "vestiaire ludo", "vestiaire carine",
+           "vestiaire michelle", "vestiaire pro", "vestiaire persephone"]
+MOTS = ["sac", "écharpe", "veste", "robe", "cuir", "soie", "rouge", "bleu", "noir", "doré",
+        "pochette", "foulard", "ceinture", "bottines", "manteau", "laine", "imprimé", "été"]
+
+# Même taux que app.TAX_RATE (app n'est pas importable hors de Streamlit)
+TAX_RATE = 0.126
+
+# Fin de l'historique simulé
+END_DATE = pd.Timestamp("2025-12-31")
+HISTORY_DAYS = 3 * 365
+
+
+def _weights(k, rng):
+    weights = rng.dirichlet(np.ones(k) * 2)
+    return weights / weights.sum()
+
+
+def synthetic_stock(n, seed=0):
+    """Stock typé (cf. normalize_stock) de `n` articles, reproductible pour une graine donnée."""
+    rng = np.random.default_rng(seed)
+
+    # Arrivées : densité croissante sur la période (activité qui se développe)
+    age = (HISTORY_DAYS * (1 - np.sqrt(rng.random(n)))).astype(int)
+    arrivee = END_DATE - pd.to_timedelta(age, unit="D") \
+        + pd.to_timedelta(rng.integers(9 * 3600, 19 * 3600, size=n), unit="s")
+    order = np.argsort(arrivee.values, kind="stable")
+    arrivee = arrivee[order]
+    age = age[order]
+
+    prix_achat = np.round(rng.lognormal(mean=3.8, sigma=0.8, size=n), 0).clip(2, 3000)
+    estimation = np.round(prix_achat * rng.uniform(1.2, 2.8, size=n), 0)
+
+    # Ventes : délai exponentiel, une vente « future » reste en stock
+    delai = rng.exponential(45, size=n).astype(int)
+    sold = (delai <= age) & (rng.random(n) < 0.75)
+    prix_vente = np.where(sold, np.round(estimation * rng.uniform(0.6, 1.1, size=n), 0), np.nan)
+    date_vente = pd.Series(arrivee + pd.to_timedelta(delai, unit="D")).dt.normalize().where(sold)
+
+    words = rng.choice(MOTS, size=(n, 4))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_valeur = prix_vente - prix_achat
+        gain_apres_impots_valeur = gain_valeur - prix_vente * TAX_RATE
+        gain_percent = np.where(prix_achat > 0, gain_valeur / prix_achat * 100, 0.0)
+        gain_apres_impots_percent = np.where(prix_achat > 0, gain_apres_impots_valeur / prix_achat * 100, 0.0)
+
+    df = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "date_arrivee": arrivee,
+        "photo_id": [f"photo{i:07d}" for i in range(1, n + 1)],
+        "prix_achat": prix_achat,
+        "description": [" ".join(row).capitalize() for row in words],
+        "taille": rng.choice(TAILLES, size=n, p=_weights(len(TAILLES), rng)),
+        "collection": rng.choice(COLLECTIONS, size=n, p=_weights(len(COLLECTIONS), rng)),
+        "estimation": estimation,
+        "prix_vente": prix_vente,
+        "date_vente": date_vente.values,
+        "compte_vente": np.where(sold, rng.choice(COMPTES, size=n, p=_weights(len(COMPTES), rng)), None),
+        "gain_valeur": np.round(gain_valeur, 2),
+        "gain_percent": np.where(sold, np.round(gain_percent, 2), np.nan),
+        "gain_apres_impots_valeur": np.round(gain_apres_impots_valeur, 2),
+        "gain_apres_impots_percent": np.where(sold, np.round(gain_apres_impots_percent, 2), np.nan),
+    })
+    return normalize_stock(df)
+
+
+def synthetic_csv(n, seed=0):
+    """Contenu de stock.csv (tel qu'écrit par l'application) pour `n` articles."""
+    return synthetic_stock(n, seed).to_csv(index=False).encode("utf-8")
@@ -0,0 +1,188 @@
+"""
+Écritures concurrentes sur les fichiers CSV / Parquet Drive (plusieurs vendeurs
+en même temps).
+
+Principe (compare-and-swap optimiste) :
+1. on retient la version Drive lue (cf. stock_cache.DRIVE_VERSION_ATTR) ;
+2. avant d'écrire, on compare avec la version distante actuelle ;
+3. si quelqu'un a écrit entre-temps, on fusionne nos lignes modifiées dans
+   la version distante, puis on réessaie.
+
+L'API Drive v3 n'offre pas d'écriture conditionnelle (If-Match) : un autre
+écrivain peut passer entre la vérification et l'écriture. Après chaque écriture,
+on relit donc l'historique des révisions du fichier ; si une révision étrangère
+s'est intercalée entre notre base et notre version, elle est fusionnée à son
+tour et réécrite.
+"""
+import random
+import time
+from io import BytesIO
+
+import pandas as pd
+from googleapiclient.http import MediaIoBaseUpload
+
+from stock_cache import DRIVE_VERSION_ATTR, VERSION_FIELDS, parse_bytes, same_version, serialize_frame
+
+# Nombre maximum de tentatives d'écriture en cas de conflits répétés
+MAX_ATTEMPTS = 5
+
+
+class WriteConflict(Exception):
+    """
+    Le fichier distant a changé et la fusion n'est pas possible / autorisée.
+
+    `written` : notre version est malgré tout sur Drive (écrite avant que la
+    révision concurrente soit détectée) et a pu en écraser une autre ; sinon
+    rien n'a été écrit.
+    """
+
+    def __init__(self, message, written=False):
+        super().__init__(message)
+        self.written = written
+
+
+def _same_cell(a, b):
+    """Égalité de deux colonnes alignées, NaN == NaN."""
+    return (a == b) | (a.isna() & b.isna())
+
+
+def merge_frames(base, ours, theirs, key="id"):
+    """
+    Fusion à trois voies de DataFrames indexés par `key`.
+
+    - `base` : version lue au départ (None si inconnue)
+    - `ours` : version locale modifiée
+    - `theirs` : version distante actuelle
+
+    Les lignes ajoutées / supprimées / cellules modifiées par nous depuis
+    `base` sont appliquées sur `theirs`. Sans `base`, on ajoute nos lignes
+    absentes de `theirs` et on complète ses cellules vides avec les nôtres
+    (cas d'une vente enregistrée de part et d'autre).
+    Une ligne ajoutée des deux côtés avec la même clé numérique (deux articles)
+    reçoit une nouvelle clé ; avec une clé textuelle (un nom, ex. compte de
+    vente), c'est la même ligne et la version distante est gardée.
+    """
+    ours_i = ours.set_index(key, drop=False)
+    theirs_i = theirs.set_index(key, drop=False)
+    for column in ours_i.columns.difference(theirs_i.columns):
+        theirs_i[column] = pd.NA
+    result = theirs_i.copy()
+
+    if base is None:
+        common = ours_i.index.intersection(theirs_i.index)
+        for column in ours_i.columns:
+            if column == key:
+                continue
+            fill = result.loc[common, column].isna() & ours_i.loc[common, column].notna()
+            if fill.any():
+                result[column] = result[column].astype(object)
+                result.loc[fill[fill].index, column] = ours_i.loc[fill[fill].index, column]
+        added = ours_i.loc[ours_i.index.difference(theirs_i.index)]
+    else:
+        base_i = base.set_index(key, drop=False)
+        # Lignes supprimées de notre côté
+        deleted = base_i.index.difference(ours_i.index)
+        result = result.drop(index=result.index.intersection(deleted))
+
+        # Cellules modifiées de notre côté sur les lignes communes
+        common = ours_i.index.intersection(base_i.index).intersection(result.index)
+        for column in ours_i.columns:
+            if column == key or column not in base_i.columns:
+                continue
+            changed = ~_same_cell(ours_i.loc[common, column], base_i.loc[common, column])
+            if changed.any():
+                ids = changed[changed].index
+                if result[column].dtype != ours_i[column].dtype:
+                    result[column] = result[column].astype(object)
+                result.loc[ids, column] = ours_i.loc[ids, column]
+
+        added = ours_i.loc[ours_i.index.difference(base_i.index)]
+
+    if not added.empty:
+        added = added.copy()
+        # Même clé ajoutée des deux côtés (deux vendeurs) : nouvelle clé pour la nôtre
+        collisions = added.index.intersection(result.index)
+        if len(collisions) and not pd.api.types.is_numeric_dtype(added.index):
+            added = added.drop(index=collisions)
+        elif len(collisions):
+            next_key = max(result.index.max(), added.index.max()) + 1
+            new_keys = {old: next_key + i for i, old in enumerate(collisions)}
+            added[key] = [new_keys.get(k, k) for k in added.index]
+            added = added.set_index(key, drop=False)
+        result = pd.concat([result, added])
+
+    return result.reset_index(drop=True)[list(ours.columns)
+                                          + [c for c in theirs.columns if c not in ours.columns]]
+
+
+def _interleaved_revision(service, file_id, base_revision, our_revision):
+    """
+    Retourne l'ID de la dernière révision écrite par quelqu'un d'autre entre
+    `base_revision` et `our_revision`, ou None si notre écriture suivait
+    directement notre base.
+    """
+    revisions = service.revisions().list(fileId=file_id, fields="revisions(id)").execute()
+    ids = [revision["id"] for revision in revisions.get("revisions", [])]
+    if our_revision not in ids or base_revision not in ids:
+        # Historique incomplet (révisions purgées) : on ne peut rien conclure
+        return None
+    previous = ids[ids.index(our_revision) - 1]
+    return None if previous == base_revision else previous
+
+
+def write_frame_cas(service, cache, filename, file_id, df, app_properties=None,
+                    merge=True, max_attempts=MAX_ATTEMPTS, key="id"):
+    """
+    Écrit `df` dans le fichier Drive `file_id` seulement si celui-ci n'a pas
+    changé depuis la lecture de `df` (version dans `df.attrs`).
+
+    En cas de conflit : si `merge` est vrai, fusionne `df` dans la version
+    distante (lignes identifiées par la colonne `key`) et réessaie (avec un
+    délai aléatoire croissant) ; sinon lève WriteConflict. Sans version
+    connue, l'écriture est directe.
+    Retourne les métadonnées Drive de la version écrite. WriteConflict.written
+    indique si notre version est restée sur Drive par-dessus une écriture
+    concurrente (révision intercalée sans fusion, ou trop de conflits).
+    """
+    base_meta = df.attrs.get(DRIVE_VERSION_ATTR)
+    base = cache.frame_at(filename, base_meta) if base_meta is not None else None
+    written = False  # Notre dernière écriture est sur Drive, sans fusion de la révision intercalée
+    for attempt in range(max_attempts):
+        if base_meta is not None:
+            current = service.files().get(fileId=file_id, fields=VERSION_FIELDS).execute()
+            if not same_version(base_meta, current):
+                if not merge:
+                    raise WriteConflict(f"{filename} a été modifié par ailleurs.")
+                theirs = cache.get(service, filename, file_id, meta=current)
+                df = merge_frames(base, df, theirs, key=key)
+                written = False
+                base_meta, base = current, theirs
+                # Petit délai aléatoire pour désynchroniser les écrivains concurrents
+                time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+                continue
+
+        data, mimetype = serialize_frame(filename, df)
+        media = MediaIoBaseUpload(BytesIO(data), mimetype=mimetype)
+        body = {"appProperties": app_properties} if app_properties else None
+        meta = service.files().update(fileId=file_id, body=body, media_body=media,
+                                      fields=VERSION_FIELDS).execute()
+        cache.put(filename, data, meta)
+
+        # Vérification a posteriori : quelqu'un a-t-il écrit juste avant nous ?
+        base_revision = (base_meta or {}).get("headRevisionId")
+        if base_revision and meta.get("headRevisionId"):
+            other = _interleaved_revision(service, file_id, base_revision, meta["headRevisionId"])
+            if other is not None:
+                if not merge:
+                    raise WriteConflict(f"{filename} a été modifié pendant l'écriture.", written=True)
+                written = True
+                theirs = parse_bytes(filename, service.revisions().get_media(
+                    fileId=file_id, revisionId=other).execute())
+                df = merge_frames(base, df, theirs, key=key)
+                # Notre version devient la base de la réécriture fusionnée
+                base_meta, base = meta, parse_bytes(filename, data)
+                time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+                continue
+        return meta
+
+    raise WriteConflict(f"{filename} : trop de conflits d'écriture, abandon.", written=written)
@@ -0,0 +1,137 @@
+"""
+Résolution nom de fichier -> ID Google Drive pour le dossier de l'application.
+
+Le dossier est listé une fois, puis les résultats sont gardés en mémoire
+avec une durée de vie (TTL). Les créations / suppressions faites par
+l'application mettent le cache à jour directement.
+"""
+import threading
+import time
+
+# Champs renvoyés pour chaque fichier résolu
+FILE_FIELDS = "id,name,mimeType"
+
+# Nombre maximum de noms regroupés dans une même requête `files().list`
+BATCH_SIZE = 40
+
+
+def escape_query_value(value):
+    """Échappe une valeur pour l'insérer entre apostrophes dans une requête Drive."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+class DriveFileResolver:
+    """
+    Cache nom -> fichier Drive (dict avec au moins 'id') pour un dossier.
+
+    - Le premier appel liste tout le dossier (hors photos, qui sont toujours
+      adressées par leur ID) en une seule passe paginée.
+    - Ensuite, les noms expirés sont re-résolus par lots, en une requête
+      `files().list` pour plusieurs noms.
+    - Un nom absent est aussi mis en cache (None) jusqu'à expiration ou création.
+    """
+
+    def __init__(self, folder_id, ttl=300.0):
+        self.folder_id = folder_id
+        self.ttl = ttl
+        self._entries = {}  # name -> (file dict ou None, expires_at)
+        self._primed = False
+        # Jusqu'à cette date, un nom absent du listing complet est réputé inexistant
+        self._listed_until = 0.0
+        self._lock = threading.RLock()
+
+    def _list(self, service, query):
+        """Liste tous les fichiers répondant à `query` (toutes les pages)."""
+        files = []
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=query,
+                fields=f"nextPageToken, files({FILE_FIELDS})",
+                pageSize=1000,
+                pageToken=page_token,
+            ).execute()
+            if not isinstance(results, dict):
+                raise ValueError("La réponse de l'API n'est pas un dictionnaire. "
+                                 "Vérifie GOOGLE_DRIVE_FOLDER_ID.")
+            files.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def _store(self, files, names, expires_at):
+        """Range les résultats d'un listing ; les `names` non trouvés sont notés absents."""
+        found = {}
+        for file in files:
+            # En cas de doublon, on garde le premier fichier renvoyé par Drive
+            found.setdefault(file["name"], file)
+        for name in names:
+            self._entries[name] = (found.get(name), expires_at)
+        for name, file in found.items():
+            self._entries[name] = (file, expires_at)
+
+    def prime(self, service):
+        """Liste le dossier complet (hors images) et remplit le cache."""
+        query = (f"'{self.folder_id}' in parents and trashed=false "
+                 "and not mimeType contains 'image/'")
+        files = self._list(service, query)
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            # Tout nom déjà connu mais absent du listing n'existe plus
+            self._store(files, list(self._entries), expires_at)
+            self._primed = True
+            self._listed_until = expires_at
+
+    def resolve_many(self, service, names):
+        """
+        Résout plusieurs noms à la fois. Retourne {nom: fichier ou None}.
+        Les noms non présents dans le cache sont résolus en une requête par lot.
+        """
+        with self._lock:
+            if not self._primed:
+                self.prime(service)
+
+            now = time.monotonic()
+            result, missing = {}, []
+            for name in dict.fromkeys(names):
+                entry = self._entries.get(name)
+                if entry is not None and entry[1] > now:
+                    result[name] = entry[0]
+                elif entry is None and self._listed_until > now:
+                    result[name] = None
+                else:
+                    missing.append(name)
+
+            for start in range(0, len(missing), BATCH_SIZE):
+                batch = missing[start:start + BATCH_SIZE]
+                names_query = " or ".join(f"name='{escape_query_value(n)}'" for n in batch)
+                query = f"'{self.folder_id}' in parents and trashed=false and ({names_query})"
+                files = self._list(service, query)
+                self._store(files, batch, time.monotonic() + self.ttl)
+                for name in batch:
+                    result[name] = self._entries[name][0]
+            return result
+
+    def resolve(self, service, name):
+        """Retourne le fichier Drive nommé `name` dans le dossier, ou None."""
+        return self.resolve_many(service, [name])[name]
+
+    def register(self, file):
+        """À appeler après une création : le fichier est connu sans nouvelle requête."""
+        with self._lock:
+            self._entries[file["name"]] = (file, time.monotonic() + self.ttl)
+
+    def forget(self, name):
+        """
+        À appeler après une suppression (ou si l'ID en cache n'existe plus) :
+        le prochain appel redemandera ce nom à Drive.
+        """
+        with self._lock:
+            self._entries[name] = (None, 0.0)
+
+    def invalidate(self):
+        """Vide complètement le cache : le prochain appel relistera le dossier."""
+        with self._lock:
+            self._entries.clear()
+            self._primed = False
+            self._listed_until = 0.0
@@ -0,0 +1,297 @@
+"""
+Transport HTTP des clients Google Drive.
+
+Le client `build("drive", "v3", credentials=...)` crée par défaut un
+httplib2.Http par service : pas de pool de connexions partagé, pas de délai
+maximum, et aucune nouvelle tentative (une erreur 429 / 5xx passagère fait
+échouer l'écriture). `DriveTransport` le remplace (paramètre `http` de build) :
+
+- une session `requests` partagée par tous les threads, avec un pool de
+  connexions keep-alive (TLS 1.2 minimum) ;
+- un délai maximum par tentative (connexion / lecture) et par appel ;
+- de nouvelles tentatives, avec attente exponentielle aléatoire, sur les
+  limites de débit (429, 403 rateLimitExceeded), les erreurs serveur (5xx)
+  et les coupures réseau, en respectant l'en-tête Retry-After. Seules les
+  requêtes qu'on peut rejouer sans effet sont retentées : pas une création
+  (POST) sans ID pré-généré, qui aurait pu aboutir et serait faite deux fois ;
+- un jeton d'accès renouvelé avant son expiration : en arrière-plan quand il
+  expire bientôt, avant l'appel s'il a déjà expiré, et une fois de plus si
+  Drive le refuse (401).
+
+`build_drive_service` construit le client sur ce transport, à partir du
+document de découverte fourni avec googleapiclient (aucun appel réseau).
+"""
+import datetime
+import json
+import random
+import re
+import ssl
+import threading
+import time
+
+import httplib2
+import requests
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+import instrumentation
+
+# Délais maximum d'une tentative (secondes) : établissement de la connexion, puis lecture
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+# Durée maximum d'un appel, nouvelles tentatives comprises
+CALL_DEADLINE = 120
+
+# Nouvelles tentatives : nombre maximum, puis attente aléatoire entre 0 et
+# min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentative) secondes
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 16
+
+# Connexions gardées ouvertes vers Google (threads de la file d'envoi + reruns)
+POOL_SIZE = 16
+
+# Le jeton est renouvelé en arrière-plan quand il expire dans moins de ce délai
+REFRESH_MARGIN = 600
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Méthodes qu'on peut rejouer sans effet de bord
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "PATCH", "DELETE"}
+
+
+class _TLSAdapter(requests.adapters.HTTPAdapter):
+    """Pool de connexions n'acceptant que TLS 1.2 et plus."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        ssl_context = ssl.create_default_context()
+        ssl_context.minimum_version = ssl.TLSVersion.TLSv1_2
+        kwargs["ssl_context"] = ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+
+def _is_rate_limited(status, content):
+    """Erreur 403 de limite de débit Drive (à réessayer, contrairement à un refus d'accès)."""
+    if status != 403:
+        return False
+    try:
+        errors = json.loads(content)["error"].get("errors", [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return False
+    return any(error.get("reason") in RATE_LIMIT_REASONS for error in errors)
+
+
+def _retry_after(headers):
+    """Délai demandé par l'en-tête Retry-After (secondes), ou None."""
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+def _metadata(body, headers):
+    """
+    Métadonnées JSON d'une création : corps JSON, ou première partie d'un
+    envoi multipart (le contenu du fichier n'est pas lu). {} si illisibles.
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not isinstance(body, bytes):
+        return {}
+    content_type = {key.lower(): value for key, value in (headers or {}).items()}.get("content-type", "")
+    if content_type.startswith("multipart/"):
+        boundary = content_type.partition("boundary=")[2].strip('"').encode("utf-8")
+        parts = body.split(b"--" + boundary, 2) if boundary else []
+        if len(parts) < 3:
+            return {}
+        body = re.split(rb"\r?\n\r?\n", parts[1], maxsplit=1)[-1]
+    try:
+        metadata = json.loads(body)
+    except ValueError:
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def is_replayable(method, uri, body=None, headers=None):
+    """
+    Une nouvelle tentative est-elle sans risque ? Oui pour les méthodes
+    idempotentes, l'ouverture d'un envoi reprenable (rien n'est créé avant
+    l'envoi du contenu) et une création portant un ID pré-généré (rejouée
+    après coup, elle échoue en 409 au lieu de créer un doublon).
+    """
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    if "uploadType=resumable" in uri:
+        return True
+    return bool(_metadata(body, headers).get("id"))
+
+
+def backoff_delay(attempt):
+    """Délai avant la tentative `attempt` (1, 2, ...) : exponentiel, plafonné, tiré entre 0 et ce plafond."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class DriveTransport:
+    """
+    Objet compatible httplib2.Http (méthode `request`) pour `build(http=...)`,
+    partagé par tous les clients Drive du serveur (thread-safe).
+    """
+
+    def __init__(self, credentials, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), deadline=CALL_DEADLINE,
+                 max_retries=MAX_RETRIES, pool_size=POOL_SIZE, session=None):
+        self.credentials = credentials
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        if session is None:
+            session = requests.Session()
+            adapter = _TLSAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+        self.session = session
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+
+    # -- Jeton d'accès -------------------------------------------------------
+
+    def refresh_token(self, force=False):
+        """
+        Renouvelle le jeton d'accès. Un seul renouvellement à la fois : sans
+        `force`, rien n'est fait si un autre thread vient de le renouveler.
+        """
+        with self._refresh_lock:
+            if not force and self.credentials.token and not self.credentials.expired:
+                return
+            with instrumentation.timed("drive.auth.refresh"):
+                self.credentials.refresh(Request(self.session))
+
+    def _refresh_in_background(self):
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh_token(force=True)
+            except Exception:
+                pass  # Le prochain appel renouvellera le jeton lui-même
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="drive-token-refresh", daemon=True).start()
+
+    def _ensure_token(self):
+        """Jeton valide avant l'appel ; renouvellement anticipé s'il expire bientôt."""
+        if not self.credentials.token or self.credentials.expired:
+            self.refresh_token()
+            return
+        expiry = self.credentials.expiry
+        if expiry is not None:
+            # Les credentials Google datent l'expiration en UTC, sans fuseau
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            remaining = (expiry - now).total_seconds()
+            if remaining < REFRESH_MARGIN:
+                self._refresh_in_background()
+
+    # -- Interface httplib2 ----------------------------------------------------
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None,
+                connection_type=None):
+        """
+        Exécute la requête (avec nouvelles tentatives si elle peut être
+        rejouée, cf. is_replayable) ; retourne (httplib2.Response, contenu).
+        """
+        started = time.monotonic()
+        replayable = is_replayable(method, uri, body, headers)
+        refreshed = False
+        attempt = 0
+        while True:
+            self._ensure_token()
+            request_headers = dict(headers or {})
+            if "range" in request_headers:
+                # Téléchargement par morceaux : les plages doivent porter sur le contenu tel quel
+                request_headers["accept-encoding"] = "identity"
+            self.credentials.apply(request_headers)
+            try:
+                response = self.session.request(method, uri, data=body, headers=request_headers,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._next_delay(attempt, started) if replayable else None
+                if delay is None:
+                    raise
+            else:
+                status, content = response.status_code, response.content
+                if status == 401 and not refreshed:
+                    # Jeton révoqué ou expiré plus tôt que prévu : un seul renouvellement
+                    refreshed = True
+                    self.refresh_token(force=True)
+                    continue
+                delay = None
+                if replayable and (status in RETRY_STATUSES or _is_rate_limited(status, content)):
+                    delay = self._next_delay(attempt, started, _retry_after(response.headers))
+                if delay is None:
+                    return self._to_httplib2(response), content
+            attempt += 1
+            with instrumentation.timed("drive.retry"):
+                time.sleep(delay)
+            _rewind(body)
+
+    def _next_delay(self, attempt, started, retry_after=None):
+        """Attente avant une nouvelle tentative, ou None s'il n'y en a plus (nombre ou durée)."""
+        if attempt >= self.max_retries:
+            return None
+        delay = retry_after if retry_after is not None else backoff_delay(attempt + 1)
+        if time.monotonic() - started + delay > self.deadline:
+            return None
+        return delay
+
+    @staticmethod
+    def _to_httplib2(response):
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # requests décompresse déjà le contenu : les en-têtes doivent décrire ce contenu-là
+        info.pop("content-encoding", None)
+        info["content-length"] = str(len(response.content))
+        info["status"] = str(response.status_code)
+        return httplib2.Response(info)
+
+    def close(self):
+        self.session.close()
+
+
+def _rewind(body):
+    """Remet au début un corps de requête fourni sous forme de flux."""
+    if hasattr(body, "seek"):
+        body.seek(0)
+
+
+class TimedHttpRequest(HttpRequest):
+    """
+    Requête de l'API Google chronométrée sous son nom de méthode
+    (ex. « drive.files.get ») : à passer en `requestBuilder` de `build()`.
+    """
+
+    def execute(self, http=None, num_retries=0):
+        if not instrumentation.enabled():
+            return super().execute(http=http, num_retries=num_retries)
+        with instrumentation.timed(self.methodId or "google.api") as timer:
+            if self.resumable is not None:
+                timer.add_bytes(self.resumable.size() or 0)
+            elif self.body:
+                timer.add_bytes(len(self.body))
+            result = super().execute(http=http, num_retries=num_retries)
+            if isinstance(result, bytes):
+                timer.add_bytes(len(result))
+            return result
+
+
+def build_drive_service(http):
+    """
+    Client Google Drive v3 sur le transport `http` (cf. DriveTransport).
+    Le document de découverte est celui fourni avec googleapiclient : ni
+    appel réseau ni cache de découverte sur disque. Chaque appel à l'API est
+    chronométré si les mesures sont activées.
+    """
+    return build("drive", "v3", http=http, requestBuilder=TimedHttpRequest,
+                 static_discovery=True, cache_discovery=False)
@@ -0,0 +1,429 @@
+"""
+Faux service Google Drive (API v3, `files()`) pour travailler hors ligne.
+
+Il reproduit le sous-ensemble utilisé par l'application : `list` (avec les
+requêtes `q` de l'appli), `get`, `get_media`, `create`, `update`, `delete` et
+`generateIds`,
+`revisions().list` / `revisions().get_media`, ainsi que les champs de version
+(md5Checksum, headRevisionId, modifiedTime).
+Chaque appel renvoie un objet avec `.execute()`, comme le vrai client.
+
+Pour les mesures de performance, chaque appel peut être ralenti comme un vrai
+aller-retour réseau (`latency` en secondes, `bandwidth` en octets/s), et les
+contenus peuvent être gardés sur disque (`root_dir`) plutôt qu'en mémoire :
+le dossier contient alors un fichier par révision et un index JSON, relu à la
+création du service suivant.
+
+Exemple :
+    drive = FakeDriveService()  # ou FakeDriveService(latency=0.08, root_dir="/tmp/drive")
+    # ... passer `drive` à la place du service renvoyé par init_gdrive()
+"""
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+
+class _Response:
+    """Imite l'objet `HttpRequest` du client Google : seul `execute()` compte."""
+
+    def __init__(self, func):
+        self._func = func
+
+    def execute(self, http=None, num_retries=0):
+        return self._func()
+
+
+class _Resp(dict):
+    """Réponse HTTP minimale (HttpError, téléchargements par morceaux)."""
+
+    def __init__(self, status):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = "fake drive"
+
+
+class _MediaRequest:
+    """
+    Téléchargement d'un contenu : `execute()` renvoie tout le contenu, et
+    MediaIoBaseDownload peut le lire par morceaux (un appel par morceau).
+    """
+
+    def __init__(self, drive, read):
+        self._drive = drive
+        self._read = read
+        self.uri = "fake://media"
+        self.headers = {}
+        self.http = self
+
+    def execute(self, http=None, num_retries=0):
+        self._drive.calls["get_media"] += 1
+        content = self._read()
+        self._drive.wait(len(content))
+        return content
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        """Interface httplib2 utilisée par MediaIoBaseDownload (en-tête Range)."""
+        self._drive.calls["get_media"] += 1
+        content = self._read()
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        start, end = (int(match.group(1)), int(match.group(2)) + 1) if match else (0, len(content))
+        chunk = content[start:end]
+        self._drive.wait(len(chunk))
+        if not content:
+            response = _Resp(200)
+            response["content-length"] = "0"
+            return response, b""
+        response = _Resp(206)
+        response["content-range"] = f"bytes {start}-{start + len(chunk) - 1}/{len(content)}"
+        return response, chunk
+
+
+def _not_found(file_id):
+    return HttpError(_Resp(404), f"File not found: {file_id}".encode("utf-8"))
+
+
+def _conflict(file_id):
+    return HttpError(_Resp(409), f"A file already exists with the provided ID: {file_id}".encode("utf-8"))
+
+
+def _read_media(media_body):
+    """Récupère le contenu d'un MediaIoBaseUpload (ou d'un bytes)."""
+    if media_body is None:
+        return None
+    if isinstance(media_body, (bytes, bytearray)):
+        return bytes(media_body)
+    return media_body.getbytes(0, media_body.size())
+
+
+# -- Évaluation (simplifiée) des requêtes `q` de Drive --------------------------
+
+_TOKEN_RE = re.compile(r"\s*(\(|\)|'(?:\\.|[^'\\])*'|[A-Za-z_]+|!=|=)")
+
+
+def _tokenize(query):
+    tokens, pos = [], 0
+    query = query.strip()
+    while pos < len(query):
+        match = _TOKEN_RE.match(query, pos)
+        if not match:
+            raise ValueError(f"Requête non supportée : {query!r}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+def _unquote(token):
+    return re.sub(r"\\(.)", r"\1", token[1:-1])
+
+
+class _QueryParser:
+    """Grammaire : expr := term (or term)* ; term := factor (and factor)* ; factor := not? atom."""
+
+    def __init__(self, query):
+        self.tokens = _tokenize(query)
+        self.pos = 0
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        predicate = self._expr()
+        if self._peek() is not None:
+            raise ValueError(f"Requête non supportée près de {self._peek()!r}")
+        return predicate
+
+    def _expr(self):
+        terms = [self._term()]
+        while self._peek() == "or":
+            self._next()
+            terms.append(self._term())
+        return lambda f: any(t(f) for t in terms)
+
+    def _term(self):
+        factors = [self._factor()]
+        while self._peek() == "and":
+            self._next()
+            factors.append(self._factor())
+        return lambda f: all(p(f) for p in factors)
+
+    def _factor(self):
+        if self._peek() == "not":
+            self._next()
+            inner = self._factor()
+            return lambda f: not inner(f)
+        if self._peek() == "(":
+            self._next()
+            inner = self._expr()
+            self._next()  # ")"
+            return inner
+        return self._atom()
+
+    def _atom(self):
+        left = self._next()
+        op = self._next()
+        right = self._next()
+        if left.startswith("'") and op == "in" and right == "parents":
+            parent = _unquote(left)
+            return lambda f: parent in f.get("parents", [])
+        if left == "trashed":
+            value = right == "true"
+            return lambda f: f.get("trashed", False) == value
+        value = _unquote(right)
+        if op == "contains":
+            if left == "name":
+                # Drive : `name contains` cherche un préfixe de mot
+                return lambda f: f["name"].startswith(value) or f" {value}" in f["name"]
+            return lambda f: value in f.get(left, "")
+        if op == "=":
+            return lambda f: f.get(left) == value
+        if op == "!=":
+            return lambda f: f.get(left) != value
+        raise ValueError(f"Opérateur non supporté : {op!r}")
+
+
+# -- Service --------------------------------------------------------------------
+
+class FakeFiles:
+    """Équivalent de `service.files()`."""
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q="", fields=None, pageSize=100, pageToken=None, **kwargs):
+        def run():
+            self._drive.calls["list"] += 1
+            self._drive.wait()
+            predicate = _QueryParser(q).parse() if q else (lambda f: True)
+            with self._drive.lock:
+                matches = [self._drive.public_meta(f) for f in self._drive.store.values() if predicate(f)]
+            start = int(pageToken or 0)
+            page = matches[start:start + pageSize]
+            result = {"files": page}
+            if start + pageSize < len(matches):
+                result["nextPageToken"] = str(start + pageSize)
+            return result
+        return _Response(run)
+
+    def get(self, fileId, fields=None, **kwargs):
+        def run():
+            self._drive.calls["get"] += 1
+            self._drive.wait()
+            with self._drive.lock:
+                return self._drive.public_meta(self._drive.lookup(fileId))
+        return _Response(run)
+
+    def get_media(self, fileId, **kwargs):
+        def read():
+            with self._drive.lock:
+                return self._drive.read_content(self._drive.lookup(fileId))
+        return _MediaRequest(self._drive, read)
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            self._drive.calls["create"] += 1
+            body_ = dict(body or {})
+            content = _read_media(media_body) or b""
+            self._drive.wait(len(content))
+            with self._drive.lock:
+                file_id = body_.get("id") or f"fake{next(self._drive.ids)}"
+                if file_id in self._drive.store:
+                    raise _conflict(file_id)
+                file = {
+                    "id": file_id,
+                    "name": body_.get("name", "Untitled"),
+                    "parents": list(body_.get("parents", [])),
+                    "mimeType": getattr(media_body, "mimetype", lambda: "application/octet-stream")(),
+                    "appProperties": dict(body_.get("appProperties", {})),
+                    "trashed": False,
+                }
+                self._drive.store[file_id] = file
+                self._drive.write_content(file, content)
+                return self._drive.public_meta(file)
+        return _Response(run)
+
+    def update(self, fileId, body=None, media_body=None, fields=None, **kwargs):
+        def run():
+            self._drive.calls["update"] += 1
+            content = _read_media(media_body)
+            self._drive.wait(len(content or b""))
+            with self._drive.lock:
+                file = self._drive.lookup(fileId)
+                for key, value in (body or {}).items():
+                    if key == "appProperties":
+                        file["appProperties"].update(value)
+                    else:
+                        file[key] = value
+                if content is not None:
+                    self._drive.write_content(file, content)
+                else:
+                    self._drive.save_index()
+                return self._drive.public_meta(file)
+        return _Response(run)
+
+    def generateIds(self, count=10, space="drive", **kwargs):
+        def run():
+            self._drive.calls["generateIds"] += 1
+            self._drive.wait()
+            with self._drive.lock:
+                return {"ids": [f"gen{next(self._drive.ids)}" for _ in range(count)], "space": space}
+        return _Response(run)
+
+    def delete(self, fileId, **kwargs):
+        def run():
+            self._drive.calls["delete"] += 1
+            self._drive.wait()
+            with self._drive.lock:
+                self._drive.remove(fileId)
+            return ""
+        return _Response(run)
+
+
+class FakeRevisions:
+    """Équivalent de `service.revisions()`."""
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, fileId, fields=None, **kwargs):
+        def run():
+            self._drive.calls["revisions"] += 1
+            self._drive.wait()
+            with self._drive.lock:
+                revisions = self._drive.lookup(fileId)["_revisions"]
+                return {"revisions": [{"id": rev_id} for rev_id, _ in revisions]}
+        return _Response(run)
+
+    def get_media(self, fileId, revisionId, **kwargs):
+        def read():
+            with self._drive.lock:
+                content = self._drive.read_content(self._drive.lookup(fileId), revisionId)
+            if content is None:
+                raise _not_found(f"{fileId}@{revisionId}")
+            return content
+        return _MediaRequest(self._drive, read)
+
+
+class FakeDriveService:
+    """
+    Stockage de fichiers Drive, en mémoire ou sur disque (`root_dir`).
+    `calls` compte les appels par méthode, ce qui permet de mesurer le nombre
+    d'aller-retours d'un scénario ; `latency` / `bandwidth` simulent le réseau.
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None, root_dir=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.root_dir = root_dir
+        self.store = {}  # ID -> métadonnées (+ "content" en mémoire)
+        self.ids = itertools.count(1)
+        self.revision_ids = itertools.count(1)
+        self.lock = threading.RLock()
+        self.calls = {"list": 0, "get": 0, "get_media": 0, "create": 0, "update": 0, "delete": 0,
+                      "revisions": 0, "generateIds": 0}
+        if root_dir is not None:
+            self._load_index()
+
+    def files(self):
+        return FakeFiles(self)
+
+    def revisions(self):
+        return FakeRevisions(self)
+
+    def wait(self, nbytes=0):
+        """Durée simulée d'un aller-retour transférant `nbytes` octets."""
+        delay = self.latency + (nbytes / self.bandwidth if self.bandwidth else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def lookup(self, file_id):
+        file = self.store.get(file_id)
+        if file is None:
+            raise _not_found(file_id)
+        return file
+
+    def read_content(self, file, revision_id=None):
+        """Contenu d'un fichier (dernière révision par défaut) ; None si la révision n'existe pas."""
+        if revision_id is None and self.root_dir is None:
+            return file["content"]
+        for rev_id, content in reversed(file["_revisions"]):
+            if revision_id is None or rev_id == revision_id:
+                if self.root_dir is None:
+                    return content
+                with open(os.path.join(self.root_dir, content), "rb") as f:
+                    return f.read()
+        return None
+
+    def write_content(self, file, content):
+        file["size"] = str(len(content))
+        file["md5Checksum"] = hashlib.md5(content).hexdigest()
+        file["headRevisionId"] = f"rev{next(self.revision_ids)}"
+        file["modifiedTime"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        if self.root_dir is None:
+            file["content"] = content
+            file.setdefault("_revisions", []).append((file["headRevisionId"], content))
+            return
+        # Sur disque : un fichier par révision, l'index ne garde que son nom
+        name = f"{file['id']}.{file['headRevisionId']}"
+        with open(os.path.join(self.root_dir, name), "wb") as f:
+            f.write(content)
+        file.setdefault("_revisions", []).append((file["headRevisionId"], name))
+        self.save_index()
+
+    def remove(self, file_id):
+        file = self.lookup(file_id)
+        del self.store[file_id]
+        if self.root_dir is not None:
+            for _, name in file["_revisions"]:
+                try:
+                    os.remove(os.path.join(self.root_dir, name))
+                except OSError:
+                    pass
+            self.save_index()
+
+    def save_index(self):
+        """Sur disque : écrit les métadonnées de tous les fichiers (index.json)."""
+        if self.root_dir is None:
+            return
+        data = {"ids": next(self.ids), "revision_ids": next(self.revision_ids), "files": self.store}
+        tmp_path = os.path.join(self.root_dir, "index.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(self.root_dir, "index.json"))
+
+    def _load_index(self):
+        os.makedirs(self.root_dir, exist_ok=True)
+        try:
+            with open(os.path.join(self.root_dir, "index.json"), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except OSError:
+            return
+        self.store = {file_id: dict(file, _revisions=[tuple(rev) for rev in file["_revisions"]])
+                      for file_id, file in data["files"].items()}
+        self.ids = itertools.count(data["ids"])
+        self.revision_ids = itertools.count(data["revision_ids"])
+
+    @staticmethod
+    def public_meta(file):
+        return {key: value for key, value in file.items() if key not in ("content", "trashed", "_revisions")}
+
+    def add_file(self, name, content, parents=(), mime_type="text/csv"):
+        """Raccourci pour préparer un scénario : crée un fichier et retourne son ID."""
+        with self.lock:
+            file_id = f"fake{next(self.ids)}"
+            file = {"id": file_id, "name": name, "parents": list(parents), "mimeType": mime_type,
+                    "appProperties": {}, "trashed": False}
+            self.store[file_id] = file
+            self.write_content(file, content)
+            return file_id
@@ -0,0 +1,189 @@
+"""
+Mesures de performance de l'application (temps et volumes par opération).
+
+Chaque rerun Streamlit est une « exécution » : les appels Drive, lectures /
+écritures de CSV-Parquet et rendus de page faits pendant le rerun y sont
+chronométrés (nombre d'appels, durée cumulée, octets). Les opérations des
+threads d'arrière-plan (file d'envoi, vignettes) sont cumulées à part et
+jointes à l'exécution suivante.
+
+Les exécutions terminées sont gardées en mémoire par session (panneau
+d'administration : chacun ne voit que ses reruns) et ajoutées à un journal
+JSON lines tournant, analysable hors ligne.
+
+Désactivées (par défaut), les mesures ne coûtent qu'un test de booléen :
+`timed()` retourne alors un objet vide partagé.
+Activation : variable d'environnement COCOM7_PROFILING=1, ou depuis le
+panneau d'administration.
+"""
+import contextvars
+import datetime
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Journal des exécutions (JSON lines) et taille à partir de laquelle il tourne
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "perf", "timings.jsonl")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+
+# Nombre d'exécutions gardées en mémoire pour le panneau, par session
+HISTORY_SIZE = 20
+
+# Nombre de sessions dont l'historique est gardé (les moins récentes sont oubliées)
+HISTORY_SESSIONS = 50
+
+_enabled = os.environ.get("COCOM7_PROFILING") == "1"
+_current = contextvars.ContextVar("instrumentation_run", default=None)
+
+
+class Run:
+    """Mesures d'une exécution : nom -> [nombre d'appels, secondes, octets]."""
+
+    def __init__(self, label, session=None):
+        self.label = label
+        self.session = session
+        self.started_at = datetime.datetime.now()
+        self.started = time.perf_counter()
+        self.timers = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, nbytes=0):
+        with self._lock:
+            entry = self.timers.setdefault(name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += nbytes
+
+    def to_dict(self):
+        with self._lock:
+            timers = {name: {"count": count, "ms": round(seconds * 1000, 2), "bytes": nbytes}
+                      for name, (count, seconds, nbytes) in sorted(self.timers.items(),
+                                                                  key=lambda item: -item[1][1])}
+        return {
+            "ts": self.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "label": self.label,
+            "session": self.session,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "timers": timers,
+        }
+
+
+_background = Run("arrière-plan")
+_history = OrderedDict()  # session -> deque des exécutions
+_history_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+
+class _Timer:
+    __slots__ = ("name", "nbytes", "start")
+
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        run = _current.get() or _background
+        run.record(self.name, time.perf_counter() - self.start, self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(name, nbytes=0):
+    """
+    Chronomètre un bloc `with` sous le nom `name` ; `add_bytes()` sur l'objet
+    retourné ajoute un volume. Sans effet si les mesures sont désactivées.
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, nbytes)
+
+
+# -- Exécutions (reruns) -----------------------------------------------------
+
+def start_run(label="", session=None):
+    """
+    Début d'un rerun de la session `session` ; retourne l'exécution (None si
+    les mesures sont désactivées).
+    """
+    if not _enabled:
+        return None
+    run = Run(label, session)
+    _current.set(run)
+    return run
+
+
+def set_label(label):
+    """Nomme l'exécution en cours (ex. la page affichée)."""
+    run = _current.get()
+    if run is not None:
+        run.label = label
+
+
+def end_run(run):
+    """Termine l'exécution : historique en mémoire + journal JSON lines."""
+    global _background
+    if run is None:
+        return
+    _current.set(None)
+    record = run.to_dict()
+    background, _background = _background, Run("arrière-plan")
+    if background.timers:
+        record["background"] = background.to_dict()["timers"]
+    with _history_lock:
+        _history.setdefault(run.session, deque(maxlen=HISTORY_SIZE)).append(record)
+        _history.move_to_end(run.session)
+        while len(_history) > HISTORY_SESSIONS:
+            _history.popitem(last=False)
+    _write_log(record)
+
+
+def history(session=None):
+    """Dernières exécutions de la session `session` (de la plus récente à la plus ancienne)."""
+    with _history_lock:
+        return list(reversed(_history.get(session, ())))
+
+
+def _write_log(record):
+    with _log_lock:
+        try:
+            os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+            if os.path.exists(LOG_PATH) and os.path.getsize(LOG_PATH) >= LOG_MAX_BYTES:
+                os.replace(LOG_PATH, LOG_PATH + ".1")
+            with open(LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            pass  # Les mesures ne doivent jamais gêner l'application
+
@@ -0,0 +1,34 @@
+"""
+Imports différés des bibliothèques lourdes (pandas, client Google, Pillow...).
+
+`LazyModule("pandas")` s'utilise comme le module lui-même (`pd.DataFrame`),
+mais celui-ci n'est importé qu'au premier accès à l'un de ses attributs :
+l'écran de connexion et la page d'accueil s'affichent sans les charger.
+
+Contrairement à `importlib.util.LazyLoader`, l'objet n'est pas placé dans
+`sys.modules` : l'observateur de fichiers de Streamlit, qui parcourt
+`sys.modules`, ne déclenche donc pas le chargement, et l'import lui-même
+passe par `importlib.import_module` (protégé contre les imports concurrents
+des threads de la file d'envoi).
+"""
+import importlib
+
+
+class LazyModule:
+    """Module importé au premier accès à l'un de ses attributs."""
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "chargé" if self._module is not None else "non chargé"
+        return f"<module différé {self._name!r} ({state})>"
@@ -0,0 +1,258 @@
+"""
+Copie locale du stock (SQLite), qui sert toutes les lectures et reçoit les
+écritures avant Drive.
+
+- `snapshot` : le dernier snapshot Drive (stock.parquet) tiré par la
+  synchronisation, avec sa version et le dernier delta du journal qu'il intègre ;
+- `deltas` : les deltas du journal postérieurs à ce snapshot, ceux lus sur
+  Drive comme ceux écrits par ce serveur. Un delta local est enregistré ici
+  (transaction validée) avant d'être envoyé : une modification acceptée
+  survit à une panne de Drive comme à un redémarrage du serveur ;
+- `conflicts` : écritures concurrentes détectées en tirant les deltas des
+  autres serveurs, affichées jusqu'à ce qu'un utilisateur les marque comme vues ;
+- `state` : dates de la dernière synchronisation réussie / en échec.
+
+La base est en mode WAL (lectures sans blocage pendant une écriture), avec une
+connexion par thread ; elle peut être partagée par plusieurs processus.
+Ce module n'importe ni pandas ni le client Google : l'état de la
+synchronisation s'affiche sans eux (cf. StockSync pour les échanges avec Drive).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Fichier de la base locale
+LOCAL_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "stock_local.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (
+    slot INTEGER PRIMARY KEY CHECK (slot = 0),
+    meta TEXT NOT NULL,
+    upto TEXT NOT NULL,
+    data BLOB NOT NULL,
+    pulled_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deltas (
+    name TEXT PRIMARY KEY,
+    events TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    file_id TEXT,
+    created_at REAL NOT NULL,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS conflicts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    detected_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    seen INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Origine d'un delta : écrit par ce serveur, ou lu sur Drive
+LOCAL = "local"
+DRIVE = "drive"
+
+
+class SnapshotInfo:
+    """Version du snapshot local (sans son contenu)."""
+
+    __slots__ = ("meta", "upto", "pulled_at")
+
+    def __init__(self, meta, upto, pulled_at):
+        self.meta = meta
+        self.upto = upto
+        self.pulled_at = pulled_at
+
+
+class LocalStore:
+    """Base SQLite locale : snapshot, deltas du journal, conflits, état de la synchronisation."""
+
+    def __init__(self, path=LOCAL_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    # -- Snapshot ------------------------------------------------------------
+
+    def snapshot_info(self):
+        """Version du snapshot local, ou None si aucun n'a encore été tiré de Drive."""
+        row = self._connect().execute("SELECT meta, upto, pulled_at FROM snapshot").fetchone()
+        if row is None:
+            return None
+        return SnapshotInfo(json.loads(row[0]), row[1], row[2])
+
+    def snapshot_data(self):
+        """Contenu (Parquet) du snapshot local, ou None."""
+        row = self._connect().execute("SELECT data FROM snapshot").fetchone()
+        return None if row is None else bytes(row[0])
+
+    def save_snapshot(self, meta, upto, data):
+        """Remplace le snapshot local (métadonnées Drive, dernier delta intégré, contenu)."""
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO snapshot (slot, meta, upto, data, pulled_at) "
+                       "VALUES (0, ?, ?, ?, ?)", (json.dumps(meta), upto, sqlite3.Binary(data), time.time()))
+
+    # -- Deltas du journal ---------------------------------------------------
+
+    def add_local_delta(self, name, events):
+        """Enregistre un delta écrit par ce serveur, à envoyer sur Drive."""
+        with self._connect() as db:
+            db.execute("INSERT INTO deltas (name, events, origin, created_at) VALUES (?, ?, ?, ?)",
+                       (name, json.dumps(events, ensure_ascii=False), LOCAL, time.time()))
+
+    def add_remote_deltas(self, deltas):
+        """
+        Enregistre les deltas `deltas` ([(nom, événements)]) lus sur Drive.
+        Un delta local retrouvé sur Drive est marqué comme envoyé.
+        Retourne ceux qui n'étaient pas encore connus (écrits ailleurs).
+        """
+        now = time.time()
+        added = []
+        with self._connect() as db:
+            known = {name for (name,) in db.execute("SELECT name FROM deltas")}
+            for name, events in deltas:
+                if name in known:
+                    db.execute("UPDATE deltas SET synced_at = COALESCE(synced_at, ?) WHERE name = ?", (now, name))
+                    continue
+                db.execute("INSERT INTO deltas (name, events, origin, created_at, synced_at) "
+                           "VALUES (?, ?, ?, ?, ?)", (name, json.dumps(events, ensure_ascii=False), DRIVE, now, now))
+                added.append((name, events))
+        return added
+
+    def delta_names(self, after=""):
+        """
+        Noms des deltas à appliquer sur le snapshot local : ceux postérieurs à
+        `after`, plus les deltas locaux pas encore envoyés (quel que soit leur nom).
+        """
+        rows = self._connect().execute(
+            "SELECT name FROM deltas WHERE name > ? OR synced_at IS NULL ORDER BY name", (after,))
+        return [name for (name,) in rows]
+
+    def delta_events(self, names):
+        """Événements des deltas `names` : {nom: événements}."""
+        result = {}
+        db = self._connect()
+        for name in names:
+            row = db.execute("SELECT events FROM deltas WHERE name = ?", (name,)).fetchone()
+            if row is not None:
+                result[name] = json.loads(row[0])
+        return result
+
+    def local_deltas(self):
+        """
+        [(nom, événements, date d'arrivée sur Drive ou None)] des deltas écrits
+        par ce serveur encore connus.
+        """
+        rows = self._connect().execute(
+            "SELECT name, events, synced_at FROM deltas WHERE origin = ? ORDER BY name", (LOCAL,))
+        return [(name, json.loads(events), synced_at) for name, events, synced_at in rows]
+
+    def unsynced(self):
+        """[(nom, événements, ID Drive pré-généré ou None)] des deltas locaux à envoyer."""
+        rows = self._connect().execute(
+            "SELECT name, events, file_id FROM deltas WHERE synced_at IS NULL ORDER BY name")
+        return [(name, json.loads(events), file_id) for name, events, file_id in rows]
+
+    def has_unsynced(self):
+        """Reste-t-il des deltas locaux à envoyer ?"""
+        return self._connect().execute("SELECT 1 FROM deltas WHERE synced_at IS NULL LIMIT 1").fetchone() is not None
+
+    def set_file_id(self, name, file_id):
+        """Retient l'ID Drive réservé pour le delta `name` (renvoi idempotent)."""
+        with self._connect() as db:
+            db.execute("UPDATE deltas SET file_id = ? WHERE name = ?", (file_id, name))
+
+    def rename_delta(self, name, new_name):
+        """Renomme un delta local pas encore envoyé (et oublie son ID Drive réservé)."""
+        with self._connect() as db:
+            db.execute("UPDATE deltas SET name = ?, file_id = NULL WHERE name = ? AND synced_at IS NULL",
+                       (new_name, name))
+
+    def mark_synced(self, name):
+        """Le delta local `name` est sur Drive."""
+        with self._connect() as db:
+            db.execute("UPDATE deltas SET synced_at = ? WHERE name = ?", (time.time(), name))
+
+    def prune(self, upto):
+        """Oublie les deltas déjà sur Drive et intégrés au snapshot (nom <= `upto`)."""
+        with self._connect() as db:
+            db.execute("DELETE FROM deltas WHERE name <= ? AND synced_at IS NOT NULL", (upto,))
+
+    # -- Conflits ------------------------------------------------------------
+
+    def add_conflict(self, kind, detail):
+        """Signale un conflit (`detail` : dict sérialisable en JSON)."""
+        with self._connect() as db:
+            db.execute("INSERT INTO conflicts (detected_at, kind, detail) VALUES (?, ?, ?)",
+                       (time.time(), kind, json.dumps(detail, ensure_ascii=False)))
+
+    def conflicts(self):
+        """Conflits pas encore vus : [{id, detected_at, kind, detail}], du plus récent au plus ancien."""
+        rows = self._connect().execute(
+            "SELECT id, detected_at, kind, detail FROM conflicts WHERE seen = 0 ORDER BY id DESC")
+        return [{"id": id_, "detected_at": detected_at, "kind": kind, "detail": json.loads(detail)}
+                for id_, detected_at, kind, detail in rows]
+
+    def mark_conflicts_seen(self, ids=None):
+        """Marque comme vus les conflits `ids` (tous par défaut)."""
+        with self._connect() as db:
+            if ids is None:
+                db.execute("UPDATE conflicts SET seen = 1")
+            else:
+                db.executemany("UPDATE conflicts SET seen = 1 WHERE id = ?", [(id_,) for id_ in ids])
+
+    # -- État de la synchronisation ------------------------------------------
+
+    def set_state(self, **values):
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+                           [(key, json.dumps(value)) for key, value in values.items()])
+
+    def state(self):
+        return {key: json.loads(value) for key, value in self._connect().execute("SELECT key, value FROM state")}
+
+    def record_success(self):
+        """Synchronisation avec Drive réussie."""
+        self.set_state(last_success=time.time(), failing_since=None, last_error=None)
+
+    def record_failure(self, error):
+        """Synchronisation en échec (`error` : message affiché)."""
+        state = self.state()
+        self.set_state(failing_since=state.get("failing_since") or time.time(), last_error=error)
+
+    def status(self):
+        """
+        Résumé pour l'affichage : deltas locaux en attente d'envoi et date du
+        plus ancien, dernière synchronisation réussie, échec en cours, conflits.
+        """
+        db = self._connect()
+        pending, oldest = db.execute("SELECT COUNT(*), MIN(created_at) FROM deltas WHERE synced_at IS NULL").fetchone()
+        info = self.snapshot_info()
+        state = self.state()
+        return {
+            "pending": pending,
+            "oldest_pending": oldest,
+            "has_snapshot": info is not None,
+            "last_success": state.get("last_success"),
+            "failing_since": state.get("failing_since"),
+            "last_error": state.get("last_error"),
+            "conflicts": self.conflicts(),
+        }
@@ -0,0 +1,73 @@
+"""
+Préparation en mémoire des photos avant envoi sur Google Drive.
+
+La photo du téléphone (souvent 4000 px, plusieurs Mo) est redressée selon son
+orientation EXIF, réduite à une dimension maximale puis ré-encodée (WebP, ou
+JPEG si Pillow ne gère pas le WebP). Une vignette à la taille de la grille est
+produite en même temps, pour être envoyée à côté de la photo.
+Aucun fichier temporaire n'est écrit sur le disque.
+"""
+import os
+import re
+import uuid
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+
+from thumbnails import resize_image
+
+# Dimension maximale (px) du plus grand côté de la photo envoyée
+PHOTO_MAX_DIMENSION = 1600
+
+# Format d'encodage préféré de la photo
+PHOTO_FORMAT = "WEBP"
+PHOTO_QUALITY = 82
+
+_MIMETYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+class PreparedPhoto:
+    """Photo prête à l'envoi : contenu ré-encodé + vignette JPEG."""
+
+    def __init__(self, name, data, mimetype, thumbnail_name, thumbnail):
+        self.name = name
+        self.data = data
+        self.mimetype = mimetype
+        self.thumbnail_name = thumbnail_name
+        self.thumbnail = thumbnail
+
+
+def encode_photo(data, max_dimension=PHOTO_MAX_DIMENSION, fmt=PHOTO_FORMAT, quality=PHOTO_QUALITY):
+    """
+    Redresse (EXIF), réduit et ré-encode une photo.
+    Retourne (contenu, format effectivement utilisé).
+    """
+    if fmt == "WEBP" and not features.check("webp"):
+        fmt = "JPEG"
+    with Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = BytesIO()
+        image.save(output, format=fmt, quality=quality, optimize=True)
+        return output.getvalue(), fmt
+
+
+def prepare_photo(filename, data, thumbnail_size, max_dimension=PHOTO_MAX_DIMENSION, fmt=PHOTO_FORMAT):
+    """
+    Prépare une photo téléversée (`data` = contenu brut) et sa vignette.
+    Les noms Drive sont rendus uniques pour éviter les collisions entre vendeurs.
+    """
+    photo, fmt = encode_photo(data, max_dimension=max_dimension, fmt=fmt)
+    stem = re.sub(r"[^A-Za-z0-9_-]+", "_", os.path.splitext(os.path.basename(filename))[0]) or "photo"
+    unique_stem = f"{stem}_{uuid.uuid4().hex[:8]}"
+    return PreparedPhoto(
+        name=f"{unique_stem}.{_EXTENSIONS[fmt]}",
+        data=photo,
+        mimetype=_MIMETYPES[fmt],
+        thumbnail_name=f"{unique_stem}_{thumbnail_size}.jpg",
+        # La vignette est calculée depuis la photo déjà réduite (plus rapide)
+        thumbnail=resize_image(photo, thumbnail_size),
+    )
@@ -0,0 +1,200 @@
+"""
+Registre des comptes de vente (comptes_de_vente.csv sur Drive).
+
+Le registre est lu une fois par serveur puis gardé en mémoire : les fiches
+détaillées et la saisie des ventes remplissent leur liste de comptes sans
+appel à Drive. Il est relu après expiration (TTL), pour voir les
+modifications faites depuis un autre serveur, et mis à jour directement par
+les écritures de l'application (page Comptes de vente). Si Drive est
+injoignable, la dernière version lue continue d'être servie.
+
+Colonnes : `compte`, `actif`. Un compte désactivé n'est plus proposé pour
+les nouvelles ventes mais reste connu (ventes passées). L'ancien format
+(colonne `compte` seule) est lu comme une liste de comptes actifs.
+"""
+import threading
+import time
+
+import pandas as pd
+
+from concurrency import WriteConflict
+
+ACCOUNT_COLUMNS = ["compte", "actif"]
+
+# Comptes créés quand aucun n'est défini
+DEFAULT_ACCOUNTS = [
+    "vestiaire coco",
+    "vestiaire ludo",
+    "vestiaire carine",
+    "vestiaire michelle",
+    "vestiaire pro",
+    "vestiaire persephone",
+]
+
+# Durée (secondes) avant de relire le registre sur Drive
+ACCOUNTS_TTL = 600.0
+
+# Délai (secondes) avant une nouvelle relecture quand Drive est injoignable
+ACCOUNTS_RETRY = 60.0
+
+# Résultat d'une modification du registre
+WRITTEN = "written"  # écrite (fusionnée avec une écriture concurrente le cas échéant)
+NOT_WRITTEN = "not_written"  # rien n'a été écrit : l'action est à refaire
+OVERWRITTEN = "overwritten"  # écrite, mais une écriture concurrente a pu être écrasée
+
+_FALSE_VALUES = {"false", "0", "non", "no", "faux"}
+
+
+def _is_active(value):
+    if value is None or pd.isna(value):
+        return True  # Ancien format : tous les comptes sont actifs
+    if isinstance(value, str):
+        return value.strip().lower() not in _FALSE_VALUES
+    return bool(value)
+
+
+def normalize_accounts(df):
+    """
+    Table des comptes (colonnes ACCOUNT_COLUMNS) : noms nettoyés, sans vide
+    ni doublon, `actif` booléen. La version Drive (`attrs`) est conservée.
+    """
+    if "compte" not in df.columns:
+        result = pd.DataFrame({"compte": pd.Series(dtype=object), "actif": pd.Series(dtype=bool)})
+    else:
+        comptes = df["compte"].astype("string").str.strip()
+        actifs = df["actif"] if "actif" in df.columns else pd.Series(True, index=df.index)
+        result = pd.DataFrame({
+            "compte": comptes.astype(object),
+            "actif": [_is_active(value) for value in actifs],
+        })
+        result = result[comptes.notna().to_numpy() & (comptes != "").fillna(False).to_numpy()]
+        result = result.drop_duplicates("compte").reset_index(drop=True)
+    result.attrs.update(df.attrs)
+    return result
+
+
+def unknown_accounts(table, comptes):
+    """
+    Valeurs de `comptes` (ex. la colonne compte_vente du stock) absentes du
+    registre `table`, avec leur nombre d'occurrences (Series triée).
+    """
+    counts = pd.Series(comptes, dtype="string").str.strip().value_counts()
+    return counts[~counts.index.isin(table["compte"])]
+
+
+class SalesAccountRegistry:
+    """
+    Comptes de vente en mémoire, partagés par toutes les sessions du serveur.
+
+    `load(service)` lit la table sur Drive (DataFrame), `save(service, df)`
+    l'écrit et retourne la table effectivement écrite (fusionnée avec une
+    modification concurrente, version Drive dans `attrs`), ou None si rien
+    n'a été écrit ; elle lève WriteConflict (`written` vrai) si notre table a
+    été écrite par-dessus une autre écriture. Les modifications retournent
+    WRITTEN, NOT_WRITTEN ou OVERWRITTEN ; dans les deux derniers cas, le
+    registre est relu au prochain accès.
+    """
+
+    def __init__(self, load, save, ttl=ACCOUNTS_TTL):
+        self._load = load
+        self._save = save
+        self.ttl = ttl
+        self._table = None
+        self._expires_at = 0.0
+        self._lock = threading.RLock()
+
+    def invalidate(self):
+        """Force une relecture sur Drive au prochain accès."""
+        with self._lock:
+            self._expires_at = 0.0
+
+    def table(self, service):
+        """
+        Table des comptes (copie), relue sur Drive si elle a expiré. Si Drive
+        est injoignable, la dernière table lue reste servie (l'erreur n'est
+        levée que si aucune n'a encore été lue).
+        """
+        with self._lock:
+            if self._table is None or time.monotonic() >= self._expires_at:
+                try:
+                    self._table = normalize_accounts(self._load(service))
+                    self._expires_at = time.monotonic() + self.ttl
+                except Exception:
+                    if self._table is None:
+                        raise
+                    self._expires_at = time.monotonic() + ACCOUNTS_RETRY
+            return self._table.copy()
+
+    def accounts(self, service, active_only=True):
+        """Noms des comptes (actifs seulement par défaut), dans l'ordre du registre."""
+        table = self.table(service)
+        if active_only:
+            table = table[table["actif"]]
+        return table["compte"].tolist()
+
+    def ensure_defaults(self, service):
+        """Crée le registre avec DEFAULT_ACCOUNTS s'il est vide ; retourne True s'il l'a créé."""
+        with self._lock:
+            table = self.table(service)
+            if not table.empty:
+                return False
+            return self._write(service, table,
+                               pd.DataFrame({"compte": DEFAULT_ACCOUNTS, "actif": True})) != NOT_WRITTEN
+
+    # -- Modifications ---------------------------------------------------------
+
+    def add(self, service, names):
+        """Ajoute des comptes (actifs) ; un nom vide ou déjà présent lève ValueError."""
+        with self._lock:
+            table = self.table(service)
+            names = [str(name).strip() for name in names]
+            for name in names:
+                if not name:
+                    raise ValueError("Le nom du compte est vide.")
+                if name in set(table["compte"]):
+                    raise ValueError(f"Le compte « {name} » existe déjà.")
+            if len(set(names)) != len(names):
+                raise ValueError("Un même compte est ajouté plusieurs fois.")
+            added = pd.DataFrame({"compte": names, "actif": True})
+            return self._write(service, table, pd.concat([table, added], ignore_index=True))
+
+    def rename(self, service, old, new):
+        """Renomme le compte `old` en `new` (qui ne doit pas déjà exister)."""
+        with self._lock:
+            table = self.table(service)
+            new = str(new).strip()
+            if old not in set(table["compte"]):
+                raise ValueError(f"Le compte « {old} » n'existe pas.")
+            if not new:
+                raise ValueError("Le nom du compte est vide.")
+            if new != old and new in set(table["compte"]):
+                raise ValueError(f"Le compte « {new} » existe déjà.")
+            updated = table.copy()
+            updated.loc[updated["compte"] == old, "compte"] = new
+            return self._write(service, table, updated)
+
+    def set_active(self, service, name, active):
+        """Active ou désactive le compte `name`."""
+        with self._lock:
+            table = self.table(service)
+            if name not in set(table["compte"]):
+                raise ValueError(f"Le compte « {name} » n'existe pas.")
+            updated = table.copy()
+            updated.loc[updated["compte"] == name, "actif"] = bool(active)
+            return self._write(service, table, updated)
+
+    def _write(self, service, table, updated):
+        """Écrit `updated` (à partir de la version lue `table`) et met le registre à jour."""
+        updated = updated[ACCOUNT_COLUMNS].reset_index(drop=True)
+        updated.attrs = dict(table.attrs)
+        try:
+            written = self._save(service, updated)
+        except WriteConflict as e:
+            self.invalidate()
+            return OVERWRITTEN if e.written else NOT_WRITTEN
+        if written is None:
+            self.invalidate()
+            return NOT_WRITTEN
+        self._table = normalize_accounts(written)
+        self._expires_at = time.monotonic() + self.ttl
+        return WRITTEN
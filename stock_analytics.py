@@ -0,0 +1,103 @@
+"""
+Cube d'analyse des ventes : période × compte de vente × collection × taille.
+
+Les ventes sont agrégées une fois par version du stock (groupby vectorisé) :
+d'abord au jour, puis cumulées pour chaque niveau de période (semaine, mois,
+trimestre, année). Les requêtes de la page Analyses (filtres, regroupements,
+zoom sur une période) travaillent sur ces agrégats, dont la taille dépend du
+nombre de combinaisons et non du nombre de ventes.
+"""
+import numpy as np
+import pandas as pd
+
+# Niveaux de période, du plus fin au plus large (libellé -> fréquence pandas)
+PERIODS = {"Jour": "D", "Semaine": "W", "Mois": "M", "Trimestre": "Q", "Année": "Y"}
+
+# Axes d'analyse
+DIMENSIONS = {"compte_vente": "Compte de vente", "collection": "Collection", "taille": "Taille"}
+
+# Mesures (colonne -> libellé)
+MEASURES = {
+    "nb_ventes": "Nombre de ventes",
+    "chiffre_affaires": "Chiffre d'affaires",
+    "gain": "Gain",
+    "gain_apres_impots": "Gain après impôts",
+    "rotation_moyenne": "Rotation moyenne (jours)",
+}
+
+# Valeur affichée pour un axe non renseigné
+MISSING_LABEL = "(non renseigné)"
+
+# Mesures additives stockées dans le cube (la rotation moyenne en est dérivée)
+_SUMS = ["nb_ventes", "chiffre_affaires", "gain", "gain_apres_impots", "rotation_jours", "rotation_ventes"]
+
+
+def _daily_facts(df):
+    """Ventes agrégées par jour × compte × collection × taille."""
+    vendus = df[df["prix_vente"].notna() & df["date_vente"].notna()]
+    jours = (vendus["date_vente"] - vendus["date_arrivee"]).dt.days
+    facts = pd.DataFrame({
+        "date": vendus["date_vente"].dt.normalize(),
+        **{dim: vendus[dim].astype("string").fillna(MISSING_LABEL).astype("category") for dim in DIMENSIONS},
+        "nb_ventes": 1,
+        "chiffre_affaires": vendus["prix_vente"],
+        "gain": vendus["gain_valeur"],
+        "gain_apres_impots": vendus["gain_apres_impots_valeur"],
+        "rotation_jours": jours,
+        "rotation_ventes": jours.notna().astype(int),
+    })
+    return facts.groupby(["date", *DIMENSIONS], observed=True)[_SUMS].sum().reset_index()
+
+
+def _with_ratios(df):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["rotation_moyenne"] = df["rotation_jours"] / df["rotation_ventes"].where(df["rotation_ventes"] > 0)
+    return df
+
+
+class AnalyticsCube:
+    """Agrégats des ventes pour chaque niveau de période (cf. PERIODS)."""
+
+    def __init__(self, df):
+        daily = _daily_facts(df)
+        self._levels = {}
+        for freq in PERIODS.values():
+            rolled = daily.assign(periode=daily["date"].dt.to_period(freq))
+            self._levels[freq] = rolled.groupby(["periode", *DIMENSIONS], observed=True)[_SUMS] \
+                .sum().reset_index()
+
+    @property
+    def empty(self):
+        return self._levels["D"].empty
+
+    def values(self, dimension):
+        """Valeurs présentes sur un axe (pour les filtres)."""
+        return sorted(self._levels["Y"][dimension].astype(str).unique())
+
+    def query(self, period="M", by=(), filters=None, start=None, end=None):
+        """
+        Agrège les ventes par période (fréquence `period`) et par les axes `by`.
+
+        - `filters` : {axe: [valeurs retenues]} (liste vide = pas de filtre) ;
+        - `start` / `end` : bornes (Timestamp) des périodes retenues, pour
+          zoomer sur une période d'un niveau plus large.
+        """
+        df = self._levels[period]
+        for dimension, values in (filters or {}).items():
+            if values:
+                df = df[df[dimension].isin(values)]
+        if start is not None:
+            df = df[df["periode"].dt.start_time >= start]
+        if end is not None:
+            df = df[df["periode"].dt.end_time <= end]
+        result = df.groupby(["periode", *by], observed=True)[_SUMS].sum().reset_index()
+        return _with_ratios(result)
+
+    @staticmethod
+    def chart_frame(result, measure, by=None):
+        """Tableau prêt pour st.bar_chart / st.line_chart : une ligne par période."""
+        result = result.assign(periode=result["periode"].astype(str))
+        if by:
+            return result.pivot_table(index="periode", columns=by, values=measure,
+                                      aggfunc="sum", observed=True).sort_index()
+        return result.set_index("periode")[[measure]].sort_index()
@@ -0,0 +1,306 @@
+"""
+Cache local des fichiers lus sur Google Drive (stock.parquet, stock.csv,
+comptes_de_vente.csv...).
+
+Les DataFrames sont gardés en mémoire (partagés entre toutes les sessions
+Streamlit du processus) et sur disque (pour survivre à un redémarrage).
+Un fichier n'est re-téléchargé que si sa version Drive a changé
+(modifiedTime / md5Checksum / headRevisionId).
+
+Le téléchargement se fait par morceaux (MediaIoBaseDownload), directement
+dans le fichier du cache disque, que le parser lit ensuite : le contenu n'est
+jamais entièrement en mémoire à côté du DataFrame.
+
+Le cache disque est commun à tous les processus du serveur : un fichier
+téléchargé par l'un n'est pas re-téléchargé par les autres, mais chaque
+processus le lit et garde son propre DataFrame en mémoire.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+import pandas as pd
+from googleapiclient.http import MediaIoBaseDownload
+
+import instrumentation
+
+from stock_schema import PARQUET_MIMETYPE, read_stock_parquet, stock_from_parquet_bytes, stock_to_parquet_bytes
+
+# Dossier du cache disque (à côté de l'application)
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "drive")
+
+# Champs Drive nécessaires pour savoir si un fichier a changé
+VERSION_FIELDS = "id,name,modifiedTime,md5Checksum,headRevisionId,appProperties"
+
+# Clé de `DataFrame.attrs` où l'on note la version Drive d'où vient un DataFrame
+DRIVE_VERSION_ATTR = "drive_version"
+
+# Nombre de versions précédentes gardées par fichier (bases de fusion en cas de conflit)
+HISTORY_SIZE = 4
+
+# Taille des morceaux téléchargés (une requête Drive par morceau)
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def same_version(meta_a, meta_b):
+    """
+    Indique si deux métadonnées Drive désignent la même version d'un fichier.
+    On compare l'ID, puis le checksum / la révision / la date de modification
+    quand Drive les fournit.
+    """
+    if not meta_a or not meta_b or meta_a.get("id") != meta_b.get("id"):
+        return False
+    compared = False
+    for key in ("md5Checksum", "headRevisionId", "modifiedTime"):
+        if meta_a.get(key) and meta_b.get(key):
+            compared = True
+            if meta_a[key] != meta_b[key]:
+                return False
+    return compared
+
+
+def version_key(meta):
+    """Identifiant compact d'une version Drive (utilisé pour l'historique)."""
+    return (meta.get("id"), meta.get("headRevisionId"), meta.get("md5Checksum"), meta.get("modifiedTime"))
+
+
+def parse_csv_bytes(data):
+    """Convertit le contenu brut d'un CSV en DataFrame."""
+    return pd.read_csv(BytesIO(data), sep=",")
+
+
+def parse_bytes(filename, data):
+    """Convertit le contenu brut d'un fichier en DataFrame, selon son extension."""
+    if filename.endswith(".parquet"):
+        with instrumentation.timed("parse.parquet", len(data)):
+            return stock_from_parquet_bytes(data)
+    with instrumentation.timed("parse.csv", len(data)):
+        return parse_csv_bytes(data)
+
+
+def parse_file(filename, path):
+    """Comme parse_bytes, en lisant directement le fichier local `path` (sans le charger en mémoire)."""
+    nbytes = os.path.getsize(path)
+    if filename.endswith(".parquet"):
+        with instrumentation.timed("parse.parquet", nbytes):
+            return read_stock_parquet(path)
+    with instrumentation.timed("parse.csv", nbytes):
+        return pd.read_csv(path, sep=",")
+
+
+def serialize_frame(filename, df):
+    """Sérialise `df` selon l'extension de `filename`. Retourne (contenu, mimetype)."""
+    if filename.endswith(".parquet"):
+        with instrumentation.timed("serialize.parquet") as timer:
+            data = stock_to_parquet_bytes(df)
+            timer.add_bytes(len(data))
+        return data, PARQUET_MIMETYPE
+    with instrumentation.timed("serialize.csv") as timer:
+        data = df.to_csv(index=False, encoding="utf-8").encode("utf-8")
+        timer.add_bytes(len(data))
+    return data, "text/csv"
+
+
+def download_media(service, file_id, fileobj, chunksize=DOWNLOAD_CHUNK_SIZE):
+    """
+    Télécharge le contenu du fichier Drive `file_id` dans `fileobj`, par
+    morceaux de `chunksize` octets. Retourne le nombre d'octets reçus.
+    """
+    request = service.files().get_media(fileId=file_id)
+    with instrumentation.timed("drive.files.get_media") as timer:
+        downloader = MediaIoBaseDownload(fileobj, request, chunksize=chunksize)
+        done = False
+        while not done:
+            progress, done = downloader.next_chunk()
+        timer.add_bytes(progress.resumable_progress)
+    return progress.resumable_progress
+
+
+class StockCache:
+    """
+    Cache mémoire + disque des fichiers CSV / Parquet stockés sur Drive.
+
+    - `get()` renvoie une copie du DataFrame, en ne téléchargeant le fichier
+      que si la version distante a changé.
+    - `put()` met à jour le cache après une écriture faite par l'application,
+      sans aller-retour supplémentaire.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, revalidate_after=5.0):
+        self.cache_dir = cache_dir
+        # Délai (secondes) pendant lequel on fait confiance au cache sans
+        # redemander la version à Drive
+        self.revalidate_after = revalidate_after
+        self._entries = {}  # filename -> {"meta", "df", "checked_at"}
+        self._history = {}  # filename -> OrderedDict(version_key -> df)
+        # `_lock` protège les entrées ; `_file_locks` (un par fichier) les
+        # échanges avec Drive et le cache disque de ce fichier
+        self._lock = threading.RLock()
+        self._file_locks = {}
+
+    def _file_lock(self, filename):
+        """Verrou des échanges avec Drive pour `filename` (une seule requête à la fois par fichier)."""
+        with self._lock:
+            return self._file_locks.setdefault(filename, threading.RLock())
+
+    # -- Cache disque --------------------------------------------------------
+
+    def _paths(self, filename):
+        data_path = os.path.join(self.cache_dir, filename)
+        return data_path, data_path + ".meta.json"
+
+    def _load_from_disk(self, filename):
+        data_path, meta_path = self._paths(filename)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            df = parse_file(filename, data_path)
+        except (OSError, ValueError):
+            return None
+        # Jamais vérifié depuis le démarrage : on forcera une revalidation
+        return {"meta": meta, "df": df, "checked_at": 0.0}
+
+    def _download(self, service, filename, file_id, meta):
+        """
+        Télécharge le fichier par morceaux dans le cache disque, puis le lit
+        depuis le disque. Sans cache disque utilisable, le téléchargement se
+        fait en mémoire.
+        """
+        data_path, meta_path = self._paths(filename)
+        tmp_path = f"{data_path}.download"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                download_media(service, file_id, f)
+            os.replace(tmp_path, data_path)
+            with open(f"{meta_path}.tmp", "w") as f:
+                f.write(json.dumps(meta))
+            os.replace(f"{meta_path}.tmp", meta_path)
+        except OSError:
+            buffer = BytesIO()
+            download_media(service, file_id, buffer)
+            return parse_bytes(filename, buffer.getvalue())
+        return parse_file(filename, data_path)
+
+    def _save_to_disk(self, filename, data, meta):
+        data_path, meta_path = self._paths(filename)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Écriture atomique : fichier temporaire puis remplacement
+            for path, content, mode in ((data_path, data, "wb"),
+                                        (meta_path, json.dumps(meta), "w")):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+        except OSError:
+            # Le cache disque est une optimisation : on continue sans
+            pass
+
+    def _remember(self, filename, meta, df):
+        history = self._history.setdefault(filename, OrderedDict())
+        history[version_key(meta)] = df
+        history.move_to_end(version_key(meta))
+        while len(history) > HISTORY_SIZE:
+            history.popitem(last=False)
+
+    def _serve(self, entry):
+        """Copie du DataFrame en cache, annotée avec sa version Drive."""
+        df = entry["df"].copy()
+        df.attrs[DRIVE_VERSION_ATTR] = dict(entry["meta"])
+        return df
+
+    # -- API publique --------------------------------------------------------
+
+    def get(self, service, filename, file_id, meta=None):
+        """
+        Retourne le DataFrame du fichier `file_id`. Sa version Drive est notée
+        dans `df.attrs[DRIVE_VERSION_ATTR]` (base des écritures concurrentes).
+
+        Si `meta` (métadonnées Drive contenant VERSION_FIELDS) est fourni, il
+        sert directement de référence de version ; sinon la version est
+        demandée à Drive (au plus toutes les `revalidate_after` secondes).
+        """
+        # Échanges avec Drive sous le seul verrou du fichier : les lectures
+        # des autres fichiers ne les attendent pas, celles du même fichier
+        # trouvent ensuite l'entrée à jour
+        with self._file_lock(filename):
+            with self._lock:
+                entry = self._entries.get(filename)
+            if entry is None:
+                entry = self._load_from_disk(filename)
+                if entry is not None:
+                    with self._lock:
+                        self._entries[filename] = entry
+
+            now = time.monotonic()
+            if meta is None:
+                fresh = (entry is not None
+                         and entry["meta"].get("id") == file_id
+                         and now - entry["checked_at"] < self.revalidate_after)
+                if fresh:
+                    return self._serve(entry)
+                try:
+                    meta = service.files().get(fileId=file_id, fields=VERSION_FIELDS).execute()
+                except Exception:
+                    # Drive indisponible : on sert la dernière version connue
+                    if entry is not None and entry["meta"].get("id") == file_id:
+                        return self._serve(entry)
+                    raise
+
+            if entry is not None and same_version(entry["meta"], meta):
+                with self._lock:
+                    entry["checked_at"] = now
+                return self._serve(entry)
+
+            # Version différente (ou inconnue) : téléchargement complet
+            df = self._download(service, filename, file_id, meta)
+            entry = {"meta": meta, "df": df, "checked_at": now}
+            with self._lock:
+                self._entries[filename] = entry
+                self._remember(filename, meta, df)
+            return self._serve(entry)
+
+    def put(self, filename, data, meta):
+        """
+        Enregistre dans le cache la version que l'on vient d'écrire sur Drive.
+        `data` est le contenu envoyé, `meta` la réponse de Drive (VERSION_FIELDS).
+        Le contenu est re-parsé pour que les lecteurs voient exactement les
+        mêmes types qu'après un téléchargement.
+        """
+        df = parse_bytes(filename, data)
+        with self._file_lock(filename), self._lock:
+            self._entries[filename] = {"meta": meta, "df": df, "checked_at": time.monotonic()}
+            self._remember(filename, meta, df)
+            self._save_to_disk(filename, data, meta)
+
+    def frame_at(self, filename, meta):
+        """
+        DataFrame d'une version précise du fichier, si elle est encore
+        dans l'historique en mémoire (sinon None).
+        """
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and same_version(entry["meta"], meta):
+                return entry["df"].copy()
+            df = self._history.get(filename, {}).get(version_key(meta))
+            return df.copy() if df is not None else None
+
+    def meta(self, filename):
+        """Métadonnées Drive de la version en cache (ou None)."""
+        with self._lock:
+            entry = self._entries.get(filename)
+            return dict(entry["meta"]) if entry is not None else None
+
+    def invalidate(self, filename=None):
+        """Oublie une entrée (ou tout le cache mémoire si `filename` est None)."""
+        with self._lock:
+            if filename is None:
+                self._entries.clear()
+                self._history.clear()
+            else:
+                self._entries.pop(filename, None)
+                self._history.pop(filename, None)
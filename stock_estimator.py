@@ -0,0 +1,213 @@
+"""
+Estimation du prix de vente et du délai de vente d'un article, apprise sur
+l'historique des ventes, par collection × taille.
+
+- Délai de vente : loi exponentielle par groupe. Les articles encore en stock
+  comptent pour leur ancienneté (données censurées) : un groupe qui se vend
+  mal n'est pas jugé sur ses seules ventes rapides.
+- Prix de vente : log(prix de vente / prix d'achat) = a(groupe) + b × jours
+  avant la vente. La pente b (décote avec l'ancienneté) est commune à tous
+  les groupes, ramenée vers 0 quand les ventes sont peu nombreuses, et
+  n'est pas extrapolée au-delà des délais de vente observés ; le prix
+  attendu est l'espérance de la loi log-normale.
+
+Les groupes peu représentés sont ramenés vers leur collection, elle-même
+ramenée vers l'ensemble du stock (moyennes pondérées par un poids a priori
+de PRIOR_WEIGHT ventes) : une collection × taille jamais vendue reçoit
+l'estimation de sa collection, une collection inconnue celle du stock.
+
+L'apprentissage est vectorisé (np.bincount par groupe), et refait au plus une
+fois par révision du stock (cf. StockStore.estimations).
+"""
+import numpy as np
+import pandas as pd
+
+# Poids a priori (en nombre de ventes) du niveau parent pour un groupe
+PRIOR_WEIGHT = 5.0
+
+# Délai de vente supposé (jours) tant qu'aucune vente n'est datée
+DEFAULT_DAYS_TO_SELL = 30.0
+
+
+def _keys(values):
+    """
+    Clés de regroupement : texte sans espaces superflus ni majuscules ("" si
+    vide). Pour une colonne catégorielle, seules les catégories sont traitées.
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        keys = np.append(_keys(values.cat.categories), "")
+        return keys[values.cat.codes.to_numpy()]  # code -1 (vide) -> ""
+    return values.astype("string").str.strip().str.lower().fillna("").to_numpy(dtype=object)
+
+
+def _sums(codes, size, weights=None):
+    return np.bincount(codes, weights=weights, minlength=size).astype(float)
+
+
+def _level(positions, values, fallback):
+    """Paramètre du niveau `values` aux positions trouvées (>= 0), `fallback` ailleurs."""
+    if not len(values):
+        return np.full(positions.shape, fallback, dtype=float)
+    return np.where(positions >= 0, values[np.maximum(positions, 0)], fallback)
+
+
+def _shrink(total, count, parent, weight=PRIOR_WEIGHT):
+    """Moyenne (`total` / `count`) ramenée vers `parent` avec un poids de `weight` observations."""
+    return (total + weight * parent) / (count + weight)
+
+
+class SalesEstimator:
+    """Modèles prix / délai de vente ajustés sur un DataFrame de stock (cf. `fit`)."""
+
+    def __init__(self):
+        self.n_sales = 0
+        self.collections = pd.Index([], dtype=object)
+        self.groups = pd.MultiIndex.from_arrays([[], []])
+        self.group_collection = np.empty(0, dtype=np.int64)
+        # Délai de vente : taux de vente par jour (global, collection, groupe)
+        self.rate = 1 / DEFAULT_DAYS_TO_SELL
+        self.rate_collection = np.empty(0)
+        self.rate_group = np.empty(0)
+        # Prix : ordonnée à l'origine (global, collection, groupe), pente, variance résiduelle
+        self.intercept = 0.0
+        self.intercept_collection = np.empty(0)
+        self.intercept_group = np.empty(0)
+        self.slope = 0.0
+        self.variance = 0.0
+        # Délais de vente (jours) observés : la pente n'est appliquée qu'entre ces bornes
+        self.days_min = 0.0
+        self.days_max = 0.0
+
+    @property
+    def fitted(self):
+        """Au moins une vente exploitable pour le prix."""
+        return self.n_sales > 0
+
+    @classmethod
+    def fit(cls, df, now=None):
+        """Ajuste les deux modèles sur les articles vendus (et l'ancienneté des autres) de `df`."""
+        est = cls()
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        collection_codes, collections = pd.factorize(_keys(df["collection"]))
+        taille_codes, tailles = pd.factorize(_keys(df["taille"]))
+        pair_codes = collection_codes.astype(np.int64) * max(len(tailles), 1) + taille_codes
+        group_codes, pairs = pd.factorize(pair_codes)
+        n_collections, n_groups = len(collections), len(pairs)
+        est.collections = pd.Index(collections, dtype=object)
+        est.group_collection = pairs // max(len(tailles), 1)
+        est.groups = pd.MultiIndex.from_arrays([collections[est.group_collection],
+                                                tailles[pairs % max(len(tailles), 1)]])
+
+        prix_achat = df["prix_achat"].to_numpy(dtype=float, na_value=np.nan)
+        prix_vente = df["prix_vente"].to_numpy(dtype=float, na_value=np.nan)
+        arrivee = pd.to_datetime(df["date_arrivee"], errors="coerce")
+        jours_vente = (pd.to_datetime(df["date_vente"], errors="coerce") - arrivee).dt.days \
+            .to_numpy(dtype=float, na_value=np.nan).clip(min=0)
+        anciennete = (now - arrivee).dt.days.to_numpy(dtype=float, na_value=np.nan).clip(min=0)
+        vendu = ~np.isnan(prix_vente)
+
+        # ⏱️ Délai de vente : ventes / (jours de vente + ancienneté des invendus), par niveau
+        dated = vendu & ~np.isnan(jours_vente)
+        waiting = ~vendu & ~np.isnan(anciennete)
+        exposure = np.where(dated, jours_vente, 0.0) + np.where(waiting, anciennete, 0.0)
+        events = dated.astype(float)
+        if events.sum() > 0 and exposure.sum() > 0:
+            est.rate = events.sum() / exposure.sum()
+        est.rate_collection = (_sums(collection_codes, n_collections, events) + PRIOR_WEIGHT) \
+            / (_sums(collection_codes, n_collections, exposure) + PRIOR_WEIGHT / est.rate)
+        est.rate_group = (_sums(group_codes, n_groups, events) + PRIOR_WEIGHT) \
+            / (_sums(group_codes, n_groups, exposure) + PRIOR_WEIGHT / est.rate_collection[est.group_collection])
+
+        # 💰 Prix : log du rapport vente / achat, fonction du délai de vente
+        usable = dated & (prix_vente > 0) & (prix_achat > 0)
+        est.n_sales = int(usable.sum())
+        if not est.n_sales:
+            return est
+        g, c = group_codes[usable], collection_codes[usable]
+        ratio = np.log(prix_vente[usable] / prix_achat[usable])
+        days = jours_vente[usable]
+        est.days_min, est.days_max = float(days.min()), float(days.max())
+        n_g = _sums(g, n_groups)
+        mean_ratio_g = _sums(g, n_groups, ratio) / np.maximum(n_g, 1)
+        mean_days_g = _sums(g, n_groups, days) / np.maximum(n_g, 1)
+        # Pente commune, calculée à l'intérieur des groupes (pas d'effet de composition)
+        centered_days = days - mean_days_g[g]
+        denominator = (centered_days ** 2).sum()
+        if denominator > 0:
+            slope = (centered_days * (ratio - mean_ratio_g[g])).sum() / denominator
+            # Peu de ventes : pente ramenée vers 0 (pas de décote)
+            est.slope = float(slope * est.n_sales / (est.n_sales + PRIOR_WEIGHT))
+
+        adjusted = ratio - est.slope * days
+        est.intercept = float(adjusted.mean())
+        est.intercept_collection = _shrink(_sums(c, n_collections, adjusted), _sums(c, n_collections),
+                                           est.intercept)
+        est.intercept_group = _shrink(_sums(g, n_groups, adjusted), n_g,
+                                      est.intercept_collection[est.group_collection])
+        residuals = adjusted - est.intercept_group[g]
+        est.variance = float(residuals.var()) if est.n_sales > 1 else 0.0
+        return est
+
+    def predict(self, prix_achat, collection, taille, age_days=0):
+        """
+        Prix de vente attendu et nombre de jours restant avant la vente, pour
+        des articles (tableaux ou scalaires) : `age_days` est leur ancienneté.
+        Retourne deux tableaux NumPy (prix NaN si le modèle n'est pas ajusté
+        ou si le prix d'achat est nul).
+        """
+        prix_achat = np.atleast_1d(np.asarray(prix_achat, dtype=float))
+        collections = _keys(collection if isinstance(collection, pd.Series) else np.atleast_1d(collection))
+        tailles = _keys(taille if isinstance(taille, pd.Series) else np.atleast_1d(taille))
+        age_days = np.broadcast_to(np.asarray(age_days, dtype=float), prix_achat.shape)
+
+        c = self.collections.get_indexer(collections)
+        g = self.groups.get_indexer(pd.MultiIndex.from_arrays([collections, tailles]))
+        # Groupe connu, sinon sa collection, sinon l'ensemble du stock
+        rate = np.where(g >= 0, _level(g, self.rate_group, self.rate),
+                        _level(c, self.rate_collection, self.rate))
+        jours = 1 / rate
+        if not self.fitted:
+            return np.full(prix_achat.shape, np.nan), jours
+
+        intercept = np.where(g >= 0, _level(g, self.intercept_group, self.intercept),
+                             _level(c, self.intercept_collection, self.intercept))
+        days = np.clip(np.nan_to_num(age_days) + jours, self.days_min, self.days_max)
+        log_ratio = intercept + self.slope * days + self.variance / 2
+        prix = np.where(prix_achat > 0, prix_achat * np.exp(log_ratio), np.nan)
+        return prix, jours
+
+    def estimate(self, prix_achat, collection, taille, age_days=0):
+        """Version scalaire de `predict` : (prix attendu ou None, jours avant la vente)."""
+        prix, jours = self.predict(prix_achat, collection, taille, age_days)
+        return (None if np.isnan(prix[0]) else float(prix[0])), float(jours[0])
+
+    def portfolio(self, df, now=None):
+        """
+        Espérances pour les articles non vendus de `df`, en une passe :
+        une ligne par collection (nb, valeur d'achat, prix de vente attendu,
+        gain attendu, délai moyen de vente en jours). Les articles sans prix
+        attendu (prix d'achat nul) ne comptent que dans le nombre d'articles.
+        """
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        stock = df[df["prix_vente"].isna()]
+        anciennete = (now - pd.to_datetime(stock["date_arrivee"], errors="coerce")).dt.days \
+            .to_numpy(dtype=float, na_value=np.nan).clip(min=0)
+        prix, jours = self.predict(stock["prix_achat"].to_numpy(dtype=float, na_value=np.nan),
+                                   stock["collection"], stock["taille"],
+                                   anciennete)
+        achat = stock["prix_achat"].to_numpy(dtype=float, na_value=np.nan)
+        estimated = ~np.isnan(prix)
+        frame = pd.DataFrame({
+            "collection": stock["collection"].astype("string").fillna("(non renseignée)").to_numpy(),
+            "nb_articles": 1,
+            "valeur_achat": np.nan_to_num(achat),
+            "prix_attendu": np.where(estimated, prix, 0.0),
+            "gain_attendu": np.where(estimated, prix - np.nan_to_num(achat), 0.0),
+            "jours_attendus": jours,
+        })
+        grouped = frame.groupby("collection", sort=True).agg(
+            nb_articles=("nb_articles", "sum"), valeur_achat=("valeur_achat", "sum"),
+            prix_attendu=("prix_attendu", "sum"), gain_attendu=("gain_attendu", "sum"),
+            jours_attendus=("jours_attendus", "mean"))
+        return grouped.reset_index()
@@ -0,0 +1,168 @@
+"""
+Index de recherche du stock pour la page de consultation.
+
+Au lieu de parcourir tout le DataFrame à chaque rerun (listes `unique()`,
+`str.contains` sur toutes les descriptions à chaque frappe), on garde :
+- des index inversés taille -> lignes, collection -> lignes, et un bitmap
+  des articles vendus ;
+- un index des mots des descriptions (sans accents ni majuscules), avec un
+  vocabulaire trié pour la recherche par préfixe.
+
+Filtrer revient alors à intersecter des ensembles de lignes. L'index est construit
+une fois par version du stock (cf. StockStore.search), puis tenu à jour à
+chaque ajout / vente.
+"""
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Colonnes dont dépend l'index
+INDEXED_COLUMNS = ("taille", "collection", "description", "prix_vente")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    """Minuscules, sans accents (« Écharpe » -> « echarpe »)."""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Mots normalisés d'un texte (ensemble vide pour une valeur manquante)."""
+    if text is None or pd.isna(text):
+        return set()
+    return set(_WORD_RE.findall(normalize_text(text)))
+
+
+def _label(value):
+    return None if value is None or pd.isna(value) else str(value)
+
+
+class StockIndex:
+    """
+    Index inversés (taille, collection) + index plein texte des descriptions,
+    et bitmap des articles vendus.
+
+    Les articles sont désignés par leur numéro de ligne dans le DataFrame du
+    stock (stable : les lignes ne sont jamais déplacées, les ajouts vont à la fin).
+    """
+
+    def __init__(self):
+        self._by_taille = {}  # taille -> {ligne}
+        self._by_collection = {}  # collection -> {ligne}
+        self._by_token = {}  # mot -> {ligne}
+        self._vocabulary = []  # mots triés (recherche par préfixe)
+        self._entries = []  # ligne -> (taille, collection, mots) : pour les mises à jour
+        self._sold = np.zeros(1024, dtype=bool)  # agrandi par doublement
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Construit l'index à partir du DataFrame du stock (une entrée par ligne)."""
+        index = cls()
+        columns = [df[column].tolist() for column in INDEXED_COLUMNS]
+        for taille, collection, description, prix_vente in zip(*columns):
+            index.add({"taille": taille, "collection": collection,
+                       "description": description, "prix_vente": prix_vente})
+        return index
+
+    # -- Mise à jour ---------------------------------------------------------
+
+    def add(self, fields):
+        """Indexe une nouvelle ligne (à la fin du stock) et retourne son numéro."""
+        row = len(self._entries)
+        if row == len(self._sold):
+            self._sold = np.concatenate([self._sold, np.zeros(len(self._sold), dtype=bool)])
+        self._entries.append((None, None, set()))
+        self._set(row, _label(fields.get("taille")), _label(fields.get("collection")),
+                  tokenize(fields.get("description")))
+        self._sold[row] = pd.notna(fields.get("prix_vente"))
+        return row
+
+    def update(self, row, fields):
+        """Met à jour l'entrée de la ligne `row` après modification de `fields`."""
+        taille, collection, tokens = self._entries[row]
+        if "taille" in fields or "collection" in fields or "description" in fields:
+            self._set(row,
+                      _label(fields["taille"]) if "taille" in fields else taille,
+                      _label(fields["collection"]) if "collection" in fields else collection,
+                      tokenize(fields["description"]) if "description" in fields else tokens)
+        if "prix_vente" in fields:
+            self._sold[row] = pd.notna(fields["prix_vente"])
+
+    def _set(self, row, taille, collection, tokens):
+        old_taille, old_collection, old_tokens = self._entries[row]
+        for groups, old, new in ((self._by_taille, old_taille, taille),
+                                 (self._by_collection, old_collection, collection)):
+            if old == new:
+                continue
+            if old is not None:
+                groups[old].discard(row)
+                if not groups[old]:
+                    del groups[old]
+            if new is not None:
+                groups.setdefault(new, set()).add(row)
+        for token in old_tokens - tokens:
+            rows = self._by_token[token]
+            rows.discard(row)
+            if not rows:
+                del self._by_token[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        for token in tokens - old_tokens:
+            rows = self._by_token.get(token)
+            if rows is None:
+                rows = self._by_token[token] = set()
+                bisect.insort(self._vocabulary, token)
+            rows.add(row)
+        self._entries[row] = (taille, collection, tokens)
+
+    # -- Requêtes ------------------------------------------------------------
+
+    def tailles(self):
+        return sorted(self._by_taille)
+
+    def collections(self):
+        return sorted(self._by_collection)
+
+    def prefix_matches(self, prefix):
+        """Lignes dont un mot de la description commence par `prefix`."""
+        result = set()
+        position = bisect.bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            result |= self._by_token[self._vocabulary[position]]
+            position += 1
+        return result
+
+    def search(self, taille=None, collection=None, text="", unsold_only=False):
+        """
+        Lignes (tableau trié) des articles correspondant à tous les critères.
+        `text` : chaque mot doit être le début d'un mot de la description
+        (« rou sac » trouve « Sac rouge »), sans tenir compte des accents ni
+        des majuscules.
+        """
+        candidates = []
+        if taille is not None:
+            candidates.append(self._by_taille.get(str(taille), set()))
+        if collection is not None:
+            candidates.append(self._by_collection.get(str(collection), set()))
+        for word in _WORD_RE.findall(normalize_text(text or "")):
+            candidates.append(self.prefix_matches(word))
+
+        if not candidates:
+            rows = np.arange(len(self._entries))
+        else:
+            # On part du plus petit ensemble pour des intersections rapides
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for other in candidates[1:]:
+                result &= other
+            rows = np.sort(np.fromiter(result, dtype=np.int64, count=len(result)))
+        if unsold_only:
+            rows = rows[~self._sold[rows]]
+        return rows
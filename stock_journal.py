@@ -0,0 +1,273 @@
+"""
+Journal d'événements du stock (ajouts / ventes d'articles).
+
+Au lieu de réécrire tout stock.csv à chaque modification, chaque mutation est
+écrite sur Drive dans un petit fichier "delta" JSON (quelques centaines
+d'octets). L'état courant = dernier snapshot (stock.csv) + deltas plus récents.
+Régulièrement, les deltas sont compactés dans un nouveau snapshot puis supprimés.
+
+Le snapshot retient le dernier delta qu'il contient dans ses `appProperties`
+(clé JOURNAL_UPTO_KEY) : un lecteur n'applique que les deltas plus récents.
+"""
+import datetime
+import json
+import threading
+import time
+import uuid
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+
+from drive_files import escape_query_value
+
+# Préfixe des fichiers delta (triés chronologiquement par leur nom)
+DELTA_PREFIX = "stock.delta."
+
+# Clé des appProperties du snapshot indiquant le dernier delta intégré
+JOURNAL_UPTO_KEY = "journal_upto"
+
+# Nombre de deltas à partir duquel on compacte dans un nouveau snapshot
+COMPACT_THRESHOLD = 50
+
+# Âge minimum (secondes) d'un delta pour être compacté : laisse le temps aux
+# écritures en cours d'un autre serveur (dont le nom est déjà daté) d'aboutir
+COMPACT_GRACE = 120
+
+# Types d'événements
+ARTICLE_ADDED = "article_added"
+ARTICLE_SOLD = "article_sold"
+ARTICLE_UPDATED = "article_updated"
+
+
+def delta_time(name, prefix=DELTA_PREFIX):
+    """Date d'écriture d'un delta d'après son nom (secondes depuis l'époque), ou None."""
+    try:
+        stamp = datetime.datetime.strptime(name[len(prefix):].split(".")[0], "%Y%m%dT%H%M%S%fZ")
+    except ValueError:
+        return None
+    return stamp.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _jsonable(value):
+    """Convertit les valeurs pandas / numpy en types JSON (NaN / NA -> None)."""
+    if isinstance(value, (list, dict)):
+        return value
+    if pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, np.generic):
+        value = value.item()
+    return value
+
+
+def make_event(event_type, **payload):
+    """Construit un événement du journal, prêt à être écrit."""
+    event = {
+        "event_id": uuid.uuid4().hex,
+        "type": event_type,
+        "ts": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    for key, value in payload.items():
+        if isinstance(value, dict):
+            value = {k: _jsonable(v) for k, v in value.items()}
+        event[key] = _jsonable(value)
+    return event
+
+
+def article_added(article):
+    """Événement d'ajout : `article` est la ligne complète (dict colonne -> valeur)."""
+    return make_event(ARTICLE_ADDED, article=article)
+
+
+def article_sold(article_id, fields):
+    """Événement de vente : `fields` contient prix_vente, date_vente, gains..."""
+    return make_event(ARTICLE_SOLD, id=article_id, fields=fields)
+
+
+def article_updated(article_id, fields):
+    """Événement de modification (ex. compte de vente renommé) : ce n'est pas une vente."""
+    return make_event(ARTICLE_UPDATED, id=article_id, fields=fields)
+
+
+def _set_values(df, mask, column, values):
+    """Affecte `values` aux lignes `mask` en élargissant le type de colonne si besoin."""
+    if column not in df.columns:
+        df[column] = np.nan
+    dtype = df[column].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        new = [value for value in values.dropna().unique() if value not in dtype.categories]
+        if new:
+            df[column] = df[column].cat.add_categories(new)
+    elif values.map(lambda v: isinstance(v, str)).any() and dtype != object \
+            and not pd.api.types.is_string_dtype(dtype):
+        df[column] = df[column].astype(object)
+    df.loc[mask, column] = values.to_numpy()
+
+
+def _apply_sales(df, sales):
+    """
+    Applique les ventes {id: champs} en une opération indexée par colonne
+    (et non une recherche par article) : un lot de ventes coûte autant qu'une.
+    """
+    ids = df["id"]
+    columns = dict.fromkeys(column for fields in sales.values() for column in fields)
+    for column in columns:
+        by_id = pd.Series({article_id: fields[column] for article_id, fields in sales.items()
+                           if column in fields}, dtype=object).infer_objects()
+        mask = ids.isin(by_id.index).fillna(False).to_numpy(dtype=bool)
+        _set_values(df, mask, column, ids[mask].map(by_id))
+
+
+def apply_events(df, events):
+    """
+    Rejoue `events` (dans l'ordre) sur le DataFrame `df` et retourne le résultat.
+
+    Si deux vendeurs ont ajouté un article avec le même ID en parallèle, le
+    second reçoit un nouvel ID (max + 1) : le rejeu étant déterministe, tous les
+    lecteurs obtiennent le même état.
+    """
+    if not events:
+        return df
+
+    known_ids = set(df["id"].dropna().astype(int)) if not df.empty else set()
+    max_id = max(known_ids) if known_ids else 0
+    added = {}  # id -> dict de la ligne ajoutée (avant concaténation)
+    sales = {}  # id -> champs vendus / modifiés pour les lignes déjà présentes
+
+    for event in events:
+        if event.get("type") == ARTICLE_ADDED:
+            article = dict(event["article"])
+            article_id = article.get("id")
+            if article_id is None or int(article_id) in known_ids:
+                article_id = max_id + 1
+            article["id"] = int(article_id)
+            known_ids.add(article["id"])
+            max_id = max(max_id, article["id"])
+            added[article["id"]] = article
+        elif event.get("type") in (ARTICLE_SOLD, ARTICLE_UPDATED):
+            article_id = int(event["id"])
+            if article_id in added:
+                added[article_id].update(event["fields"])
+            elif article_id in known_ids:
+                sales.setdefault(article_id, {}).update(event["fields"])
+
+    df = df.copy()
+    if sales:
+        _apply_sales(df, sales)
+
+    if added:
+        attrs = dict(df.attrs)
+        df_added = pd.DataFrame(list(added.values()))
+        df = pd.concat([df, df_added], ignore_index=True) if not df.empty else df_added
+        # On garde la version Drive d'origine (base des écritures concurrentes)
+        df.attrs.update(attrs)
+    return df
+
+
+class StockJournal:
+    """
+    Accès aux fichiers delta d'un dossier Drive.
+
+    La liste des deltas est mise en cache `list_ttl` secondes ; les contenus,
+    immuables, sont gardés en mémoire tant que le delta existe.
+    """
+
+    def __init__(self, folder_id, prefix=DELTA_PREFIX, list_ttl=5.0):
+        self.folder_id = folder_id
+        self.prefix = prefix
+        self.list_ttl = list_ttl
+        self._deltas = {}  # nom -> ID Drive
+        self._contents = {}  # nom -> liste d'événements
+        self._listed_at = None
+        self._lock = threading.RLock()
+
+    def new_delta_name(self):
+        """Nom unique, triable chronologiquement, pour un nouveau delta."""
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        return f"{self.prefix}{stamp}.{uuid.uuid4().hex[:8]}.json"
+
+    def _refresh(self, service):
+        query = (f"'{self.folder_id}' in parents and trashed=false "
+                 f"and name contains '{escape_query_value(self.prefix)}'")
+        deltas, page_token = {}, None
+        while True:
+            results = service.files().list(q=query, fields="nextPageToken, files(id,name)",
+                                           pageSize=1000, pageToken=page_token).execute()
+            for file in results.get("files", []):
+                # `contains` est une recherche par mot : on revérifie le préfixe
+                if file["name"].startswith(self.prefix):
+                    deltas[file["name"]] = file["id"]
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
+        self._deltas = deltas
+        self._contents = {name: events for name, events in self._contents.items() if name in deltas}
+        self._listed_at = time.monotonic()
+
+    def pending(self, service, after=""):
+        """
+        Retourne [(nom_delta, événements)] pour les deltas postérieurs à `after`,
+        dans l'ordre chronologique.
+        """
+        with self._lock:
+            if self._listed_at is None or time.monotonic() - self._listed_at >= self.list_ttl:
+                self._refresh(service)
+            names = sorted(name for name in self._deltas if name > after)
+            result = []
+            for name in names:
+                if name not in self._contents:
+                    data = service.files().get_media(fileId=self._deltas[name]).execute()
+                    self._contents[name] = json.loads(data.decode("utf-8"))
+                result.append((name, self._contents[name]))
+            return result
+
+    def upload(self, service, name, data, file_id=None):
+        """
+        Envoie sur Drive le delta `name` (événements encodés en JSON dans
+        `data`). Avec un `file_id` pré-généré, un renvoi après coupure ne crée
+        pas de doublon.
+        """
+        media = MediaIoBaseUpload(BytesIO(data), mimetype="application/json")
+        file_metadata = {"name": name, "parents": [self.folder_id]}
+        if file_id:
+            file_metadata["id"] = file_id
+        try:
+            file = service.files().create(body=file_metadata, media_body=media, fields="id,name").execute()
+        except HttpError as e:
+            if not file_id or e.resp.status != 409:
+                raise
+            file = {"id": file_id}  # Déjà créé lors d'une tentative précédente
+        with self._lock:
+            self._deltas[name] = file["id"]
+            self._contents[name] = json.loads(data.decode("utf-8"))
+        return file["id"]
+
+    def compaction_point(self, pending, threshold=COMPACT_THRESHOLD, grace=COMPACT_GRACE):
+        """
+        Si assez de deltas sont en attente, retourne le nom du dernier delta à
+        intégrer dans un nouveau snapshot (seulement ceux plus vieux que `grace`
+        secondes), sinon None.
+        """
+        if len(pending) < threshold:
+            return None
+        limit = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=grace)
+        limit_name = f"{self.prefix}{limit.strftime('%Y%m%dT%H%M%S%fZ')}"
+        old_enough = [name for name, _ in pending if name < limit_name]
+        return old_enough[-1] if old_enough else None
+
+    def delete_upto(self, service, upto):
+        """Supprime les deltas déjà intégrés dans un snapshot (nom <= `upto`)."""
+        with self._lock:
+            names = [name for name in self._deltas if name <= upto]
+            for name in names:
+                try:
+                    service.files().delete(fileId=self._deltas[name]).execute()
+                except Exception:
+                    # Déjà supprimé par un autre serveur : le snapshot le couvre de toute façon
+                    pass
+                self._deltas.pop(name, None)
+                self._contents.pop(name, None)
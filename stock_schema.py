@@ -0,0 +1,115 @@
+"""
+Schéma typé du stock et format binaire du snapshot (Parquet).
+
+Le snapshot de référence est `stock.parquet` : types explicites (dates en
+datetime64, tailles / collections / comptes en catégories...), fichier plus
+petit et lecture bien plus rapide que le CSV. `stock.csv` reste écrit à côté,
+uniquement comme export lisible.
+
+Les statistiques du stock (stock_stats.StockStats) sont calculées à l'écriture
+du snapshot et rangées dans ses métadonnées Parquet.
+"""
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from stock_stats import STATS_METADATA_KEY, StockStats
+
+# Colonnes du stock et leur type
+STOCK_SCHEMA = {
+    "id": "Int64",
+    "date_arrivee": "datetime64[ns]",
+    "photo_id": "string",
+    "thumbnail_id": "string",
+    "prix_achat": "float64",
+    "description": "string",
+    "taille": "category",
+    "collection": "category",
+    "estimation": "float64",
+    "prix_vente": "float64",
+    "date_vente": "datetime64[ns]",
+    "compte_vente": "category",
+    "gain_valeur": "float64",
+    "gain_percent": "float64",
+    "gain_apres_impots_valeur": "float64",
+    "gain_apres_impots_percent": "float64",
+}
+
+STOCK_COLUMNS = list(STOCK_SCHEMA)
+
+DATE_COLUMNS = [column for column, dtype in STOCK_SCHEMA.items() if dtype.startswith("datetime")]
+
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+
+
+def empty_stock():
+    """DataFrame de stock vide, déjà typé."""
+    return normalize_stock(pd.DataFrame(columns=STOCK_COLUMNS))
+
+
+def normalize_stock(df):
+    """
+    Applique STOCK_SCHEMA à `df` (colonnes manquantes ajoutées, dates parsées).
+    Ne coûte presque rien si `df` est déjà typé (lecture Parquet).
+    """
+    attrs = dict(df.attrs)
+    df = df.copy()
+    for column, dtype in STOCK_SCHEMA.items():
+        if column not in df.columns:
+            df[column] = pd.Series(index=df.index, dtype=dtype)
+        elif str(df[column].dtype) != dtype:
+            if column in DATE_COLUMNS:
+                df[column] = pd.to_datetime(df[column], errors="coerce", format="mixed").astype(dtype)
+            elif dtype == "Int64":
+                df[column] = pd.to_numeric(df[column], errors="coerce").astype("Int64")
+            elif dtype == "float64":
+                df[column] = pd.to_numeric(df[column], errors="coerce")
+            elif dtype == "category":
+                df[column] = df[column].astype("string").astype("category")
+            else:
+                df[column] = df[column].astype(dtype)
+    # Les colonnes du schéma d'abord, les éventuelles colonnes en plus ensuite
+    df = df[STOCK_COLUMNS + [c for c in df.columns if c not in STOCK_SCHEMA]]
+    df.attrs.update(attrs)
+    return df
+
+
+def stock_to_parquet_bytes(df, stats_json=None):
+    """
+    Sérialise le stock (typé) au format Parquet, avec ses statistiques.
+    `stats_json` : statistiques déjà connues de ce même contenu (celles lues
+    avec le snapshot), sinon recalculées.
+    """
+    df = normalize_stock(df)
+    stats_json = stats_json or StockStats.from_frame(df).to_json()
+    # Les attrs (version Drive lue...) ne concernent que ce processus
+    df.attrs = {}
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[STATS_METADATA_KEY.encode()] = stats_json.encode()
+    buffer = BytesIO()
+    pq.write_table(table.replace_schema_metadata(metadata), buffer)
+    return buffer.getvalue()
+
+
+def read_stock_parquet(source):
+    """
+    Lit un snapshot Parquet (chemin de fichier ou flux) ; les types viennent
+    du fichier. Les statistiques enregistrées avec le snapshot sont placées
+    dans `df.attrs[STATS_METADATA_KEY]`.
+    """
+    metadata = pq.read_schema(source).metadata or {}
+    if hasattr(source, "seek"):
+        source.seek(0)
+    df = pd.read_parquet(source)
+    df.attrs = {}
+    if STATS_METADATA_KEY.encode() in metadata:
+        df.attrs[STATS_METADATA_KEY] = metadata[STATS_METADATA_KEY.encode()].decode()
+    return df
+
+
+def stock_from_parquet_bytes(data):
+    """Lit un snapshot Parquet déjà téléchargé (cf. read_stock_parquet)."""
+    return read_stock_parquet(BytesIO(data))
@@ -0,0 +1,183 @@
+"""
+Statistiques du stock tenues à jour au fil des ajouts / ventes.
+
+La page Statistiques ne recalcule plus tout depuis le DataFrame : les agrégats
+(nombre d'articles, valeur du stock, gain médian, rotation, ventes par
+trimestre et par compte) sont mis à jour à chaque événement du journal, et
+enregistrés dans les métadonnées du snapshot Parquet pour ne pas être
+recalculés au chargement.
+
+Le gain médian est exact : les gains des articles vendus sont gardés dans une
+liste triée (insertion / retrait par dichotomie, médiane lue en O(1)).
+"""
+import bisect
+import json
+
+import pandas as pd
+
+# Clé des métadonnées Parquet du snapshot / de df.attrs contenant les statistiques
+STATS_METADATA_KEY = "stock_stats"
+
+# Colonnes dont dépendent les statistiques
+STATS_COLUMNS = ("prix_achat", "prix_vente", "gain_percent", "date_arrivee", "date_vente", "compte_vente")
+
+
+def _number(value):
+    value = pd.to_numeric(value, errors="coerce")
+    return None if pd.isna(value) else float(value)
+
+
+def _date(value):
+    value = pd.to_datetime(value, errors="coerce", format="mixed") if isinstance(value, str) else value
+    return None if value is None or pd.isna(value) else pd.Timestamp(value)
+
+
+def quarter(date):
+    """Trimestre d'une date, au format « 2024Q3 »."""
+    return f"{date.year}Q{(date.month - 1) // 3 + 1}"
+
+
+class StockStats:
+    """Agrégats du stock, mis à jour article par article (cf. StockStore)."""
+
+    def __init__(self):
+        self.total = 0
+        self.en_stock = 0
+        self.valeur_stock = 0.0
+        self.gains = []  # gain_percent des articles vendus, trié
+        self.rotation_jours = 0
+        self.rotation_ventes = 0
+        self.par_trimestre = {}  # trimestre -> [somme des ventes, nombre de ventes]
+        self.par_trimestre_compte = {}  # (trimestre, compte) -> [somme, nombre]
+
+    @classmethod
+    def from_frame(cls, df):
+        """Calcule les statistiques d'un DataFrame de stock (typé) en une passe."""
+        stats = cls()
+        sold = df["prix_vente"].notna()
+        vendus = df[sold]
+        stats.total = len(df)
+        stats.en_stock = int((~sold).sum())
+        stats.valeur_stock = float(df.loc[~sold, "prix_achat"].sum())
+        stats.gains = sorted(vendus["gain_percent"].dropna().astype(float).tolist())
+
+        jours = (vendus["date_vente"] - vendus["date_arrivee"]).dt.days.dropna()
+        stats.rotation_jours, stats.rotation_ventes = int(jours.sum()), len(jours)
+
+        dates = vendus["date_vente"]
+        trimestres = pd.Series([quarter(d) if pd.notna(d) else None for d in dates],
+                               index=vendus.index, dtype=object)
+        grouped = vendus["prix_vente"].groupby(trimestres).agg(["sum", "count"])
+        stats.par_trimestre = {q: [float(s), int(n)] for q, (s, n) in grouped.iterrows()}
+        grouped = vendus["prix_vente"].groupby([trimestres, vendus["compte_vente"].astype(object)]) \
+            .agg(["sum", "count"])
+        stats.par_trimestre_compte = {(q, str(c)): [float(s), int(n)] for (q, c), (s, n) in grouped.iterrows()}
+        return stats
+
+    # -- Mise à jour ---------------------------------------------------------
+
+    def add(self, article):
+        """Prend en compte un nouvel article (dict colonne -> valeur)."""
+        self.total += 1
+        self._contribute(article, 1)
+
+    def update(self, before, after):
+        """Un article passe de `before` à `after` (dicts des STATS_COLUMNS)."""
+        self._contribute(before, -1)
+        self._contribute(after, 1)
+
+    def _contribute(self, article, sign):
+        prix_vente = _number(article.get("prix_vente"))
+        if prix_vente is None:
+            self.en_stock += sign
+            self.valeur_stock += sign * (_number(article.get("prix_achat")) or 0.0)
+            return
+
+        gain = _number(article.get("gain_percent"))
+        if gain is not None:
+            if sign > 0:
+                bisect.insort(self.gains, gain)
+            else:
+                position = bisect.bisect_left(self.gains, gain)
+                if position < len(self.gains) and self.gains[position] == gain:
+                    del self.gains[position]
+
+        date_vente = _date(article.get("date_vente"))
+        if date_vente is None:
+            return
+        date_arrivee = _date(article.get("date_arrivee"))
+        if date_arrivee is not None:
+            self.rotation_jours += sign * (date_vente - date_arrivee).days
+            self.rotation_ventes += sign
+        keys = [(self.par_trimestre, quarter(date_vente))]
+        compte = article.get("compte_vente")
+        if compte is not None and not pd.isna(compte):
+            keys.append((self.par_trimestre_compte, (quarter(date_vente), str(compte))))
+        for groups, key in keys:
+            total = groups.setdefault(key, [0.0, 0])
+            total[0] += sign * prix_vente
+            total[1] += sign
+            if total[1] <= 0:
+                del groups[key]
+
+    # -- Lecture -------------------------------------------------------------
+
+    def gain_median_percent(self):
+        if not self.gains:
+            return 0.0
+        middle = len(self.gains) // 2
+        if len(self.gains) % 2:
+            return self.gains[middle]
+        return (self.gains[middle - 1] + self.gains[middle]) / 2
+
+    def temps_moyen_rotation(self):
+        return self.rotation_jours / self.rotation_ventes if self.rotation_ventes else 0
+
+    def ventes_par_trimestre(self):
+        return pd.DataFrame([(q, s) for q, (s, _) in sorted(self.par_trimestre.items())],
+                            columns=["trimestre_vente", "prix_vente"])
+
+    def recap_trimestre_compte(self):
+        return pd.DataFrame([(q, c, s) for (q, c), (s, _) in sorted(self.par_trimestre_compte.items())],
+                            columns=["trimestre_vente", "compte_vente", "prix_vente"])
+
+    def summary(self):
+        """Toutes les valeurs affichées par la page Statistiques."""
+        gain_median_percent = self.gain_median_percent()
+        return {
+            "total_articles": self.total,
+            "nb_en_stock": self.en_stock,
+            "gain_median_percent": gain_median_percent,
+            "valeur_stock": self.valeur_stock,
+            # Espérance = (gain_median en %) * valeur du stock / 100
+            "esperance_gain": (gain_median_percent / 100) * self.valeur_stock,
+            "temps_moyen_rotation": self.temps_moyen_rotation(),
+            "ventes_par_trimestre": self.ventes_par_trimestre(),
+            "recap": self.recap_trimestre_compte(),
+        }
+
+    # -- Sérialisation -------------------------------------------------------
+
+    def to_json(self):
+        return json.dumps({
+            "total": self.total,
+            "en_stock": self.en_stock,
+            "valeur_stock": self.valeur_stock,
+            "gains": self.gains,
+            "rotation": [self.rotation_jours, self.rotation_ventes],
+            "par_trimestre": self.par_trimestre,
+            "par_trimestre_compte": [[q, c, s, n] for (q, c), (s, n) in self.par_trimestre_compte.items()],
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        stats = cls()
+        stats.total = data["total"]
+        stats.en_stock = data["en_stock"]
+        stats.valeur_stock = data["valeur_stock"]
+        stats.gains = data["gains"]
+        stats.rotation_jours, stats.rotation_ventes = data["rotation"]
+        stats.par_trimestre = data["par_trimestre"]
+        stats.par_trimestre_compte = {(q, c): [s, n] for q, c, s, n in data["par_trimestre_compte"]}
+        return stats
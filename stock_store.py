@@ -0,0 +1,347 @@
+"""
+Stock en mémoire indexé par ID d'article.
+
+Les pages passent par un StockStore plutôt que de filtrer le DataFrame
+(`df[df["id"] == article_id]` parcourt tout le stock à chaque accès) :
+- recherche / mise à jour d'un article en O(1), via un dictionnaire id -> ligne ;
+- ajouts mis en attente, puis intégrés en une seule concaténation quand le
+  DataFrame complet est demandé (et non une copie du stock par ajout) ;
+- IDs alloués de façon croissante, jamais réutilisés ;
+- index de recherche (stock_index.StockIndex) construit à la première
+  recherche, puis tenu à jour à chaque ajout / vente ;
+- statistiques (stock_stats.StockStats) reprises du snapshot quand il les
+  contient, puis tenues à jour de la même façon ;
+- cube d'analyse (stock_analytics.AnalyticsCube) et modèles d'estimation
+  des prix / délais de vente (stock_estimator.SalesEstimator) recalculés au
+  plus une fois par révision du stock.
+
+Un StockStore est partagé par les sessions du serveur (cf. StockStoreCache) :
+ses méthodes publiques sont protégées par un verrou, et le DataFrame remis aux
+lecteurs est un instantané immuable. Une modification ultérieure ne l'altère
+pas : les colonnes modifiées sont d'abord copiées (copie sur écriture), les
+autres restent partagées avec l'instantané. Ce partage s'arrête au processus :
+chaque processus du serveur a son propre StockStore, et les ventes faites
+dans un autre lui arrivent par le journal Drive.
+
+Le rejeu des événements du journal suit les mêmes règles que
+`stock_journal.apply_events`, dans l'ordre des noms des deltas (celui du
+compactage) : un delta plus ancien que le dernier appliqué, arrivé en retard
+d'un autre serveur, fait rejouer tous les deltas depuis le snapshot (cf.
+StockStoreCache). Tous les lecteurs obtiennent ainsi le même état.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+import stock_journal
+from stock_analytics import AnalyticsCube
+from stock_estimator import SalesEstimator
+from stock_index import StockIndex
+from stock_schema import STOCK_SCHEMA, normalize_stock
+from stock_stats import STATS_COLUMNS, STATS_METADATA_KEY, StockStats
+
+
+def _coerce(column, value):
+    """Convertit `value` au type de `column` dans STOCK_SCHEMA (valeur manquante -> NA du type)."""
+    dtype = STOCK_SCHEMA.get(column)
+    if dtype is None:
+        return value
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return pd.NaT if dtype.startswith("datetime") else (pd.NA if dtype in ("Int64", "string") else np.nan)
+    if dtype.startswith("datetime"):
+        return pd.to_datetime(value, errors="coerce", format="mixed")
+    if dtype == "Int64":
+        return int(value)
+    if dtype == "float64":
+        return pd.to_numeric(value, errors="coerce")
+    return str(value)
+
+
+class StockStore:
+    """
+    Stock (DataFrame typé selon STOCK_SCHEMA) + index id -> position de la ligne.
+    Un article ajouté reçoit tout de suite sa position (la fin du stock), même
+    s'il n'est intégré au DataFrame qu'au prochain `_flush`.
+
+    Si un ID apparaît plusieurs fois dans le snapshot, c'est la première ligne
+    qui est retenue pour les recherches et mises à jour.
+    """
+
+    def __init__(self, df):
+        self._df = normalize_stock(df).reset_index(drop=True)
+        self._positions = {}
+        for position, article_id in enumerate(self._df["id"]):
+            if pd.notna(article_id):
+                self._positions.setdefault(int(article_id), position)
+        self._pending = {}  # id -> article ajouté, pas encore dans le DataFrame
+        self._max_id = max(self._positions, default=0)
+        self._index = None  # construit à la première recherche
+        # Statistiques enregistrées avec le snapshot (sinon calculées à la première lecture)
+        saved_stats = self._df.attrs.get(STATS_METADATA_KEY)
+        self._stats = StockStats.from_json(saved_stats) if saved_stats else None
+        self._applied = set()  # deltas du journal déjà appliqués
+        self._newest = ""  # nom du plus récent d'entre eux
+        self._revision = 0  # incrémenté à chaque modification
+        self._analytics = None  # (révision, AnalyticsCube)
+        self._estimations = None  # (révision, SalesEstimator, espérances du stock)
+        # Copie sur écriture : _df a-t-il été remis à un lecteur, et quelles
+        # colonnes ont été copiées depuis (modifiables sans toucher aux instantanés)
+        self._published = False
+        self._owned = set(self._df.columns)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._df) + len(self._pending)
+
+    def __contains__(self, article_id):
+        if article_id is None or pd.isna(article_id):
+            return False
+        return int(article_id) in self._positions
+
+    # -- Lecture -------------------------------------------------------------
+
+    def frame(self):
+        """
+        Instantané du stock complet : il ne change plus, même après des
+        ventes / ajouts (à ne pas modifier : passer par `update` / `append`).
+        """
+        with self._lock:
+            return self._publish()
+
+    def get(self, article_id):
+        """Ligne de l'article (Series), ou None s'il n'existe pas."""
+        with self._lock:
+            if article_id not in self:
+                return None
+            position = self._positions[int(article_id)]
+            if position >= len(self._df):
+                self._flush()
+            return self._df.iloc[position]
+
+    def lookup(self, article_ids, columns):
+        """
+        Valeurs de `columns` pour chaque ID de `article_ids`, dans le même ordre
+        (ligne vide pour un ID inconnu). Ne parcourt que les IDs demandés.
+        """
+        with self._lock:
+            self._flush()
+            positions = np.array([self._positions.get(int(article_id), -1) if pd.notna(article_id) else -1
+                                  for article_id in article_ids], dtype=np.int64)
+            known = positions >= 0
+            if not known.any():
+                return pd.DataFrame({column: pd.Series([np.nan] * len(positions), dtype=object)
+                                     for column in columns})
+            result = self._df[columns].iloc[np.where(known, positions, 0)].reset_index(drop=True)
+        return result.where(np.repeat(known[:, None], len(columns), axis=1))
+
+    def stats(self):
+        """Valeurs de la page Statistiques (cf. StockStats.summary)."""
+        with self._lock:
+            if self._stats is None:
+                self._flush()
+                self._stats = StockStats.from_frame(self._df)
+            return self._stats.summary()
+
+    def analytics(self):
+        """Cube d'analyse des ventes, recalculé seulement si le stock a changé."""
+        with self._lock:
+            if self._analytics is None or self._analytics[0] != self._revision:
+                self._flush()
+                self._analytics = (self._revision, AnalyticsCube(self._df))
+            return self._analytics[1]
+
+    def estimations(self):
+        """
+        Modèle d'estimation ajusté sur les ventes, et espérances des articles
+        non vendus par collection (cf. SalesEstimator.portfolio), recalculés
+        seulement si le stock a changé.
+        """
+        with self._lock:
+            if self._estimations is None or self._estimations[0] != self._revision:
+                self._flush()
+                estimator = SalesEstimator.fit(self._df)
+                self._estimations = (self._revision, estimator, estimator.portfolio(self._df))
+            return self._estimations[1], self._estimations[2]
+
+    def filter_values(self):
+        """Tailles et collections présentes dans le stock (listes triées)."""
+        with self._lock:
+            index = self._ensure_index()
+            return index.tailles(), index.collections()
+
+    def search(self, taille=None, collection=None, text="", unsold_only=False):
+        """
+        Articles correspondant aux filtres (cf. StockIndex.search), dans
+        l'ordre du stock, sans parcourir tout le DataFrame.
+        """
+        with self._lock:
+            rows = self._ensure_index().search(taille=taille, collection=collection, text=text,
+                                               unsold_only=unsold_only)
+            self._flush()
+            return self._publish() if len(rows) == len(self._df) else self._df.iloc[rows]
+
+    # -- Écriture ------------------------------------------------------------
+
+    def next_id(self):
+        """Prochain ID libre (toujours supérieur à tous les IDs déjà attribués)."""
+        return self._max_id + 1
+
+    def append(self, article):
+        """
+        Ajoute un article (dict colonne -> valeur) et retourne son ID.
+        Un ID absent ou déjà pris est remplacé par le prochain ID libre.
+        """
+        with self._lock:
+            article = dict(article)
+            article_id = article.get("id")
+            if article_id is None or pd.isna(article_id) or article_id in self:
+                article_id = self.next_id()
+            article["id"] = int(article_id)
+            self._max_id = max(self._max_id, article["id"])
+            self._positions[article["id"]] = len(self._df) + len(self._pending)
+            self._pending[article["id"]] = article
+            self._revision += 1
+            if self._index is not None:
+                self._index.add(article)
+            if self._stats is not None:
+                self._stats.add(article)
+            return article["id"]
+
+    def update(self, article_id, fields):
+        """Modifie les champs `fields` de l'article ; retourne False s'il n'existe pas."""
+        with self._lock:
+            if article_id not in self:
+                return False
+            article_id = int(article_id)
+            position = self._positions[article_id]
+            if self._stats is not None:
+                before = self._stats_values(article_id, position)
+            if article_id in self._pending:
+                self._pending[article_id].update(fields)
+            else:
+                for column, value in fields.items():
+                    self._set_cell(position, column, value)
+            self._revision += 1
+            if self._index is not None:
+                self._index.update(position, fields)
+            if self._stats is not None:
+                self._stats.update(before, {**before, **fields})
+            return True
+
+    def apply_events(self, events):
+        """Rejoue les événements du journal (ajouts / ventes / modifications) sur le stock."""
+        with self._lock:
+            for event in events:
+                if event.get("type") == stock_journal.ARTICLE_ADDED:
+                    self.append(event["article"])
+                elif event.get("type") in (stock_journal.ARTICLE_SOLD, stock_journal.ARTICLE_UPDATED):
+                    self.update(event["id"], event["fields"])
+        return self
+
+    def apply_delta(self, name, events):
+        """Applique le delta `name` du journal, sauf s'il l'a déjà été."""
+        with self._lock:
+            if name not in self._applied:
+                self._applied.add(name)
+                self._newest = max(self._newest, name)
+                self.apply_events(events)
+        return self
+
+    def in_order(self, names):
+        """
+        Les deltas `names` pas encore appliqués sont-ils tous plus récents que
+        ceux déjà appliqués (sinon, les appliquer maintenant changerait l'ordre) ?
+        """
+        with self._lock:
+            return all(name > self._newest for name in names if name not in self._applied)
+
+    # -- Interne -------------------------------------------------------------
+
+    def _ensure_index(self):
+        if self._index is None:
+            self._flush()
+            self._index = StockIndex.from_frame(self._df)
+        return self._index
+
+    def _stats_values(self, article_id, position):
+        """Valeurs actuelles des colonnes utilisées par les statistiques."""
+        if article_id in self._pending:
+            article = self._pending[article_id]
+            return {column: article.get(column) for column in STATS_COLUMNS}
+        return {column: self._df.iat[position, self._df.columns.get_loc(column)] for column in STATS_COLUMNS}
+
+    def _publish(self):
+        """DataFrame courant, remis à un lecteur : les prochaines écritures le copieront."""
+        self._flush()
+        self._published = True
+        return self._df
+
+    def _set_cell(self, position, column, value):
+        value = _coerce(column, value)
+        if self._published:
+            # Nouvelle version du DataFrame, qui partage encore toutes ses colonnes
+            self._df = self._df.copy(deep=False)
+            self._published = False
+            self._owned = set()
+        if column in self._df.columns and column not in self._owned:
+            self._df[column] = self._df[column].copy()
+        self._owned.add(column)
+        if column not in self._df.columns:
+            self._df[column] = pd.Series(np.nan, index=self._df.index, dtype=object)
+        dtype = self._df[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            if pd.notna(value) and value not in dtype.categories:
+                self._df[column] = self._df[column].cat.add_categories([value])
+        elif column not in STOCK_SCHEMA and dtype != object:
+            self._df[column] = self._df[column].astype(object)
+        self._df.iat[position, self._df.columns.get_loc(column)] = value
+
+    def _flush(self):
+        """Intègre les articles ajoutés au DataFrame, en une seule concaténation."""
+        if not self._pending:
+            return
+        attrs = dict(self._df.attrs)
+        added = pd.DataFrame(list(self._pending.values()))
+        df = pd.concat([self._df, added], ignore_index=True) if len(self._df) else added
+        self._df = normalize_stock(df)
+        # On garde la version Drive d'origine (base des écritures concurrentes)
+        self._df.attrs.update(attrs)
+        self._pending = {}
+        self._published = False
+        self._owned = set(self._df.columns)
+
+
+class StockStoreCache:
+    """
+    Garde le StockStore du dernier snapshot lu : tant que le snapshot ne change
+    pas, seuls les nouveaux deltas du journal sont appliqués (et l'index de
+    recherche n'est pas reconstruit).
+    """
+
+    def __init__(self):
+        self._key = None
+        self._store = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Le prochain `get` reconstruit le StockStore (deltas à rejouer depuis le snapshot)."""
+        with self._lock:
+            self._store, self._key = None, None
+
+    def get(self, key, df_snapshot, pending=()):
+        """
+        StockStore du snapshot identifié par `key` (version Drive), à jour des
+        deltas `pending` ([(nom, événements)]), appliqués dans l'ordre de leurs
+        noms. Si l'un d'eux est plus ancien qu'un delta déjà appliqué, le
+        StockStore est reconstruit depuis le snapshot.
+        """
+        pending = sorted(pending, key=lambda delta: delta[0])
+        with self._lock:
+            if (self._store is None or self._key != key
+                    or not self._store.in_order([name for name, _ in pending])):
+                self._store, self._key = StockStore(df_snapshot), key
+            store = self._store
+        for name, events in pending:
+            store.apply_delta(name, events)
+        return store
@@ -0,0 +1,303 @@
+"""
+Synchronisation en arrière-plan entre la copie locale du stock (local_store)
+et Drive (snapshot stock.parquet + journal de deltas).
+
+- Lecture : `stock()` construit le StockStore à partir de la base locale,
+  sans aucun appel à Drive ; seul le tout premier chargement (aucune copie
+  locale) attend Drive.
+- Écriture : `record()` enregistre le delta dans la base locale et rend la
+  main ; le thread de synchronisation l'envoie sur Drive dès que possible.
+- Un thread unique, réveillé par chaque écriture et toutes les
+  SYNC_INTERVAL secondes tant que l'application est utilisée, tire la
+  version Drive (nouveau snapshot, deltas des autres serveurs), envoie les
+  deltas locaux puis compacte le journal. Si Drive est injoignable, il
+  réessaie avec des délais croissants ; les pages continuent de lire et
+  d'écrire la copie locale.
+
+Conflits détectés en tirant les deltas des autres serveurs :
+- `vente_concurrente` : un même article vendu ici et ailleurs avec des
+  valeurs différentes (la dernière vente dans l'ordre du journal l'emporte) ;
+- `id_en_double` : un article ajouté ici et ailleurs sous le même ID (le
+  second ajout rejoué reçoit un nouvel ID, cf. StockStore.append) ;
+- `delta_renomme` : un delta écrit hors ligne, plus ancien que le dernier
+  compactage fait par un autre serveur, renvoyé sous un nouveau nom pour
+  ne pas être ignoré (il est alors rejoué après les deltas compactés).
+"""
+import json
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+import instrumentation
+import stock_journal
+from stock_cache import DRIVE_VERSION_ATTR, parse_bytes, version_key
+from stock_schema import normalize_stock, stock_to_parquet_bytes
+from stock_stats import STATS_METADATA_KEY
+from stock_store import StockStoreCache
+from upload_queue import retry_delay
+
+# Délai (secondes) entre deux synchronisations tant que l'application est utilisée
+SYNC_INTERVAL = 10.0
+
+# Sans lecture du stock depuis ce délai (secondes), on ne tire plus Drive
+# (les deltas locaux en attente sont toujours envoyés)
+IDLE_AFTER = 600.0
+
+# Délai maximum (secondes) entre deux tentatives quand Drive est injoignable
+RETRY_MAX_DELAY = 300.0
+
+# Nom (et donc format) sous lequel le snapshot est conservé dans la base locale
+_SNAPSHOT_FORMAT = "snapshot.parquet"
+
+# Champs d'une vente comparés pour détecter une vente concurrente
+_SALE_FIELDS = ("prix_vente", "date_vente", "compte_vente")
+
+
+def _sales_and_additions(deltas):
+    """
+    Ventes ({id: (delta, champs)}) et ajouts ({id: (delta, article)}) des deltas
+    `deltas`. Les modifications (ARTICLE_UPDATED, ex. renommage d'un compte) ne
+    sont pas des ventes : elles ne comptent pas dans les conflits de vente.
+    """
+    sales, additions = {}, {}
+    for name, events in deltas:
+        for event in events:
+            if event.get("type") == stock_journal.ARTICLE_SOLD:
+                sales[str(event.get("id"))] = (name, event.get("fields") or {})
+            elif event.get("type") == stock_journal.ARTICLE_ADDED:
+                article = event.get("article") or {}
+                additions[str(article.get("id"))] = (name, article)
+    return sales, additions
+
+
+def _concurrent(remote_name, synced_at):
+    """
+    Le delta distant `remote_name` a-t-il été écrit sans connaître le delta
+    local arrivé sur Drive à `synced_at` (None : pas encore envoyé) ?
+    """
+    written_at = stock_journal.delta_time(remote_name)
+    return synced_at is None or written_at is None or written_at < synced_at
+
+
+class StockSync:
+    """
+    Copie locale du stock synchronisée avec Drive.
+
+    - `local` : LocalStore ;
+    - `journal` : StockJournal (deltas sur Drive) ;
+    - `load_snapshot(service)` : snapshot Drive -> (DataFrame, dernier delta
+      intégré), en levant une exception si Drive est injoignable ;
+    - `compact(service)` : compactage du journal sur Drive ;
+    - `take_file_id(service)` : ID Drive pré-généré pour un nouveau delta ;
+    - `service_factory` : client Drive du thread de synchronisation ;
+    - `background` : faux pour ne synchroniser qu'à la demande (`sync`).
+    """
+
+    def __init__(self, local, journal, load_snapshot, compact, take_file_id, service_factory,
+                 store_cache=None, interval=SYNC_INTERVAL, background=True):
+        self.local = local
+        self.journal = journal
+        self._load_snapshot = load_snapshot
+        self._compact = compact
+        self._take_file_id = take_file_id
+        self._service_factory = service_factory
+        self.store_cache = store_cache if store_cache is not None else StockStoreCache()
+        self.interval = interval
+        self.background = background
+        self._snapshot = None  # (clé, DataFrame) du snapshot local déjà lu
+        self._events = {}  # nom -> événements des deltas déjà lus dans la base
+        self._sync_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active_until = 0.0
+        self._thread = None
+
+    # -- Lecture / écriture (pages) ------------------------------------------
+
+    def stock(self, service):
+        """
+        StockStore à jour de la copie locale (snapshot + deltas, y compris les
+        modifications locales pas encore envoyées). Au tout premier chargement,
+        la copie locale est d'abord tirée de Drive (exception si injoignable).
+        """
+        self._active_until = time.monotonic() + IDLE_AFTER
+        self.start()
+        info = self.local.snapshot_info()
+        if info is None:
+            self.sync(service)
+            info = self.local.snapshot_info()
+        key = (version_key(info.meta), info.upto)
+        with self._read_lock:
+            if self._snapshot is None or self._snapshot[0] != key:
+                with instrumentation.timed("local_store.snapshot"):
+                    df = normalize_stock(parse_bytes(_SNAPSHOT_FORMAT, self.local.snapshot_data()))
+                df.attrs[DRIVE_VERSION_ATTR] = dict(info.meta)
+                self._snapshot = (key, df)
+            df = self._snapshot[1]
+            names = self.local.delta_names(after=info.upto)
+            missing = [name for name in names if name not in self._events]
+            if missing:
+                self._events.update(self.local.delta_events(missing))
+            self._events = {name: self._events[name] for name in names if name in self._events}
+            deltas = list(self._events.items())
+        return self.store_cache.get(key, df, deltas)
+
+    def record(self, events):
+        """
+        Enregistre `events` dans un nouveau delta local et demande son envoi.
+        Retourne le nom du delta (à appliquer au StockStore courant).
+        """
+        name = self.journal.new_delta_name()
+        self.local.add_local_delta(name, events)
+        self.request()
+        return name
+
+    def status(self):
+        """État de la synchronisation (cf. LocalStore.status)."""
+        return self.local.status()
+
+    # -- Synchronisation -----------------------------------------------------
+
+    def start(self):
+        """Lance le thread de synchronisation (une seule fois)."""
+        if not self.background or self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stock-sync", daemon=True)
+                self._thread.start()
+
+    def request(self):
+        """Demande une synchronisation au plus tôt."""
+        self._active_until = max(self._active_until, time.monotonic() + IDLE_AFTER)
+        self.start()
+        self._wake.set()
+
+    def sync(self, service):
+        """
+        Une synchronisation complète : tire la version Drive, envoie les deltas
+        locaux, puis compacte le journal si des deltas ont été envoyés.
+        L'échec est enregistré (affiché dans l'application) puis relancé.
+        """
+        with self._sync_lock:
+            try:
+                with instrumentation.timed("sync.pull"):
+                    self._pull(service)
+                with instrumentation.timed("sync.push"):
+                    pushed = self._push(service)
+            except Exception as e:
+                self.local.record_failure(f"{type(e).__name__}: {e}")
+                raise
+            self.local.record_success()
+        if pushed:
+            try:
+                self._compact(service)
+            except Exception:
+                # Le compactage est une optimisation : il sera retenté au prochain envoi
+                pass
+
+    def _run(self):
+        service = None
+        failures = 0
+        while True:
+            delay = retry_delay(failures, self.interval, RETRY_MAX_DELAY) if failures else self.interval
+            self._wake.wait(delay)
+            self._wake.clear()
+            if time.monotonic() >= self._active_until and not self.local.has_unsynced():
+                continue  # Personne ne lit le stock et rien à envoyer
+            try:
+                if service is None:
+                    service = self._service_factory()
+                self.sync(service)
+                failures = 0
+            except Exception:
+                failures += 1
+
+    def _pull(self, service):
+        """Copie dans la base locale le snapshot Drive (s'il a changé) et les nouveaux deltas."""
+        df, upto = self._load_snapshot(service)
+        meta = df.attrs.get(DRIVE_VERSION_ATTR) or {}
+        info = self.local.snapshot_info()
+        if info is None or version_key(info.meta) != version_key(meta) or info.upto != upto:
+            # Contenu tel que lu sur Drive : ses statistiques enregistrées restent valables
+            with instrumentation.timed("local_store.save_snapshot"):
+                self.local.save_snapshot(meta, upto, stock_to_parquet_bytes(df, df.attrs.get(STATS_METADATA_KEY)))
+            with self._read_lock:
+                self._snapshot = ((version_key(meta), upto), df)
+        remote = self.local.add_remote_deltas(self.journal.pending(service, after=upto))
+        if remote:
+            self._detect_conflicts(remote)
+        self.local.prune(upto)
+
+    def _push(self, service):
+        """Envoie les deltas locaux en attente ; retourne leur nombre."""
+        info = self.local.snapshot_info()
+        upto = info.upto if info is not None else ""
+        pushed = 0
+        for name, events, file_id in self.local.unsynced():
+            if name <= upto:
+                if file_id and self._exists(service, file_id):
+                    # Envoyé avant la coupure (sans que la base l'ait noté) : déjà compacté
+                    self.local.mark_synced(name)
+                    continue
+                # Plus ancien que le compactage fait ailleurs : il serait ignoré
+                new_name = self.journal.new_delta_name()
+                self.local.rename_delta(name, new_name)
+                self.local.add_conflict("delta_renomme", {"delta": name, "nouveau_nom": new_name,
+                                                          "evenements": len(events)})
+                # Le StockStore courant l'a appliqué sous son ancien nom : reconstruit
+                self.store_cache.invalidate()
+                name, file_id = new_name, None
+            if not file_id:
+                file_id = self._take_file_id(service)
+                self.local.set_file_id(name, file_id)
+            data = json.dumps(events, ensure_ascii=False).encode("utf-8")
+            self.journal.upload(service, name, data, file_id=file_id)
+            self.local.mark_synced(name)
+            pushed += 1
+        return pushed
+
+    @staticmethod
+    def _exists(service, file_id):
+        try:
+            service.files().get(fileId=file_id, fields="id").execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                return False
+            raise
+        return True
+
+    def _detect_conflicts(self, remote):
+        """
+        Compare les deltas `remote` écrits ailleurs aux deltas locaux encore
+        connus. Seules les écritures concurrentes comptent : une vente corrigée
+        ailleurs après avoir vu la nôtre n'est pas un conflit.
+        """
+        local = self.local.local_deltas()
+        if not local:
+            return
+        synced_at = {name: synced for name, _, synced in local}
+        local_sales, local_additions = _sales_and_additions((name, events) for name, events, _ in local)
+        remote_sales, remote_additions = _sales_and_additions(remote)
+        for article_id, (name, fields) in remote_sales.items():
+            if article_id not in local_sales:
+                continue
+            local_name, local_fields = local_sales[article_id]
+            if not _concurrent(name, synced_at[local_name]):
+                continue
+            differences = {field: {"ici": local_fields.get(field), "ailleurs": fields.get(field)}
+                           for field in _SALE_FIELDS if local_fields.get(field) != fields.get(field)}
+            if differences:
+                self.local.add_conflict("vente_concurrente", {
+                    "article": article_id, "retenue": "ailleurs" if name > local_name else "ici",
+                    "differences": differences})
+        for article_id, (name, article) in remote_additions.items():
+            if article_id not in local_additions:
+                continue
+            local_name, local_article = local_additions[article_id]
+            if _concurrent(name, synced_at[local_name]):
+                self.local.add_conflict("id_en_double", {
+                    "article": article_id,
+                    "ici": local_article.get("description"), "ailleurs": article.get("description")})
@@ -0,0 +1,60 @@
+"""
+Outils communs des tests : faux Drive (fake_drive.py) et écriture d'un
+« autre serveur » intercalée juste avant la nôtre.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_drive import FakeDriveService, FakeFiles  # noqa: E402
+from stock_cache import StockCache  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """Module app, importé avec des secrets de test (aucun appel à Google)."""
+    import streamlit.config
+
+    secrets = tmp_path_factory.mktemp("streamlit") / "secrets.toml"
+    secrets.write_text('[auth]\nallowed_emails = ["vendeur@example.com"]\n[gcp_service_account]\n')
+    streamlit.config.set_option("secrets.files", [str(secrets)])
+    import app
+    return app
+
+
+@pytest.fixture
+def drive():
+    return FakeDriveService()
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    """Fabrique de caches indépendants (un par « serveur »), toujours revalidés."""
+    counter = iter(range(1000))
+    return lambda: StockCache(cache_dir=str(tmp_path / f"cache{next(counter)}"), revalidate_after=0)
+
+
+@pytest.fixture
+def interleave(monkeypatch):
+    """
+    `interleave(drive, file_id, *contents)` : avant chacune de nos prochaines
+    mises à jour de `file_id`, un autre écrivain y écrit le contenu suivant de
+    `contents` (donc après notre vérification de version, avant notre écriture).
+    """
+    original = FakeFiles.update
+
+    def arm(drive, file_id, *contents):
+        pending = list(contents)
+
+        def update(self, fileId, *args, **kwargs):
+            if fileId == file_id and pending:
+                with drive.lock:
+                    drive.write_content(drive.lookup(file_id), pending.pop(0))
+            return original(self, fileId, *args, **kwargs)
+
+        monkeypatch.setattr(FakeFiles, "update", update)
+
+    return arm
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from stock_store import StockStore
+
+COMPTES = ["vestiaire coco", "vestiaire pro"]
+
+
+@pytest.fixture
+def stock():
+    return StockStore(pd.DataFrame({
+        "id": [1, 2, 3],
+        "description": ["robe", "veste", "sac"],
+        "prix_achat": [10.0, 20.0, 5.0],
+        "prix_vente": [None, None, 12.0],
+    }))
+
+
+def _lot(*rows):
+    return pd.DataFrame(rows, columns=["id", "prix_vente", "date_vente", "compte_vente"])
+
+
+def test_valid_lot_gets_its_gains(app, stock):
+    ventes, errors = app.validate_bulk_sales(
+        _lot((1, 25.0, "2026-01-02", "vestiaire coco"), ("2", "30", "25/01/2026", " vestiaire pro ")), stock, COMPTES)
+    assert errors == []
+    assert ventes["gain_valeur"].tolist() == [15.0, 10.0]
+    assert ventes["description"].tolist() == ["robe", "veste"]
+    assert ventes["compte_vente"].tolist() == COMPTES
+
+
+def test_each_invalid_line_is_reported(app, stock):
+    _, errors = app.validate_bulk_sales(_lot(
+        ("3.5", 25.0, "2026-01-02", "vestiaire coco"),
+        ("abc", 25.0, "2026-01-02", "vestiaire coco"),
+        (9, 25.0, "2026-01-02", "vestiaire coco"),
+        (3, 25.0, "2026-01-02", "vestiaire coco"),
+        (1, -1.0, "pas une date", "inconnu"),
+    ), stock, COMPTES)
+    assert errors == [
+        "Ligne 1 (sans ID) : ID manquant ou invalide",
+        "Ligne 2 (sans ID) : ID manquant ou invalide",
+        "Ligne 3 (article 9) : article introuvable",
+        "Ligne 4 (article 3) : article déjà vendu",
+        "Ligne 5 (article 1) : prix de vente invalide",
+        "Ligne 5 (article 1) : date de vente invalide",
+        "Ligne 5 (article 1) : compte de vente inconnu",
+    ]
+
+
+def test_duplicate_article_is_reported(app, stock):
+    _, errors = app.validate_bulk_sales(
+        _lot((1, 25.0, "2026-01-02", "vestiaire coco"), (1, 26.0, "2026-01-03", "vestiaire coco")), stock, COMPTES)
+    assert errors == ["Ligne 1 (article 1) : article présent plusieurs fois",
+                      "Ligne 2 (article 1) : article présent plusieurs fois"]
+
+
+def test_missing_columns(app, stock):
+    ventes, errors = app.validate_bulk_sales(pd.DataFrame({"id": [1]}), stock, COMPTES)
+    assert ventes is None
+    assert errors == ["Colonnes manquantes : prix_vente, date_vente, compte_vente"]
+
+
+def test_sale_dates_are_iso_or_day_first(app):
+    dates = app.parse_sale_dates(["2026-01-02", "02/01/2026", "25/01/2026", "2026-01-25 10:00", "31/02/2026"])
+    assert dates.tolist()[:4] == [pd.Timestamp("2026-01-02"), pd.Timestamp("2026-01-02"),
+                                  pd.Timestamp("2026-01-25"), pd.Timestamp("2026-01-25 10:00")]
+    assert pd.isna(dates.iloc[4])
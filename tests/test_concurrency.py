@@ -0,0 +1,143 @@
+import threading
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from concurrency import WriteConflict, merge_frames, write_frame_cas
+
+FILENAME = "stock.csv"
+
+
+def _stock(nb_articles=6):
+    return pd.DataFrame({"id": range(1, nb_articles + 1), "prix_achat": 10.0,
+                         "prix_vente": float("nan"), "compte_vente": None})
+
+
+def _csv(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def _on_drive(drive, file_id):
+    return pd.read_csv(BytesIO(drive.read_content(drive.store[file_id])))
+
+
+def _sell(df, ids, account):
+    df = df.copy()
+    mask = df["id"].isin(ids)
+    df["compte_vente"] = df["compte_vente"].astype(object)
+    df.loc[mask, "prix_vente"] = 25.0
+    df.loc[mask, "compte_vente"] = account
+    return df
+
+
+@pytest.fixture
+def stock_file(drive):
+    return drive.add_file(FILENAME, _csv(_stock()))
+
+
+def test_concurrent_sellers_lose_no_sale(drive, make_cache):
+    nb_sellers, nb_articles = 4, 40
+    file_id = drive.add_file(FILENAME, _csv(_stock(nb_articles)))
+    barrier = threading.Barrier(nb_sellers)
+    errors = []
+
+    def seller(n):
+        try:
+            cache = make_cache()
+            df = cache.get(drive, FILENAME, file_id)
+            ids = [i for i in range(1, nb_articles + 1) if i % nb_sellers == n]
+            df = _sell(df, ids, f"vestiaire {n}")
+            barrier.wait()
+            write_frame_cas(drive, cache, FILENAME, file_id, df)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=seller, args=(n,)) for n in range(nb_sellers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    final = _on_drive(drive, file_id)
+    assert final["prix_vente"].notna().all()
+    assert sorted(final["id"]) == list(range(1, nb_articles + 1))
+
+
+def test_conflict_before_write_without_merge(drive, make_cache, stock_file):
+    cache = make_cache()
+    df = cache.get(drive, FILENAME, stock_file)
+    theirs = _sell(_stock(), [1], "ailleurs")
+    drive.write_content(drive.lookup(stock_file), _csv(theirs))
+
+    with pytest.raises(WriteConflict) as excinfo:
+        write_frame_cas(drive, cache, FILENAME, stock_file, _sell(df, [2], "ici"), merge=False)
+    assert not excinfo.value.written
+    assert drive.calls["update"] == 0
+    final = _on_drive(drive, stock_file).set_index("id")
+    assert final.loc[1, "compte_vente"] == "ailleurs"
+    assert pd.isna(final.loc[2, "compte_vente"])
+
+
+def test_interleaved_write_without_merge(drive, make_cache, stock_file, interleave):
+    cache = make_cache()
+    df = cache.get(drive, FILENAME, stock_file)
+    interleave(drive, stock_file, _csv(_sell(_stock(), [1], "ailleurs")))
+
+    with pytest.raises(WriteConflict) as excinfo:
+        write_frame_cas(drive, cache, FILENAME, stock_file, _sell(df, [2], "ici"), merge=False)
+    # Notre version est sur Drive : la vente écrite ailleurs a été écrasée
+    assert excinfo.value.written
+    final = _on_drive(drive, stock_file).set_index("id")
+    assert final.loc[2, "compte_vente"] == "ici"
+    assert pd.isna(final.loc[1, "compte_vente"])
+
+
+def test_interleaved_write_is_merged(drive, make_cache, stock_file, interleave):
+    cache = make_cache()
+    df = cache.get(drive, FILENAME, stock_file)
+    interleave(drive, stock_file, _csv(_sell(_stock(), [1], "ailleurs")))
+
+    meta = write_frame_cas(drive, cache, FILENAME, stock_file, _sell(df, [2], "ici"))
+    final = _on_drive(drive, stock_file).set_index("id")
+    assert final.loc[1, "compte_vente"] == "ailleurs"
+    assert final.loc[2, "compte_vente"] == "ici"
+    # Réécriture fusionnée par-dessus notre première écriture
+    assert drive.calls["update"] == 2
+    assert meta["headRevisionId"] == drive.lookup(stock_file)["headRevisionId"]
+
+
+def test_too_many_conflicts(drive, make_cache, stock_file, interleave):
+    cache = make_cache()
+    df = cache.get(drive, FILENAME, stock_file)
+    # Un autre écrivain passe avant chacune de nos écritures
+    interleave(drive, stock_file, *[_csv(_sell(_stock(), [1], f"ailleurs {n}")) for n in range(3)])
+
+    with pytest.raises(WriteConflict) as excinfo:
+        write_frame_cas(drive, cache, FILENAME, stock_file, _sell(df, [2], "ici"), max_attempts=3)
+    assert excinfo.value.written
+    assert drive.calls["update"] == 3
+
+
+def test_merge_renumbers_colliding_ids():
+    base = _stock(2)
+    ours = pd.concat([base, pd.DataFrame({"id": [3], "prix_achat": [5.0], "description": ["ici"]})],
+                     ignore_index=True)
+    theirs = pd.concat([base, pd.DataFrame({"id": [3], "prix_achat": [7.0], "description": ["ailleurs"]})],
+                       ignore_index=True)
+
+    merged = merge_frames(base, ours, theirs).set_index("id")
+    assert sorted(merged.index) == [1, 2, 3, 4]
+    assert merged.loc[3, "description"] == "ailleurs"
+    assert merged.loc[4, "description"] == "ici"
+
+
+def test_merge_keeps_text_key_once():
+    base = pd.DataFrame({"compte": ["a"], "actif": [True]})
+    ours = pd.DataFrame({"compte": ["a", "b"], "actif": [True, True]})
+    theirs = pd.DataFrame({"compte": ["a", "b"], "actif": [True, False]})
+
+    merged = merge_frames(base, ours, theirs, key="compte")
+    assert merged["compte"].tolist() == ["a", "b"]
+    assert merged["actif"].tolist() == [True, False]
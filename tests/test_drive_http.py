@@ -0,0 +1,144 @@
+import json
+
+import pytest
+import requests
+
+import drive_http
+from drive_http import DriveTransport, is_replayable
+
+
+class _Response:
+    def __init__(self, status, content=b"{}", headers=None):
+        self.status_code = status
+        self.content = content
+        self.headers = headers or {}
+
+
+class _Session:
+    """Session `requests` simulée : rejoue les réponses (ou exceptions) prévues, dans l'ordre."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, uri, data=None, headers=None, timeout=None):
+        self.calls.append((method, uri, headers))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def close(self):
+        pass
+
+
+class _Credentials:
+    token, expired, expiry = "jeton", False, None
+
+    def __init__(self):
+        self.refreshes = 0
+
+    def apply(self, headers):
+        headers["authorization"] = f"Bearer {self.token}"
+
+    def refresh(self, request):
+        self.refreshes += 1
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(drive_http.time, "sleep", delays.append)
+    return delays
+
+
+def _transport(*outcomes, **kwargs):
+    session = _Session(*outcomes)
+    return DriveTransport(_Credentials(), session=session, **kwargs), session
+
+
+def _rate_limited():
+    return _Response(403, json.dumps({"error": {"errors": [{"reason": "rateLimitExceeded"}]}}).encode())
+
+
+def test_server_errors_are_retried_with_backoff(sleeps):
+    transport, session = _transport(_Response(503), _Response(500), _Response(200, b"ok"))
+    response, content = transport.request("https://drive/files/1", "GET")
+    assert (response.status, content) == (200, b"ok")
+    assert len(session.calls) == 3
+    # Attente aléatoire, plafonnée par tentative
+    assert 0 <= sleeps[0] <= drive_http.BACKOFF_BASE and 0 <= sleeps[1] <= 2 * drive_http.BACKOFF_BASE
+
+
+def test_retry_after_is_honoured(sleeps):
+    transport, _ = _transport(_Response(429, headers={"Retry-After": "3"}), _Response(200))
+    assert transport.request("https://drive/files/1", "GET")[0].status == 200
+    assert sleeps == [3.0]
+
+
+def test_rate_limited_403_is_retried_but_not_a_refusal(sleeps):
+    transport, session = _transport(_rate_limited(), _Response(200))
+    assert transport.request("https://drive/files/1", "GET")[0].status == 200
+    transport, session = _transport(_Response(403, b'{"error": {"errors": [{"reason": "forbidden"}]}}'))
+    assert transport.request("https://drive/files/1", "GET")[0].status == 403
+    assert len(session.calls) == 1
+
+
+def test_gives_up_after_max_retries_or_deadline(sleeps):
+    transport, session = _transport(*[_Response(503)] * 3, max_retries=2)
+    assert transport.request("https://drive/files/1", "GET")[0].status == 503
+    assert len(session.calls) == 3
+    del sleeps[:]
+
+    # Retry-After au-delà de la durée maximum de l'appel : pas d'attente inutile
+    transport, session = _transport(_Response(429, headers={"Retry-After": "500"}), deadline=120)
+    assert transport.request("https://drive/files/1", "GET")[0].status == 429
+    assert sleeps == []
+
+
+def test_connection_errors_are_retried_then_raised(sleeps):
+    transport, session = _transport(requests.ConnectionError("coupure"), _Response(200))
+    assert transport.request("https://drive/files/1", "GET")[0].status == 200
+    transport, _ = _transport(*[requests.Timeout("lent")] * 2, max_retries=1)
+    with pytest.raises(requests.Timeout):
+        transport.request("https://drive/files/1", "GET")
+
+
+def test_create_without_id_is_never_replayed(sleeps):
+    body = json.dumps({"name": "stock.csv", "parents": ["dossier"]})
+    headers = {"content-type": "application/json"}
+    transport, session = _transport(_Response(503))
+    assert transport.request("https://drive/files", "POST", body=body, headers=headers)[0].status == 503
+    transport, _ = _transport(requests.ConnectionError("coupure"))
+    with pytest.raises(requests.ConnectionError):
+        transport.request("https://drive/files", "POST", body=body, headers=headers)
+    assert sleeps == []
+
+
+def test_create_with_pregenerated_id_is_replayed(sleeps):
+    headers = {"content-type": 'multipart/related; boundary="==b=="'}
+    body = (b'--==b==\nContent-Type: application/json\n\n{"id": "gen1", "name": "photo.jpg"}\n'
+            b'--==b==\nContent-Type: image/jpeg\n\n\xff\xd8\n--==b==--\n')
+    transport, session = _transport(_Response(502), _Response(200))
+    assert transport.request("https://drive/upload/files?uploadType=multipart", "POST",
+                             body=body, headers=headers)[0].status == 200
+    assert len(session.calls) == 2
+
+
+def test_replayable_requests():
+    assert is_replayable("GET", "https://drive/files/1")
+    assert is_replayable("PATCH", "https://drive/upload/files/1?uploadType=multipart")
+    assert is_replayable("POST", "https://drive/upload/files?uploadType=resumable", '{"name": "a"}')
+    assert is_replayable("POST", "https://drive/files", '{"id": "gen1"}', {"content-type": "application/json"})
+    assert not is_replayable("POST", "https://drive/files", '{"name": "a"}', {"content-type": "application/json"})
+    # Un "id" dans le contenu du fichier n'est pas un ID pré-généré
+    headers = {"content-type": 'multipart/related; boundary="==b=="'}
+    body = b'--==b==\n\n{"name": "a.json"}\n--==b==\n\n{"id": "x"}\n--==b==--\n'
+    assert not is_replayable("POST", "https://drive/upload/files?uploadType=multipart", body, headers)
+
+
+def test_expired_token_is_refreshed_once(sleeps):
+    transport, session = _transport(_Response(401), _Response(401))
+    assert transport.request("https://drive/files/1", "GET")[0].status == 401
+    assert transport.credentials.refreshes == 1
+    assert len(session.calls) == 2
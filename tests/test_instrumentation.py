@@ -0,0 +1,30 @@
+import instrumentation
+
+
+def test_history_is_kept_per_session(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, "LOG_PATH", str(tmp_path / "timings.jsonl"))
+    monkeypatch.setattr(instrumentation, "_history", type(instrumentation._history)())
+    monkeypatch.setattr(instrumentation, "_enabled", True)
+
+    for session, label in (("a", "Accueil"), ("b", "Stock"), ("a", "Ventes")):
+        run = instrumentation.start_run(label, session=session)
+        with instrumentation.timed("drive.get"):
+            pass
+        instrumentation.end_run(run)
+
+    assert [e["label"] for e in instrumentation.history("a")] == ["Ventes", "Accueil"]
+    assert [e["label"] for e in instrumentation.history("b")] == ["Stock"]
+    assert instrumentation.history("c") == []
+
+
+def test_oldest_sessions_are_forgotten(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, "LOG_PATH", str(tmp_path / "timings.jsonl"))
+    monkeypatch.setattr(instrumentation, "_history", type(instrumentation._history)())
+    monkeypatch.setattr(instrumentation, "_enabled", True)
+    monkeypatch.setattr(instrumentation, "HISTORY_SESSIONS", 2)
+
+    for session in ("a", "b", "c"):
+        instrumentation.end_run(instrumentation.start_run(session=session))
+
+    assert instrumentation.history("a") == []
+    assert len(instrumentation.history("c")) == 1
@@ -0,0 +1,80 @@
+import pytest
+
+from local_store import LocalStore
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStore(str(tmp_path / "stock.sqlite3"))
+
+
+def test_local_delta_is_unsynced_until_marked(local):
+    local.add_local_delta("d2", [{"type": "x"}])
+    assert local.has_unsynced()
+    assert local.unsynced() == [("d2", [{"type": "x"}], None)]
+    local.set_file_id("d2", "gen1")
+    assert local.unsynced() == [("d2", [{"type": "x"}], "gen1")]
+
+    local.mark_synced("d2")
+    assert not local.has_unsynced()
+    assert local.status()["pending"] == 0
+
+
+def test_remote_deltas_are_added_once(local):
+    local.add_local_delta("d2", [])
+    added = local.add_remote_deltas([("d1", [{"n": 1}]), ("d2", [])])
+    # Le delta local retrouvé sur Drive n'est pas « écrit ailleurs », mais il est marqué envoyé
+    assert added == [("d1", [{"n": 1}])]
+    assert not local.has_unsynced()
+    assert local.add_remote_deltas([("d1", [{"n": 1}])]) == []
+
+
+def test_delta_names_after_snapshot(local):
+    local.add_remote_deltas([("d1", []), ("d3", [])])
+    local.add_local_delta("d0", [])  # Pas encore envoyé : toujours appliqué
+    local.save_snapshot({"id": "s"}, "d1", b"data")
+    assert local.delta_names(after="d1") == ["d0", "d3"]
+
+    local.prune("d1")
+    assert local.delta_events(["d1", "d3"]) == {"d3": []}
+
+
+def test_rename_only_unsynced(local):
+    local.add_local_delta("d1", [])
+    local.set_file_id("d1", "gen1")
+    local.rename_delta("d1", "d5")
+    assert local.unsynced() == [("d5", [], None)]
+
+
+def test_survives_restart(tmp_path):
+    path = str(tmp_path / "stock.sqlite3")
+    local = LocalStore(path)
+    local.save_snapshot({"id": "s", "headRevisionId": "r1"}, "d1", b"parquet")
+    local.add_local_delta("d2", [{"type": "x"}])
+
+    reopened = LocalStore(path)
+    info = reopened.snapshot_info()
+    assert (info.meta, info.upto, reopened.snapshot_data()) == ({"id": "s", "headRevisionId": "r1"}, "d1", b"parquet")
+    assert reopened.unsynced() == [("d2", [{"type": "x"}], None)]
+
+
+def test_status_tracks_failures_and_conflicts(local):
+    local.record_failure("OSError: hors ligne")
+    first = local.status()["failing_since"]
+    local.record_failure("OSError: toujours hors ligne")
+    status = local.status()
+    assert status["failing_since"] == first
+    assert status["last_error"] == "OSError: toujours hors ligne"
+
+    local.record_success()
+    status = local.status()
+    assert status["failing_since"] is None and status["last_success"] is not None
+
+    local.add_conflict("vente_concurrente", {"article": "1"})
+    local.add_conflict("id_en_double", {"article": "3"})
+    conflicts = local.conflicts()
+    assert [c["kind"] for c in conflicts] == ["id_en_double", "vente_concurrente"]
+    local.mark_conflicts_seen([conflicts[0]["id"]])
+    assert [c["kind"] for c in local.conflicts()] == ["vente_concurrente"]
+    local.mark_conflicts_seen()
+    assert local.conflicts() == []
@@ -0,0 +1,57 @@
+from io import BytesIO
+
+from PIL import Image
+
+import photo_upload
+from photo_upload import encode_photo, prepare_photo
+
+ORIENTATION = 0x0112
+
+
+def _photo(size, fmt="JPEG", mode="RGB", orientation=None):
+    image = Image.new(mode, size, "red")
+    output = BytesIO()
+    if orientation is None:
+        image.save(output, format=fmt)
+    else:
+        exif = Image.Exif()
+        exif[ORIENTATION] = orientation
+        image.save(output, format=fmt, exif=exif)
+    return output.getvalue()
+
+
+def _opened(data):
+    with Image.open(BytesIO(data)) as image:
+        return image.format, image.size, image.getexif().get(ORIENTATION)
+
+
+def test_large_photo_is_downscaled_keeping_its_ratio():
+    data, fmt = encode_photo(_photo((4000, 3000)), max_dimension=1600)
+    assert _opened(data)[:2] == (fmt, (1600, 1200))
+    # Plus petite que la limite : jamais agrandie
+    data, _ = encode_photo(_photo((800, 600)), max_dimension=1600)
+    assert _opened(data)[1] == (800, 600)
+
+
+def test_exif_orientation_is_applied_to_the_pixels():
+    # Orientation 6 : photo prise téléphone tourné, à afficher pivotée de 90°
+    data, _ = encode_photo(_photo((400, 200), orientation=6), max_dimension=1600)
+    _, size, orientation = _opened(data)
+    assert size == (200, 400)
+    assert orientation in (None, 1)
+
+
+def test_transparent_png_is_encoded_without_alpha(monkeypatch):
+    monkeypatch.setattr(photo_upload.features, "check", lambda feature: False)
+    data, fmt = encode_photo(_photo((300, 300), fmt="PNG", mode="RGBA"))
+    assert fmt == "JPEG" and _opened(data)[0] == "JPEG"
+
+
+def test_prepared_photo_has_a_unique_name_and_a_grid_thumbnail():
+    first = prepare_photo("../Mes photos/Robe été.HEIC", _photo((2000, 1000)), thumbnail_size=300)
+    second = prepare_photo("../Mes photos/Robe été.HEIC", _photo((2000, 1000)), thumbnail_size=300)
+    assert first.name != second.name
+    assert first.name.startswith("Robe_t_") and "/" not in first.name
+    assert first.thumbnail_name == first.name.rsplit(".", 1)[0] + "_300.jpg"
+    assert first.mimetype == {"webp": "image/webp", "jpg": "image/jpeg"}[first.name.rsplit(".", 1)[1]]
+    assert _opened(first.thumbnail)[:2] == ("JPEG", (300, 150))
@@ -0,0 +1,89 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from concurrency import write_frame_cas
+from sales_accounts import NOT_WRITTEN, OVERWRITTEN, WRITTEN, SalesAccountRegistry
+from stock_cache import DRIVE_VERSION_ATTR
+
+FILENAME = "comptes_de_vente.csv"
+
+
+def _csv(comptes):
+    return pd.DataFrame({"compte": comptes, "actif": True}).to_csv(index=False).encode("utf-8")
+
+
+def _on_drive(drive, file_id):
+    return pd.read_csv(BytesIO(drive.read_content(drive.store[file_id])))["compte"].tolist()
+
+
+@pytest.fixture
+def setup(drive, make_cache):
+    """Registre branché sur le faux Drive, comme get_sales_accounts (fusion par compte)."""
+    file_id = drive.add_file(FILENAME, _csv(["a", "b"]))
+    cache = make_cache()
+
+    def save(service, df, merge=True):
+        meta = write_frame_cas(service, cache, FILENAME, file_id, df, merge=merge, key="compte")
+        written = cache.frame_at(FILENAME, meta)
+        written.attrs[DRIVE_VERSION_ATTR] = dict(meta)
+        return written
+
+    def registry(merge=True):
+        return SalesAccountRegistry(load=lambda service: cache.get(service, FILENAME, file_id),
+                                    save=lambda service, df: save(service, df, merge))
+
+    return file_id, registry
+
+
+def test_add_keeps_concurrent_account(drive, setup, interleave):
+    file_id, registry = setup
+    registry = registry()
+    assert registry.accounts(drive) == ["a", "b"]
+    # Un autre serveur ajoute « z_other » entre notre vérification de version et notre écriture
+    interleave(drive, file_id, _csv(["a", "b", "z_other"]))
+
+    assert registry.add(drive, ["c"]) == WRITTEN
+    assert sorted(_on_drive(drive, file_id)) == ["a", "b", "c", "z_other"]
+    assert sorted(registry.accounts(drive)) == ["a", "b", "c", "z_other"]
+
+
+def test_rename_keeps_concurrent_account(drive, setup, interleave):
+    file_id, registry = setup
+    registry = registry()
+    registry.table(drive)
+    interleave(drive, file_id, _csv(["a", "b", "z_other"]))
+
+    assert registry.rename(drive, "a", "a2") == WRITTEN
+    assert sorted(_on_drive(drive, file_id)) == ["a2", "b", "z_other"]
+
+
+def test_same_account_added_concurrently_is_kept_once(drive, setup, interleave):
+    file_id, registry = setup
+    registry = registry()
+    registry.table(drive)
+    interleave(drive, file_id, _csv(["a", "b", "c"]))
+
+    assert registry.add(drive, ["c"]) == WRITTEN
+    assert sorted(_on_drive(drive, file_id)) == ["a", "b", "c"]
+
+
+def test_without_merge_outcomes(drive, setup, interleave):
+    file_id, registry = setup
+    # Écriture concurrente vue avant la nôtre : rien n'est écrit
+    registry_a = registry(merge=False)
+    registry_a.table(drive)
+    drive.write_content(drive.lookup(file_id), _csv(["a", "b", "z_other"]))
+    assert registry_a.add(drive, ["c"]) == NOT_WRITTEN
+    assert sorted(_on_drive(drive, file_id)) == ["a", "b", "z_other"]
+    # Le registre est relu : l'action peut être refaite
+    assert registry_a.add(drive, ["c"]) == WRITTEN
+
+    # Écriture concurrente intercalée : la nôtre l'a écrasée
+    registry_b = registry(merge=False)
+    registry_b.table(drive)
+    interleave(drive, file_id, _csv(["a", "b", "c", "z_other", "y_other"]))
+    assert registry_b.add(drive, ["d"]) == OVERWRITTEN
+    assert "y_other" not in _on_drive(drive, file_id)
+    assert "d" in registry_b.accounts(drive)
@@ -0,0 +1,60 @@
+import threading
+
+import pandas as pd
+
+import stock_cache
+
+
+def _csv(n):
+    return pd.DataFrame({"id": range(n)}).to_csv(index=False).encode("utf-8")
+
+
+def test_slow_download_does_not_block_other_files(drive, make_cache, monkeypatch):
+    slow_id = drive.add_file("lent.csv", _csv(3))
+    fast_id = drive.add_file("rapide.csv", _csv(2))
+    cache = make_cache()
+    started, release = threading.Event(), threading.Event()
+    download = stock_cache.download_media
+
+    def blocking_download(service, file_id, fileobj, **kwargs):
+        if file_id == slow_id:
+            started.set()
+            release.wait(5)
+        return download(service, file_id, fileobj, **kwargs)
+
+    monkeypatch.setattr(stock_cache, "download_media", blocking_download)
+    slow = threading.Thread(target=cache.get, args=(drive, "lent.csv", slow_id))
+    slow.start()
+    try:
+        assert started.wait(5)
+        # Pendant le téléchargement de lent.csv, les autres fichiers restent lisibles
+        sizes = []
+        fast = threading.Thread(target=lambda: sizes.append(len(cache.get(drive, "rapide.csv", fast_id))))
+        fast.start()
+        fast.join(2)
+        assert sizes == [2]
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join()
+    assert len(cache.get(drive, "lent.csv", slow_id)) == 3
+
+
+def test_concurrent_reads_of_a_file_download_it_once(drive, make_cache):
+    file_id = drive.add_file("stock.csv", _csv(5))
+    cache = make_cache()
+    cache.revalidate_after = 60
+    barrier = threading.Barrier(4)
+    sizes = []
+
+    def read():
+        barrier.wait()
+        sizes.append(len(cache.get(drive, "stock.csv", file_id)))
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sizes == [5] * 4
+    assert drive.calls["get"] == 1
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from stock_estimator import SalesEstimator
+
+NOW = pd.Timestamp("2026-06-01")
+
+
+def _stock(sales, unsold):
+    """`sales` : [(collection, prix_achat, prix_vente, jours de vente)], `unsold` : [(collection, prix_achat, ancienneté)]."""
+    rows = [{"collection": collection, "taille": "M", "prix_achat": achat, "prix_vente": vente,
+             "date_arrivee": NOW - pd.Timedelta(days=200), "date_vente": NOW - pd.Timedelta(days=200 - jours)}
+            for collection, achat, vente, jours in sales]
+    rows += [{"collection": collection, "taille": "M", "prix_achat": achat, "prix_vente": np.nan,
+              "date_arrivee": NOW - pd.Timedelta(days=age), "date_vente": pd.NaT}
+             for collection, achat, age in unsold]
+    return pd.DataFrame(rows)
+
+
+def test_expected_price_stays_within_observed_ratios():
+    # Les ventes tardives se sont faites plus cher : la pente est positive
+    sales = [("robes", 10.0, 20.0, 2), ("robes", 10.0, 22.0, 5), ("robes", 10.0, 30.0, 40),
+             ("robes", 10.0, 35.0, 60), ("vestes", 20.0, 30.0, 3), ("vestes", 20.0, 60.0, 50)]
+    # Un article très ancien, un tout récent, et une collection peu vendue (délai attendu long)
+    unsold = [("robes", 50.0, 900), ("robes", 50.0, 0), ("chapeaux", 50.0, 0), ("vestes", 50.0, 2000)]
+    df = _stock(sales, unsold)
+    ratios = [vente / achat for _, achat, vente, _ in sales]
+
+    est = SalesEstimator.fit(df, now=NOW)
+    assert est.fitted
+    prix, _ = est.predict([achat for _, achat, _ in unsold], [c for c, _, _ in unsold], ["M"] * len(unsold),
+                          [age for _, _, age in unsold])
+    expected = prix / 50.0
+    assert np.all(expected >= min(ratios))
+    assert np.all(expected <= max(ratios))
+
+    # Même borne sur la valeur attendue du stock par collection
+    portfolio = est.portfolio(df, now=NOW)
+    assert (portfolio["prix_attendu"] <= portfolio["valeur_achat"] * max(ratios)).all()
+
+
+def test_few_sales_shrink_the_slope():
+    sales = [("robes", 10.0, 15.0, 1), ("robes", 10.0, 40.0, 30)]
+    few = SalesEstimator.fit(_stock(sales, []), now=NOW)
+    many = SalesEstimator.fit(_stock(sales * 10, []), now=NOW)
+    assert 0 < few.slope < many.slope
@@ -0,0 +1,100 @@
+import itertools
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_index import StockIndex, normalize_text, tokenize
+from stock_store import StockStore
+
+TAILLES = ["S", "M", "L", None]
+COLLECTIONS = ["Été", "Hiver", None]
+MOTS = ["Sac", "écharpe", "rouge", "Rouille", "cuir", "cuivré", "soie"]
+
+
+def _stock(n, seed=0):
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "id": range(1, n + 1),
+        "taille": [rng.choice(TAILLES) for _ in range(n)],
+        "collection": [rng.choice(COLLECTIONS) for _ in range(n)],
+        "description": [" ".join(rng.sample(MOTS, 2)) if rng.random() > 0.05 else None for _ in range(n)],
+        "prix_vente": [rng.choice([None, 12.0]) for _ in range(n)],
+    })
+
+
+def _pandas_rows(df, taille=None, collection=None, text="", unsold_only=False):
+    """Même filtre en parcourant tout le DataFrame : chaque mot cherché débute un mot de la description."""
+    mask = pd.Series(True, index=df.index)
+    if taille is not None:
+        mask &= df["taille"] == taille
+    if collection is not None:
+        mask &= df["collection"] == collection
+    for word in tokenize(text):
+        mask &= df["description"].map(lambda d: any(token.startswith(word) for token in tokenize(d)))
+    if unsold_only:
+        mask &= df["prix_vente"].isna()
+    return np.flatnonzero(mask.to_numpy(dtype=bool))
+
+
+QUERIES = list(itertools.product(["S", "L", None], ["Été", None], ["", "rou", "ROU cui", "echarpe", "zz"],
+                                 [False, True]))
+
+
+def _check(index, df):
+    for taille, collection, text, unsold_only in QUERIES:
+        expected = _pandas_rows(df, taille, collection, text, unsold_only)
+        found = index.search(taille=taille, collection=collection, text=text, unsold_only=unsold_only)
+        assert found.tolist() == expected.tolist(), (taille, collection, text, unsold_only)
+
+
+def test_index_search_equals_the_pandas_filter():
+    df = _stock(300)
+    _check(StockIndex.from_frame(df), df)
+
+
+def test_incremental_updates_equal_a_rebuilt_index():
+    df = _stock(200, seed=1)
+    index = StockIndex.from_frame(df)
+    rng = random.Random(2)
+    for _ in range(150):
+        row = rng.randrange(len(df))
+        fields = rng.choice([{"prix_vente": rng.choice([None, 20.0])},
+                             {"taille": rng.choice(TAILLES)},
+                             {"collection": rng.choice(COLLECTIONS), "description": " ".join(rng.sample(MOTS, 3))},
+                             {"description": None}])
+        for column, value in fields.items():
+            df.at[row, column] = value
+        index.update(row, fields)
+    for i in range(1100):  # au-delà de la taille initiale du bitmap des ventes
+        article = {"id": 1000 + i, "taille": "M", "collection": "Hiver", "description": "Soie cuivrée",
+                   "prix_vente": 5.0 if i % 2 else None}
+        df.loc[len(df)] = article
+        assert index.add(article) == len(df) - 1
+
+    _check(index, df)
+    rebuilt = StockIndex.from_frame(df)
+    assert (index.tailles(), index.collections()) == (rebuilt.tailles(), rebuilt.collections())
+    # Les mots qui ne sont plus dans aucune description quittent le vocabulaire
+    assert index._vocabulary == rebuilt._vocabulary
+
+
+def test_words_match_without_accents_or_case():
+    assert normalize_text("Écharpe DORÉE") == "echarpe doree"
+    index = StockIndex.from_frame(pd.DataFrame({"taille": ["M"], "collection": ["Été"],
+                                                "description": ["Écharpe dorée"], "prix_vente": [None]}))
+    assert index.search(text="ECHAR dor").tolist() == [0]
+    assert index.search(collection="Été", text="charpe").tolist() == []
+
+
+@pytest.mark.parametrize("text", ["", "rou"])
+def test_store_search_keeps_the_index_in_step_with_sales(text):
+    df = _stock(50, seed=3)
+    store = StockStore(df)
+    store.search(text=text)  # index construit
+    store.update(1, {"prix_vente": 9.0})
+    new_id = store.append({"description": "Rouge vif", "taille": "S"})
+    found = store.search(text=text, unsold_only=True)
+    assert 1 not in found["id"].tolist()
+    assert new_id in found["id"].tolist()
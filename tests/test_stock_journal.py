@@ -0,0 +1,94 @@
+import datetime
+import json
+
+import pandas as pd
+
+import stock_journal
+from stock_journal import StockJournal, apply_events, article_added, article_sold
+
+FOLDER = "dossier"
+
+
+def _stock():
+    df = pd.DataFrame({"id": pd.array([1, 2], dtype="Int64"), "description": ["robe", "veste"],
+                       "prix_achat": [10.0, 20.0], "prix_vente": [None, None],
+                       "compte_vente": pd.Categorical([None, None], categories=["A"])})
+    df.attrs["drive_version"] = {"id": "snapshot"}
+    return df
+
+
+def _by_id(df, column):
+    return {int(article_id): (None if pd.isna(value) else value) for article_id, value in zip(df["id"], df[column])}
+
+
+def test_apply_events_adds_and_sells_articles():
+    df = apply_events(_stock(), [
+        article_added({"id": 3, "description": "sac", "prix_achat": 5.0}),
+        article_sold(1, {"prix_vente": 25.0, "compte_vente": "B"}),
+        article_sold(3, {"prix_vente": 8.0}),
+        article_sold(99, {"prix_vente": 1.0}),  # Article inconnu : ignoré
+    ])
+    assert _by_id(df, "description") == {1: "robe", 2: "veste", 3: "sac"}
+    assert _by_id(df, "prix_vente") == {1: 25.0, 2: None, 3: 8.0}
+    assert _by_id(df, "compte_vente") == {1: "B", 2: None, 3: None}
+    # La version Drive lue reste la base des écritures suivantes
+    assert df.attrs["drive_version"] == {"id": "snapshot"}
+
+
+def test_apply_events_leaves_the_input_untouched():
+    stock = _stock()
+    apply_events(stock, [article_sold(1, {"prix_vente": 25.0})])
+    assert _by_id(stock, "prix_vente") == {1: None, 2: None}
+
+
+def test_colliding_ids_are_renumbered_deterministically():
+    events = [article_added({"id": 3, "description": "ici"}),
+              article_added({"id": 3, "description": "ailleurs"}),
+              article_added({"id": 1, "description": "déjà pris"})]
+    first, second = apply_events(_stock(), events), apply_events(_stock(), events)
+    assert _by_id(first, "description") == {1: "robe", 2: "veste", 3: "ici", 4: "ailleurs", 5: "déjà pris"}
+    assert _by_id(first, "description") == _by_id(second, "description")
+
+
+def test_compaction_gives_the_same_state_as_replaying_every_delta():
+    deltas = [[article_added({"id": 3, "description": "sac", "prix_achat": 5.0})],
+              [article_sold(3, {"prix_vente": 8.0})],
+              [article_added({"id": 4, "description": "jupe", "prix_achat": 7.0})],
+              [article_sold(1, {"prix_vente": 25.0}), article_sold(4, {"prix_vente": 9.0})]]
+    everything = apply_events(_stock(), [event for delta in deltas for event in delta])
+    for upto in range(len(deltas) + 1):
+        snapshot = apply_events(_stock(), [event for delta in deltas[:upto] for event in delta])
+        rest = apply_events(snapshot, [event for delta in deltas[upto:] for event in delta])
+        assert _by_id(rest, "prix_vente") == _by_id(everything, "prix_vente")
+        assert _by_id(rest, "description") == _by_id(everything, "description")
+
+
+def _delta_name(seconds_ago):
+    stamp = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=seconds_ago)
+    return f"{stock_journal.DELTA_PREFIX}{stamp.strftime('%Y%m%dT%H%M%S%fZ')}.0000.json"
+
+
+def test_compaction_point_waits_for_the_threshold_and_skips_recent_deltas():
+    journal = StockJournal(FOLDER)
+    old = [(_delta_name(600 - i), []) for i in range(3)]
+    recent = [(_delta_name(10), [])]
+    assert journal.compaction_point(old + recent, threshold=5) is None
+    assert journal.compaction_point(old + recent, threshold=4, grace=120) == old[-1][0]
+    assert journal.compaction_point(recent, threshold=1, grace=120) is None
+
+
+def test_pending_lists_deltas_in_name_order_and_delete_upto_removes_them(drive):
+    journal = StockJournal(FOLDER, list_ttl=0)
+    names = [_delta_name(seconds_ago) for seconds_ago in (30, 20, 10)]
+    for article_id, name in zip((3, 1, 2), reversed(names)):
+        events = [article_sold(article_id, {"prix_vente": 1.0})]
+        drive.add_file(name, json.dumps(events).encode(), parents=[FOLDER])
+    drive.add_file("stock.csv", b"id\n1\n", parents=[FOLDER])
+
+    pending = journal.pending(drive)
+    assert [name for name, _ in pending] == names
+    assert [events[0]["id"] for _, events in pending] == [2, 1, 3]
+    assert [name for name, _ in journal.pending(drive, after=names[0])] == names[1:]
+
+    journal.delete_upto(drive, names[1])
+    assert [name for name, _ in journal.pending(drive)] == names[2:]
@@ -0,0 +1,73 @@
+import random
+
+import pandas as pd
+import pytest
+
+from stock_schema import normalize_stock, stock_from_parquet_bytes, stock_to_parquet_bytes
+from stock_stats import STATS_METADATA_KEY, StockStats
+from stock_store import StockStore
+
+COMPTES = ["vestiaire coco", "vestiaire pro"]
+
+
+def _sale(rng):
+    prix_achat = 10.0
+    prix_vente = float(rng.randrange(5, 60))
+    return {"prix_vente": prix_vente, "gain_percent": (prix_vente - prix_achat) / prix_achat * 100,
+            "date_vente": f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 28):02d}",
+            "compte_vente": rng.choice(COMPTES)}
+
+
+def _stock(n, rng):
+    rows = []
+    for article_id in range(1, n + 1):
+        row = {"id": article_id, "description": "robe", "prix_achat": 10.0, "date_arrivee": "2024-12-01"}
+        if rng.random() < 0.5:
+            row.update(_sale(rng))
+        rows.append(row)
+    return normalize_stock(pd.DataFrame(rows))
+
+
+def _assert_same(summary, expected):
+    for key, value in expected.items():
+        if isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(summary[key].reset_index(drop=True), value.reset_index(drop=True),
+                                          check_dtype=False)
+        else:
+            assert summary[key] == pytest.approx(value), key
+
+
+def test_incremental_stats_equal_a_full_recompute():
+    rng = random.Random(0)
+    df = _stock(80, rng)
+    df.attrs[STATS_METADATA_KEY] = StockStats.from_frame(df).to_json()
+    store = StockStore(df)  # statistiques reprises du snapshot, puis tenues à jour
+    for _ in range(200):
+        action = rng.random()
+        if action < 0.2:
+            store.append({"description": "veste", "prix_achat": 10.0, "date_arrivee": "2025-01-15"})
+        elif action < 0.8:
+            store.update(rng.randrange(1, len(store) + 1), _sale(rng))  # vente ou correction
+        else:
+            # Vente annulée
+            store.update(rng.randrange(1, len(store) + 1), {"prix_vente": None, "gain_percent": None,
+                                                          "date_vente": None, "compte_vente": None})
+    _assert_same(store.stats(), StockStats.from_frame(store.frame()).summary())
+
+
+def test_median_gain_is_exact():
+    stats = StockStats()
+    for gain in (30.0, 10.0, 20.0, 40.0):
+        stats.add({"prix_vente": 1.0, "gain_percent": gain})
+    assert stats.gain_median_percent() == 25.0
+    stats.update({"prix_vente": 1.0, "gain_percent": 40.0}, {"prix_vente": None, "prix_achat": 10.0})
+    assert stats.gain_median_percent() == 20.0
+    assert (stats.en_stock, stats.valeur_stock) == (1, 10.0)
+
+
+def test_stats_survive_the_snapshot():
+    df = _stock(30, random.Random(1))
+    expected = StockStats.from_frame(df)
+    read = stock_from_parquet_bytes(stock_to_parquet_bytes(df))
+    _assert_same(StockStats.from_json(read.attrs[STATS_METADATA_KEY]).summary(), expected.summary())
+    _assert_same(StockStats.from_json(expected.to_json()).summary(), expected.summary())
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_journal import article_added, article_sold
+from stock_store import StockStore, StockStoreCache
+
+
+@pytest.fixture
+def snapshot():
+    return pd.DataFrame({"id": [1, 2, 3], "description": ["robe", "veste", "sac"],
+                         "prix_achat": [10.0, 20.0, 5.0], "prix_vente": [None, None, 12.0]})
+
+
+def test_get_and_update_by_id(snapshot):
+    stock = StockStore(snapshot)
+    assert stock.get(2)["description"] == "veste"
+    assert stock.get(9) is None and 9 not in stock
+    assert stock.update(2, {"prix_vente": 30.0}) is True
+    assert stock.update(9, {"prix_vente": 30.0}) is False
+    assert stock.get(2)["prix_vente"] == 30.0
+    lookup = stock.lookup([3, 9, 1], ["description"])
+    assert lookup["description"].tolist()[::2] == ["sac", "robe"] and pd.isna(lookup["description"][1])
+
+
+def test_appended_ids_are_never_reused(snapshot):
+    stock = StockStore(snapshot)
+    assert stock.append({"description": "jupe"}) == 4
+    assert stock.append({"id": 2, "description": "id déjà pris"}) == 5
+    assert stock.append({"id": 10, "description": "id choisi"}) == 10
+    assert stock.next_id() == 11
+    # Ajouté mais pas encore intégré au DataFrame : déjà lisible et modifiable
+    assert stock.update(5, {"prix_vente": 3.0})
+    assert stock.get(5)["prix_vente"] == 3.0
+    assert stock.frame()["id"].tolist() == [1, 2, 3, 4, 5, 10]
+
+
+def test_published_frame_is_not_modified_by_later_writes(snapshot):
+    stock = StockStore(snapshot)
+    before = stock.frame()
+    stock.update(1, {"prix_vente": 25.0})
+    stock.update(2, {"prix_vente": 30.0})
+    stock.append({"description": "jupe"})
+
+    assert before["prix_vente"].isna().tolist() == [True, True, False]
+    assert len(before) == 3
+    after = stock.frame()
+    assert after["prix_vente"].tolist()[:2] == [25.0, 30.0] and len(after) == 4
+
+
+def test_only_modified_columns_are_copied(snapshot):
+    stock = StockStore(snapshot)
+    before = stock.frame()
+    stock.update(1, {"prix_vente": 25.0})
+    after = stock.frame()
+    assert np.shares_memory(before["prix_achat"].to_numpy(), after["prix_achat"].to_numpy())
+    assert not np.shares_memory(before["prix_vente"].to_numpy(), after["prix_vente"].to_numpy())
+
+
+def test_each_delta_is_applied_once(snapshot):
+    stock = StockStore(snapshot)
+    delta = [article_added({"description": "jupe"}), article_sold(1, {"prix_vente": 25.0})]
+    stock.apply_delta("delta-1", delta)
+    stock.apply_delta("delta-1", delta)
+    assert len(stock) == 4
+    assert stock.in_order(["delta-2"]) and stock.in_order(["delta-1"])
+    assert not stock.in_order(["delta-0"])
+
+
+def test_store_cache_applies_only_new_deltas(snapshot):
+    cache = StockStoreCache()
+    first = cache.get("v1", snapshot, [("delta-1", [article_sold(1, {"prix_vente": 25.0})])])
+    again = cache.get("v1", snapshot, [("delta-1", [article_sold(1, {"prix_vente": 25.0})]),
+                                       ("delta-2", [article_sold(2, {"prix_vente": 30.0})])])
+    assert again is first and again.get(2)["prix_vente"] == 30.0
+    # Nouveau snapshot : nouveau StockStore
+    assert cache.get("v2", snapshot) is not first
@@ -0,0 +1,223 @@
+import time
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+import stock_journal
+from local_store import LocalStore
+from stock_cache import DRIVE_VERSION_ATTR
+from stock_journal import JOURNAL_UPTO_KEY, StockJournal
+from stock_schema import normalize_stock
+from stock_sync import StockSync
+
+FOLDER = "dossier"
+SNAPSHOT = "stock.csv"
+
+
+def _articles(*rows):
+    return pd.DataFrame([{"id": article_id, "description": description, "prix_achat": 10.0}
+                         for article_id, description in rows])
+
+
+@pytest.fixture
+def snapshot_id(drive):
+    data = _articles((1, "robe"), (2, "veste")).to_csv(index=False).encode("utf-8")
+    return drive.add_file(SNAPSHOT, data, parents=[FOLDER])
+
+
+def _load_snapshot(service, snapshot_id):
+    meta = service.files().get(fileId=snapshot_id).execute()
+    data = service.files().get_media(fileId=snapshot_id).execute()
+    df = normalize_stock(pd.read_csv(BytesIO(data)))
+    df.attrs[DRIVE_VERSION_ATTR] = meta
+    return df, (meta.get("appProperties") or {}).get(JOURNAL_UPTO_KEY, "")
+
+
+@pytest.fixture
+def make_sync(drive, snapshot_id, tmp_path):
+    """Un serveur : sa copie locale (SQLite) et sa synchronisation, sans thread."""
+    def make(name, **kwargs):
+        return StockSync(
+            LocalStore(str(tmp_path / f"{name}.sqlite3")),
+            StockJournal(FOLDER, list_ttl=0),
+            load_snapshot=lambda service: _load_snapshot(service, snapshot_id),
+            compact=lambda service: None,
+            take_file_id=lambda service: service.files().generateIds(count=1).execute()["ids"][0],
+            service_factory=lambda: drive,
+            background=kwargs.pop("background", False),
+            **kwargs,
+        )
+    return make
+
+
+def _compacted(drive, snapshot_id, journal):
+    """État obtenu par le compactage : snapshot + tous les deltas Drive, dans l'ordre des noms."""
+    df, upto = _load_snapshot(drive, snapshot_id)
+    events = [event for _, delta in journal.pending(drive, after=upto) for event in delta]
+    return stock_journal.apply_events(df, events)
+
+
+def _rows(df, columns=("description", "prix_vente")):
+    df = df.set_index(df["id"].astype(int))
+    return {article_id: tuple(None if pd.isna(value) else value for value in row)
+            for article_id, row in zip(df.index, df[list(columns)].itertuples(index=False))}
+
+
+def test_older_remote_sale_does_not_override_ours(drive, snapshot_id, make_sync):
+    ici, ailleurs = make_sync("ici"), make_sync("ailleurs")
+    ici.stock(drive), ailleurs.stock(drive)
+    # Vente écrite ailleurs (delta plus ancien), envoyée après notre propre vente
+    ailleurs.record([stock_journal.article_sold(1, {"prix_vente": 20.0, "compte_vente": "B"})])
+    ici.record([stock_journal.article_sold(1, {"prix_vente": 30.0, "compte_vente": "A"})])
+    assert ici.stock(drive).get(1)["prix_vente"] == 30.0
+    ailleurs.sync(drive)
+    ici.sync(drive)
+
+    shown = ici.stock(drive).frame()
+    assert _rows(shown) == _rows(_compacted(drive, snapshot_id, ici.journal))
+    assert shown.set_index("id").loc[1, "prix_vente"] == 30.0
+    conflicts = ici.status()["conflicts"]
+    assert [c["kind"] for c in conflicts] == ["vente_concurrente"]
+    assert conflicts[0]["detail"]["retenue"] == "ici"
+
+
+def test_older_remote_addition_keeps_its_id(drive, snapshot_id, make_sync):
+    ici, ailleurs = make_sync("ici"), make_sync("ailleurs")
+    ici.stock(drive), ailleurs.stock(drive)
+    ailleurs.record([stock_journal.article_added({"id": 3, "description": "ailleurs", "prix_achat": 5.0})])
+    ici.record([stock_journal.article_added({"id": 3, "description": "ici", "prix_achat": 5.0})])
+    assert ici.stock(drive).get(3)["description"] == "ici"
+    ailleurs.sync(drive)
+    ici.sync(drive)
+
+    shown = ici.stock(drive)
+    assert _rows(shown.frame()) == _rows(_compacted(drive, snapshot_id, ici.journal))
+    # Rejoué dans l'ordre des deltas : l'ajout le plus ancien garde l'ID 3
+    assert shown.get(3)["description"] == "ailleurs"
+    assert shown.get(4)["description"] == "ici"
+    assert [c["kind"] for c in ici.status()["conflicts"]] == ["id_en_double"]
+
+
+class _Offline:
+    """Service Drive injoignable."""
+
+    def files(self):
+        raise ConnectionError("Drive injoignable")
+
+    revisions = files
+
+
+def _on_drive(drive, journal):
+    return [name for name, _ in journal.pending(drive)]
+
+
+def test_push_and_pull(drive, make_sync):
+    ici, ailleurs = make_sync("ici"), make_sync("ailleurs")
+    ici.stock(drive), ailleurs.stock(drive)
+    name = ici.record([stock_journal.article_sold(2, {"prix_vente": 25.0})])
+    assert ici.status()["pending"] == 1
+
+    ici.sync(drive)
+    assert ici.status()["pending"] == 0
+    assert ici.status()["last_success"] is not None
+    assert _on_drive(drive, ici.journal) == [name]
+
+    ailleurs.sync(drive)
+    assert ailleurs.stock(drive).get(2)["prix_vente"] == 25.0
+    assert ailleurs.status()["conflicts"] == []
+
+
+def test_offline_changes_survive_restart_and_are_sent(drive, make_sync):
+    ici = make_sync("ici")
+    ici.stock(drive)
+    ici.record([stock_journal.article_sold(1, {"prix_vente": 40.0})])
+    with pytest.raises(ConnectionError):
+        ici.sync(_Offline())
+    status = ici.status()
+    assert status["pending"] == 1 and status["failing_since"] is not None
+    assert "Drive injoignable" in status["last_error"]
+
+    # Redémarrage hors ligne : la copie locale suffit, modification comprise
+    restarted = make_sync("ici")
+    assert restarted.stock(_Offline()).get(1)["prix_vente"] == 40.0
+
+    restarted.sync(drive)
+    assert restarted.status()["pending"] == 0
+    assert restarted.status()["failing_since"] is None
+    assert len(_on_drive(drive, restarted.journal)) == 1
+
+
+def test_background_thread_retries_until_drive_is_back(drive, make_sync):
+    attempts = []
+
+    def service_factory():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("Drive injoignable")
+        return drive
+
+    ici = make_sync("ici", background=True, interval=0.01)
+    ici._service_factory = service_factory
+    ici.stock(drive)
+    ici.record([stock_journal.article_sold(1, {"prix_vente": 40.0})])
+    for _ in range(500):
+        if not ici.local.has_unsynced():
+            break
+        time.sleep(0.01)
+    assert not ici.local.has_unsynced()
+    assert len(attempts) == 3
+
+
+def test_delta_older_than_remote_compaction_is_renamed(drive, snapshot_id, make_sync):
+    ici, ailleurs = make_sync("ici"), make_sync("ailleurs")
+    ici.stock(drive), ailleurs.stock(drive)
+    # Ajout fait hors ligne ici, avant une vente faite puis compactée ailleurs
+    offline = ici.record([stock_journal.article_added({"description": "sac", "prix_achat": 8.0})])
+    sold = ailleurs.record([stock_journal.article_sold(2, {"prix_vente": 25.0})])
+    ailleurs.sync(drive)
+    df = _compacted(drive, snapshot_id, ailleurs.journal)
+    drive.files().update(fileId=snapshot_id, body={"appProperties": {JOURNAL_UPTO_KEY: sold}},
+                         media_body=df.to_csv(index=False).encode("utf-8")).execute()
+    ailleurs.journal.delete_upto(drive, sold)
+
+    ici.sync(drive)
+    conflicts = ici.status()["conflicts"]
+    assert [c["kind"] for c in conflicts] == ["delta_renomme"]
+    renamed = conflicts[0]["detail"]["nouveau_nom"]
+    assert conflicts[0]["detail"]["delta"] == offline and renamed > sold
+    assert _on_drive(drive, ici.journal) == [renamed]
+
+    shown = ici.stock(drive).frame()
+    assert shown["description"].tolist() == ["robe", "veste", "sac"]
+    assert shown.set_index("id").loc[2, "prix_vente"] == 25.0
+
+
+def test_correction_after_seeing_our_sale_is_not_a_conflict(drive, make_sync):
+    ici, ailleurs = make_sync("ici"), make_sync("ailleurs")
+    ici.stock(drive), ailleurs.stock(drive)
+    ici.record([stock_journal.article_sold(1, {"prix_vente": 30.0})])
+    ici.sync(drive)
+    ailleurs.sync(drive)
+    ailleurs.record([stock_journal.article_sold(1, {"prix_vente": 35.0})])
+    ailleurs.sync(drive)
+
+    ici.sync(drive)
+    assert ici.status()["conflicts"] == []
+    assert ici.stock(drive).get(1)["prix_vente"] == 35.0
+
+
+def test_account_rename_is_not_a_concurrent_sale(drive, make_sync):
+    ici, ailleurs = make_sync("ici"), make_sync("ailleurs")
+    ici.stock(drive), ailleurs.stock(drive)
+    ailleurs.record([stock_journal.article_sold(1, {"prix_vente": 40.0, "compte_vente": "B"})])
+    ailleurs.sync(drive)
+    ici.sync(drive)
+    # Compte "B" renommé ici (ses ventes suivent) pendant qu'ailleurs corrige le prix
+    ici.record([stock_journal.article_updated(1, {"compte_vente": "B bis"})])
+    ailleurs.record([stock_journal.article_sold(1, {"prix_vente": 45.0, "compte_vente": "B"})])
+    ailleurs.sync(drive)
+    ici.sync(drive)
+
+    assert ici.status()["conflicts"] == []
+    assert ici.stock(drive).get(1)["prix_vente"] == 45.0
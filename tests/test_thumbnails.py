@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from thumbnails import ThumbnailCache, resize_image
+
+SIZE = 32
+
+
+def _jpeg(size=(64, 48)):
+    output = BytesIO()
+    Image.new("RGB", size, "red").save(output, format="JPEG")
+    return output.getvalue()
+
+
+# Taille d'une variante en cache (toutes les photos des tests sont identiques)
+VARIANT_BYTES = len(resize_image(_jpeg(), SIZE))
+
+
+@pytest.fixture
+def make_thumbnails(tmp_path):
+    """Caches de vignettes sur un même dossier (un par « démarrage » du serveur)."""
+    caches = []
+
+    def make(**kwargs):
+        kwargs.setdefault("max_bytes", 3 * VARIANT_BYTES)
+        cache = ThumbnailCache(cache_dir=str(tmp_path / "thumbnails"), sizes=(SIZE,), **kwargs)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache._executor.shutdown()
+
+
+def _store(cache, *photo_ids):
+    for photo_id in photo_ids:
+        cache.store(photo_id, _jpeg())
+        time.sleep(0.01)  # dates de modification distinctes (ordre LRU sur disque)
+
+
+def _cached(cache, *photo_ids):
+    return [os.path.exists(cache._path(photo_id, SIZE)) for photo_id in photo_ids]
+
+
+def test_least_recently_used_photo_is_evicted_at_the_size_cap(make_thumbnails):
+    cache = make_thumbnails()
+    _store(cache, "a", "b", "c")
+    assert _cached(cache, "a", "b", "c") == [True, True, True]
+
+    assert cache.get(None, "a", SIZE) is not None  # « a » redevient la plus récente
+    _store(cache, "d")
+    assert _cached(cache, "a", "b", "c", "d") == [True, False, True, True]
+    assert cache._total == 3 * VARIANT_BYTES
+
+
+def test_lru_order_survives_a_restart(make_thumbnails):
+    before = make_thumbnails()
+    _store(before, "a", "b", "c")
+    before.get(None, "a", SIZE)
+    time.sleep(0.01)
+
+    after = make_thumbnails()
+    assert after._total == 3 * VARIANT_BYTES
+    _store(after, "d")
+    assert _cached(after, "a", "b", "c", "d") == [True, False, True, True]
+
+
+def test_a_variant_larger_than_the_cap_is_still_kept(make_thumbnails):
+    cache = make_thumbnails(max_bytes=1)
+    _store(cache, "a", "b")
+    assert _cached(cache, "a", "b") == [False, True]
+
+
+def test_downloads_use_one_client_per_worker_thread(make_thumbnails, drive):
+    photo_ids = [drive.add_file(f"photo{i}.jpg", _jpeg(), parents=["dossier"]) for i in range(6)]
+    threads = []
+
+    def service_factory():
+        threads.append(threading.get_ident())
+        return drive
+
+    cache = make_thumbnails(max_bytes=10 * VARIANT_BYTES, service_factory=service_factory)
+    result = cache.get_many(None, photo_ids, SIZE)
+    assert all(result[photo_id] is not None for photo_id in photo_ids)
+    assert drive.calls["get_media"] == len(photo_ids)
+    assert len(threads) == len(set(threads)) and threading.get_ident() not in threads
+
+    # Déjà en cache : aucun nouveau téléchargement
+    cache.get_many(None, photo_ids, SIZE)
+    assert drive.calls["get_media"] == len(photo_ids)
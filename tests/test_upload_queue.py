@@ -0,0 +1,96 @@
+import time
+
+import pandas as pd
+
+from upload_queue import UploadQueue
+
+
+def _settled(queue, timeout=5.0):
+    """Attend que la file n'ait plus de travail en attente ; retourne son état."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = queue.status()
+        if not status["pending"] and not status["running"]:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"file toujours occupée : {queue.status()}")
+
+
+class _Offline:
+    """Client Drive dont chaque requête échoue (réseau coupé)."""
+
+    def files(self):
+        raise ConnectionError("Drive injoignable")
+
+
+def test_failed_csv_export_is_recorded_by_the_queue(app, monkeypatch, tmp_path):
+    shown = []
+    monkeypatch.setattr(app.st, "error", shown.append)
+    queue = UploadQueue({"csv": app._upload_job_csv}, service_factory=_Offline,
+                        queue_dir=str(tmp_path / "uploads"), max_attempts=1)
+    data = pd.DataFrame({"id": [1], "description": ["robe"]}).to_csv(index=False).encode()
+    queue.enqueue("csv", {"filename": "export.csv", "app_properties": None}, data)
+
+    status = _settled(queue)
+    assert status["failed"] == 1
+    assert "Drive injoignable" in status["last_error"]
+    # Pas de session Streamlit dans les threads de la file : rien n'est affiché
+    assert shown == []
+
+
+class _Flaky:
+    """Travail qui échoue `failures` fois avant de réussir ; note chaque contenu reçu."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.received = []
+
+    def __call__(self, service, params, payload):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("coupure")
+        self.received.append((params["name"], payload))
+
+
+def _queue(tmp_path, job, **kwargs):
+    return UploadQueue({"photo": job}, service_factory=object, queue_dir=str(tmp_path / "uploads"), **kwargs)
+
+
+def test_failed_job_is_retried_until_it_succeeds(tmp_path, monkeypatch):
+    monkeypatch.setattr("upload_queue.retry_delay", lambda attempts: 0.01)
+    job = _Flaky(failures=2)
+    queue = _queue(tmp_path, job)
+    queue.enqueue("photo", {"name": "robe.jpg"}, b"jpeg")
+
+    # Entre deux tentatives, le travail reste en attente sur disque
+    status = _settled(queue)
+    assert job.received == [("robe.jpg", b"jpeg")]
+    assert status["failed"] == 0
+    assert "coupure" in status["last_error"]
+
+
+def test_job_failing_too_often_can_be_retried_by_hand(tmp_path, monkeypatch):
+    monkeypatch.setattr("upload_queue.retry_delay", lambda attempts: 0.01)
+    job = _Flaky(failures=3)
+    queue = _queue(tmp_path, job, max_attempts=2)
+    queue.enqueue("photo", {"name": "robe.jpg"}, b"jpeg")
+    assert _settled(queue)["failed"] == 1 and job.received == []
+
+    queue.retry_failed()
+    assert _settled(queue)["failed"] == 0
+    assert job.received == [("robe.jpg", b"jpeg")]
+
+
+def test_pending_jobs_are_replayed_after_a_restart(tmp_path, monkeypatch):
+    # Premier serveur arrêté avant tout envoi : les travaux restent sur disque
+    monkeypatch.setattr(UploadQueue, "_run", lambda self, job_id: None)
+    before = _queue(tmp_path, _Flaky())
+    before.enqueue("photo", {"name": "robe.jpg"}, b"jpeg")
+    before.enqueue("photo", {"name": "veste.jpg"}, b"png")
+    assert before.status()["pending"] == 2
+    monkeypatch.undo()
+
+    job = _Flaky()
+    after = _queue(tmp_path, job)
+    assert _settled(after)["pending"] == 0
+    assert sorted(job.received) == [("robe.jpg", b"jpeg"), ("veste.jpg", b"png")]
@@ -0,0 +1,204 @@
+"""
+Cache local des photos du stock (vignettes servies par l'application).
+
+Chaque photo Drive est téléchargée une seule fois via le compte de service,
+puis redimensionnée dans les tailles utilisées par les pages (grille, fiche
+détaillée). Les variantes sont gardées sur disque dans un cache LRU de taille
+bornée, et la page suivante de la grille peut être préchargée en arrière-plan.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+import instrumentation
+
+# Dossier du cache disque des vignettes
+THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "thumbnails")
+
+# Taille maximale du cache disque (octets)
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Qualité JPEG des variantes
+JPEG_QUALITY = 85
+
+
+def resize_image(data, size):
+    """
+    Redimensionne une image (contenu brut) pour qu'elle tienne dans un carré
+    de `size` pixels, en respectant l'orientation EXIF. Retourne du JPEG.
+    """
+    with instrumentation.timed("image.resize", len(data)), Image.open(BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        output = BytesIO()
+        image.save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        return output.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Cache disque LRU des variantes redimensionnées des photos Drive.
+
+    - `sizes` : tailles générées à chaque téléchargement (une seule requête
+      Drive par photo, quelle que soit la taille demandée ensuite) ;
+    - `service_factory` : fabrique d'un client Drive par thread, pour les
+      téléchargements en parallèle (le client Google n'est pas thread-safe ;
+      les clients partagent le transport HTTP du serveur, avec ses délais
+      maximum et nouvelles tentatives). Sans fabrique, le service est
+      utilisé tel quel.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_DIR, sizes=(300, 700),
+                 max_bytes=THUMBNAIL_CACHE_MAX_BYTES, service_factory=None, max_workers=4):
+        self.cache_dir = cache_dir
+        self.sizes = tuple(sizes)
+        self.max_bytes = max_bytes
+        self.service_factory = service_factory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._inflight = {}  # (photo_id, source) -> Future du téléchargement en cours
+        self._index = OrderedDict()  # chemin -> taille (du moins au plus récemment utilisé)
+        self._total = 0
+        self._load_index()
+
+    # -- Index LRU -----------------------------------------------------------
+
+    def _load_index(self):
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.is_file()]
+        except OSError:
+            return
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            self._index[entry.path] = entry.stat().st_size
+            self._total += entry.stat().st_size
+
+    def _path(self, photo_id, size):
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(photo_id))
+        return os.path.join(self.cache_dir, f"{safe_id}_{size}.jpg")
+
+    def _read(self, path):
+        with self._lock:
+            if path not in self._index:
+                return None
+            self._index.move_to_end(path)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # L'ordre LRU survit aux redémarrages
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._index.pop(path, 0)
+            return None
+
+    def _write(self, path, data):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total += len(data) - self._index.pop(path, 0)
+            self._index[path] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            path, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # -- Téléchargement ------------------------------------------------------
+
+    def _service(self, service):
+        """Client Drive du thread de téléchargement (`service` sans fabrique)."""
+        if self.service_factory is None:
+            return service
+        if not hasattr(self._local, "service"):
+            self._local.service = self.service_factory()
+        return self._local.service
+
+    def _fetch(self, service, photo_id, in_worker, source=None):
+        """
+        Télécharge la photo et écrit ses variantes. `source` = (ID Drive d'une
+        vignette déjà réduite, taille) : seule cette taille est alors produite.
+        """
+        file_id, sizes = (source[0], (source[1],)) if source else (photo_id, self.sizes)
+        if in_worker:
+            service = self._service(service)
+        data = service.files().get_media(fileId=file_id).execute()
+        variants = {}
+        for size in sizes:
+            variants[size] = resize_image(data, size)
+            self._write(self._path(photo_id, size), variants[size])
+        return variants
+
+    def _submit(self, service, photo_id, source=None):
+        """Lance (ou réutilise) le téléchargement en arrière-plan de `photo_id`."""
+        key = (photo_id, source)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, service, photo_id, True, source)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _f, k=key: self._inflight.pop(k, None))
+            return future
+
+    # -- API publique --------------------------------------------------------
+
+    def get(self, service, photo_id, size, thumbnail_id=None):
+        """Retourne la variante `size` de la photo (JPEG), ou None si indisponible."""
+        thumbnail_ids = {photo_id: thumbnail_id} if thumbnail_id else None
+        return self.get_many(service, [photo_id], size, thumbnail_ids)[photo_id]
+
+    def get_many(self, service, photo_ids, size, thumbnail_ids=None):
+        """
+        Retourne {photo_id: JPEG ou None} ; les photos absentes du cache sont
+        téléchargées en parallèle.
+        `thumbnail_ids` ({photo_id: ID de la vignette Drive}) permet de ne
+        télécharger que la vignette envoyée avec la photo, plutôt que l'original.
+        """
+        thumbnail_ids = thumbnail_ids or {}
+        result, futures = {}, {}
+        for photo_id in dict.fromkeys(photo_ids):
+            data = self._read(self._path(photo_id, size))
+            if data is not None:
+                result[photo_id] = data
+            else:
+                thumbnail_id = thumbnail_ids.get(photo_id)
+                source = (thumbnail_id, size) if thumbnail_id else None
+                futures[photo_id] = self._submit(service, photo_id, source)
+        wait(list(futures.values()))
+        for photo_id, future in futures.items():
+            try:
+                variants = future.result()
+                result[photo_id] = variants.get(size) or resize_image(variants[max(variants)], size)
+            except Exception:
+                result[photo_id] = None
+        return result
+
+    def store(self, photo_id, data):
+        """Met en cache les variantes d'une photo déjà en mémoire (ex. juste téléversée)."""
+        for size in self.sizes:
+            self._write(self._path(photo_id, size), resize_image(data, size))
+
+    def prefetch(self, service, photo_ids, size, thumbnail_ids=None):
+        """Précharge en arrière-plan les photos absentes du cache (sans attendre)."""
+        thumbnail_ids = thumbnail_ids or {}
+        for photo_id in dict.fromkeys(photo_ids):
+            with self._lock:
+                cached = self._path(photo_id, size) in self._index
+            if not cached:
+                thumbnail_id = thumbnail_ids.get(photo_id)
+                self._submit(service, photo_id, (thumbnail_id, size) if thumbnail_id else None)
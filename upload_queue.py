@@ -0,0 +1,207 @@
+"""
+File d'envoi en arrière-plan vers Google Drive (photos, CSV).
+
+Les pages déposent un travail dans la file et rendent la main tout de suite ;
+un pool de threads l'exécute, avec nouvelles tentatives espacées
+exponentiellement en cas d'erreur. Chaque travail est d'abord écrit sur disque
+(paramètres JSON + contenu binaire) : rien n'est perdu si le serveur redémarre,
+les travaux en attente sont repris au démarrage suivant.
+
+Les fichiers créés sur Drive utilisent des IDs pré-générés (`files().generateIds`),
+connus avant l'envoi : l'appli peut référencer une photo avant qu'elle soit
+envoyée, et une création rejouée après une coupure ne crée pas de doublon.
+"""
+import datetime
+import json
+import os
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+
+# Dossier de la file persistante
+QUEUE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "uploads")
+
+# Nombre maximum de tentatives avant de classer un travail en échec
+MAX_ATTEMPTS = 8
+
+# Délai de base (secondes) et délai maximum entre deux tentatives
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 120.0
+
+
+def retry_delay(attempts, base=RETRY_BASE_DELAY, maximum=RETRY_MAX_DELAY):
+    """Délai avant la tentative suivante : exponentiel, plafonné, avec gigue."""
+    return min(maximum, base * 2 ** attempts) * random.uniform(0.5, 1.5)
+
+
+class DriveIdPool:
+    """Réserve d'IDs Drive pré-générés, remplie par lots (un appel pour `batch` IDs)."""
+
+    def __init__(self, batch=20):
+        self.batch = batch
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def take(self, service, count=1):
+        with self._lock:
+            while len(self._ids) < count:
+                result = service.files().generateIds(count=max(self.batch, count), space="drive").execute()
+                self._ids.extend(result["ids"])
+            taken, self._ids = self._ids[:count], self._ids[count:]
+            return taken
+
+
+class UploadQueue:
+    """
+    File persistante de travaux d'envoi.
+
+    - `handlers` : {type de travail: fonction(service, params, payload)} ;
+    - `service_factory` : fabrique d'un client Drive par thread (le client
+      Google n'est pas thread-safe).
+    """
+
+    def __init__(self, handlers, service_factory, queue_dir=QUEUE_DIR, max_workers=2,
+                 max_attempts=MAX_ATTEMPTS):
+        self.handlers = handlers
+        self.service_factory = service_factory
+        self.queue_dir = queue_dir
+        self.failed_dir = os.path.join(queue_dir, "failed")
+        self.max_attempts = max_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uploads")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._running = set()
+        self._last_error = None
+        os.makedirs(self.failed_dir, exist_ok=True)
+        # Reprise des travaux laissés en attente par une exécution précédente
+        for job_id in self._job_ids(self.queue_dir):
+            self._executor.submit(self._run, job_id)
+
+    # -- Stockage des travaux ------------------------------------------------
+
+    @staticmethod
+    def _job_ids(directory):
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        return sorted(name[:-len(".json")] for name in names if name.endswith(".json"))
+
+    def _paths(self, job_id, directory=None):
+        base = os.path.join(directory or self.queue_dir, job_id)
+        return base + ".json", base + ".bin"
+
+    def _save(self, job, directory=None):
+        json_path, _ = self._paths(job["id"], directory)
+        tmp_path = json_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, json_path)
+
+    def _load(self, job_id, directory=None):
+        json_path, bin_path = self._paths(job_id, directory)
+        with open(json_path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        payload = None
+        if os.path.exists(bin_path):
+            with open(bin_path, "rb") as f:
+                payload = f.read()
+        return job, payload
+
+    def _remove(self, job_id, directory=None):
+        for path in self._paths(job_id, directory):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # -- Exécution -----------------------------------------------------------
+
+    def _service(self):
+        if not hasattr(self._local, "service"):
+            self._local.service = self.service_factory()
+        return self._local.service
+
+    def _run(self, job_id):
+        with self._lock:
+            if job_id in self._running:
+                return
+            self._running.add(job_id)
+        try:
+            try:
+                job, payload = self._load(job_id)
+            except OSError:
+                return  # Déjà traité
+            try:
+                with instrumentation.timed(f"upload.{job['kind']}", len(payload or b"")):
+                    self.handlers[job["kind"]](self._service(), job["params"], payload)
+            except Exception as e:
+                job["attempts"] += 1
+                job["last_error"] = f"{type(e).__name__}: {e}"
+                self._last_error = f"{job['kind']} : {job['last_error']}"
+                if job["attempts"] >= self.max_attempts:
+                    self._move_to_failed(job)
+                else:
+                    self._save(job)
+                    timer = threading.Timer(retry_delay(job["attempts"]), self._executor.submit,
+                                            args=(self._run, job_id))
+                    timer.daemon = True
+                    timer.start()
+                return
+            self._remove(job_id)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def _move_to_failed(self, job):
+        _, bin_path = self._paths(job["id"])
+        _, failed_bin = self._paths(job["id"], self.failed_dir)
+        if os.path.exists(bin_path):
+            os.replace(bin_path, failed_bin)
+        self._save(job, self.failed_dir)
+        self._remove(job["id"])
+
+    # -- API publique --------------------------------------------------------
+
+    def enqueue(self, kind, params, payload=None):
+        """
+        Ajoute un travail à la file (écrit sur disque avant de rendre la main)
+        et retourne son identifiant.
+        """
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        job = {"id": f"{stamp}-{uuid.uuid4().hex[:8]}", "kind": kind, "params": params,
+               "attempts": 0, "last_error": None}
+        if payload is not None:
+            _, bin_path = self._paths(job["id"])
+            with open(bin_path, "wb") as f:
+                f.write(payload)
+        self._save(job)
+        self._executor.submit(self._run, job["id"])
+        return job["id"]
+
+    def retry_failed(self):
+        """Remet dans la file les travaux classés en échec."""
+        for job_id in self._job_ids(self.failed_dir):
+            job, _ = self._load(job_id, self.failed_dir)
+            job["attempts"] = 0
+            _, failed_bin = self._paths(job_id, self.failed_dir)
+            _, bin_path = self._paths(job_id)
+            if os.path.exists(failed_bin):
+                os.replace(failed_bin, bin_path)
+            self._save(job)
+            self._remove(job_id, self.failed_dir)
+            self._executor.submit(self._run, job_id)
+
+    def status(self):
+        """État de la file pour l'affichage : en attente, en cours, en échec, dernière erreur."""
+        with self._lock:
+            running = len(self._running)
+        return {
+            "pending": len(self._job_ids(self.queue_dir)),
+            "running": running,
+            "failed": len(self._job_ids(self.failed_dir)),
+            "last_error": self._last_error,
+        }